@@ -52,13 +52,15 @@ class PebbleFirmwareBinaryInfo(object):
         _, ext = os.path.splitext(self.path)
         assert ext == '.bin', 'Can only calculate crc for .bin files'
         with open(self.path, 'rb') as f:
-            image = f.read()
-        if self.hw_platform in self.LEGACY_CRC_PLATFORMS:
-            # use the legacy defective crc
-            return stm32_crc.crc32(image)
-        else:
-            # use a regular crc
-            return crc32(image) & 0xFFFFFFFF
+            if self.hw_platform in self.LEGACY_CRC_PLATFORMS:
+                # use the legacy defective crc
+                return stm32_crc.process_file(f)
+            else:
+                # use a regular crc
+                crc = 0
+                for chunk in iter(lambda: f.read(65536), b''):
+                    crc = crc32(chunk, crc)
+                return crc & 0xFFFFFFFF
 
     def _get_footer_struct(self):
         fmt = '<' + reduce(lambda s, t: s + t[0],
@@ -123,7 +125,41 @@ def insert_firmware_description_struct(input_binary, output_binary=None):
     return _generate_firmware_description_struct(len(fw_bin), fw_crc) + fw_bin
 
 
-def _load(connection, image, progress, verbose, address):
+# Granularity of differential imaging. Flash is compared, erased and
+# rewritten in chunks of this size, so it must be a multiple of the
+# erase sector size of every flash part (64 KiB or 128 KiB).
+DELTA_SECTOR_SIZE = 0x20000
+
+
+def _print_exception(message, e, verbose):
+    detail = ''.join(traceback.format_exception_only(type(e), e))
+    if verbose:
+        detail = '\n' + traceback.format_exc()
+    print(message + detail)
+
+
+def _find_changed_ranges(connection, image, address, sector_size):
+    """ Compare the image with the contents of flash one sector at a time.
+
+    Returns a list of (offset, length) ranges of the image which differ
+    from what is already in flash. Adjacent changed sectors are merged
+    into a single range.
+    """
+    changed = []
+    for offset in range(0, len(image), sector_size):
+        sector = image[offset:offset+sector_size]
+        if (connection.flash.crc(address + offset, len(sector)) ==
+                stm32_crc.crc32(sector)):
+            continue
+        if changed and sum(changed[-1]) == offset:
+            changed[-1] = (changed[-1][0], changed[-1][1] + len(sector))
+        else:
+            changed.append((offset, len(sector)))
+    return changed
+
+
+def _load(connection, image, progress, verbose, address, delta=False,
+          sector_size=DELTA_SECTOR_SIZE):
     image_crc = stm32_crc.crc32(image)
 
     progress_cb = None
@@ -132,35 +168,54 @@ def _load(connection, image, progress, verbose, address):
             print('.' if acked else 'R', end='')
             sys.stdout.flush()
 
-    if progress or verbose:
-        print('Erasing... ', end='')
-        sys.stdout.flush()
-    try:
-        connection.flash.erase(address, len(image))
-    except pebble.pulse2.exceptions.PulseException as e:
-        detail = ''.join(traceback.format_exception_only(type(e), e))
-        if verbose:
-            detail = '\n' + traceback.format_exc()
-        print('Erase failed! ' + detail)
-        return False
-    if progress or verbose:
-        print('done.')
-        sys.stdout.flush()
-
-    try:
-        retries = connection.flash.write(address, image,
-                                         progress_cb=progress_cb)
-    except pebble.pulse2.exceptions.PulseException as e:
-        detail = ''.join(traceback.format_exception_only(type(e), e))
-        if verbose:
-            detail = '\n' + traceback.format_exc()
-        print('Write failed! ' + detail)
-        return False
+    if delta:
+        if progress or verbose:
+            print('Comparing... ', end='')
+            sys.stdout.flush()
+        try:
+            ranges = _find_changed_ranges(connection, image, address,
+                                          sector_size)
+        except pebble.pulse2.exceptions.PulseException as e:
+            _print_exception('Compare failed! ', e, verbose)
+            return False
+        if progress or verbose:
+            print('%d of %d bytes changed.' % (
+                sum(length for _, length in ranges), len(image)))
+    else:
+        ranges = [(0, len(image))]
+
+    retries = 0
+    for offset, length in ranges:
+        if progress or verbose:
+            print('Erasing... ', end='')
+            sys.stdout.flush()
+        try:
+            connection.flash.erase(address + offset, length)
+        except pebble.pulse2.exceptions.PulseException as e:
+            _print_exception('Erase failed! ', e, verbose)
+            return False
+        if progress or verbose:
+            print('done.')
+            sys.stdout.flush()
+
+        try:
+            retries += connection.flash.write(
+                    address + offset, image[offset:offset+length],
+                    progress_cb=progress_cb)
+        except pebble.pulse2.exceptions.PulseException as e:
+            _print_exception('Write failed! ', e, verbose)
+            return False
+        if progress or verbose:
+            print()
+        if verbose and connection.flash.write_stats:
+            write_stats = connection.flash.write_stats
+            print('Wrote %d bytes in %.2f s (%.1f KiB/s), round-trip %s s' % (
+                write_stats['bytes_written'], write_stats['elapsed'],
+                write_stats['throughput'] / 1024,
+                write_stats['round_trip_time']))
 
     result_crc = connection.flash.crc(address, len(image))
 
-    if progress or verbose:
-        print()
     if verbose:
         print('Retries: %d' % retries)
 
@@ -170,7 +225,8 @@ def _load(connection, image, progress, verbose, address):
     return result_crc == image_crc
 
 
-def load_firmware(connection, fin, progress, verbose, address=None):
+def load_firmware(connection, fin, progress, verbose, address=None,
+                  delta=False):
     if address is None:
         # If address is unspecified, assume we want the prf address
         _, address, length = connection.flash.query_region_geometry(
@@ -178,21 +234,21 @@ def load_firmware(connection, fin, progress, verbose, address=None):
     address = int(address)
 
     image = insert_firmware_description_struct(fin)
-    if _load(connection, image, progress, verbose, address):
+    if _load(connection, image, progress, verbose, address, delta):
         connection.flash.finalize_region(
             connection.flash.REGION_PRF)
         return True
     return False
 
 
-def load_resources(connection, fin, progress, verbose):
+def load_resources(connection, fin, progress, verbose, delta=False):
     _, address, length = connection.flash.query_region_geometry(
             connection.flash.REGION_SYSTEM_RESOURCES)
 
     with open(fin, 'rb') as f:
         data = f.read()
     assert len(data) <= length
-    if _load(connection, data, progress, verbose, address):
+    if _load(connection, data, progress, verbose, address, delta):
         connection.flash.finalize_region(
                 connection.flash.REGION_SYSTEM_RESOURCES)
         return True
@@ -200,18 +256,27 @@ def load_resources(connection, fin, progress, verbose):
 
 
 @PebbleCommander.command()
-def image_resources(cmdr, pack='build/system_resources.pbpack'):
+def image_resources(cmdr, pack='build/system_resources.pbpack', delta=False):
     """ Image resources.
+
+    With delta, only the flash sectors which differ from the pack are
+    rewritten.
     """
     load_resources(cmdr.connection, pack,
-                   progress=cmdr.interactive, verbose=cmdr.interactive)
+                   progress=cmdr.interactive, verbose=cmdr.interactive,
+                   delta=parsers.str2bool(delta, also_true=['delta']))
 
 
 @PebbleCommander.command()
-def image_firmware(cmdr, firm='build/prf/src/fw/tintin_fw.bin', address=None):
+def image_firmware(cmdr, firm='build/prf/src/fw/tintin_fw.bin', address=None,
+                   delta=False):
     """ Image recovery firmware.
+
+    With delta, only the flash sectors which differ from the firmware are
+    rewritten.
     """
     if address is not None:
         address = int(str(address), 0)
     load_firmware(cmdr.connection, firm, progress=cmdr.interactive,
-                  verbose=cmdr.interactive, address=address)
+                  verbose=cmdr.interactive, address=address,
+                  delta=parsers.str2bool(delta, also_true=['delta']))
@@ -7,6 +7,8 @@ import collections
 import logging
 import struct
 
+import pebble.pulse2.exceptions
+
 from ..exceptions import PebbleCommanderError
 
 
@@ -18,6 +20,10 @@ class EraseError(PebbleCommanderError):
     pass
 
 
+def _response_type(response):
+    return bytearray(response[0:1])[0]
+
+
 class OpenCommand(object):
 
     command_type = 1
@@ -139,7 +145,7 @@ class OpenResponse(object):
 
     @classmethod
     def parse(cls, response):
-        response_type = ord(response[0])
+        response_type = _response_type(response)
         if response_type != cls.response_type:
             raise ResponseParseError('Unexpected response type: %r' % response_type)
         return cls.Response._make(cls.response_struct.unpack(response))
@@ -155,7 +161,7 @@ class CloseResponse(object):
 
     @classmethod
     def parse(cls, response):
-        response_type = ord(response[0])
+        response_type = _response_type(response)
         if response_type != cls.response_type:
             raise ResponseParseError('Unexpected response type: %r' % response_type)
         return cls.Response._make(cls.response_struct.unpack(response))
@@ -171,7 +177,7 @@ class ReadResponse(object):
 
     @classmethod
     def parse(cls, response):
-        if ord(response[0]) != cls.response_type:
+        if _response_type(response) != cls.response_type:
             raise ResponseParseError('Unexpected response: %r' % response)
         header = response[:cls.header_size]
         body = response[cls.header_size:]
@@ -189,7 +195,7 @@ class WriteResponse(object):
 
     @classmethod
     def parse(cls, response):
-        response_type = ord(response[0])
+        response_type = _response_type(response)
         if response_type != cls.response_type:
             raise ResponseParseError('Unexpected response type: %r' % response_type)
         return cls.Response._make(cls.response_struct.unpack(response))
@@ -205,7 +211,7 @@ class CRCResponse(object):
 
     @classmethod
     def parse(cls, response):
-        response_type = ord(response[0])
+        response_type = _response_type(response)
         if response_type != cls.response_type:
             raise ResponseParseError('Unexpected response type: %r' % response_type)
         return cls.Response._make(cls.response_struct.unpack(response))
@@ -220,7 +226,7 @@ class StatResponse(object):
         self.tuple = collections.namedtuple(name, 'fd flags ' + fields)
 
     def parse(self, response):
-        response_type = ord(response[0])
+        response_type = _response_type(response)
         if response_type != self.response_type:
             raise ResponseParseError('Unexpected response type: %r' % response_type)
         return self.tuple._make(self.struct.unpack(response))
@@ -239,7 +245,7 @@ class EraseResponse(object):
 
     @classmethod
     def parse(cls, response):
-        response_type = ord(response[0])
+        response_type = _response_type(response)
         if response_type != cls.response_type:
             raise ResponseParseError('Unexpected response type: %r' % response_type)
         return cls.Response._make(cls.response_struct.unpack(response))
@@ -323,37 +329,113 @@ class PULSEIO_Base(object):
         if status < 0:
             raise EraseError(status)
 
-    def write(self, data):
+    def write(self, data, window=8, timeout=5.0, max_retries=3):
+        """ Write data at the current position.
+
+        Up to `window` write commands are kept outstanding. The reliable
+        transport retransmits lost packets, so segments are only resent
+        if no response at all is received within `timeout` seconds.
+        """
         if self.fd is None:
             raise ValueError('Handle is not open')
 
         mss = self.socket.mtu - WriteCommand.header_size
-
-        for offset in xrange(0, len(data), mss):
-            segment = data[offset:offset+mss]
-            resp = self._send_and_receive(WriteCommand, WriteResponse, self.fd, self.pos, segment)
+        segments = collections.deque(
+                (self.pos + offset, data[offset:offset+mss])
+                for offset in range(0, len(data), mss))
+        # address -> segment, in the order the segments were sent
+        outstanding = collections.OrderedDict()
+        retries = 0
+        while segments or outstanding:
+            packets = []
+            while segments and len(outstanding) < window:
+                address, segment = segments.popleft()
+                packets.append(WriteCommand(self.fd, address, segment).packet)
+                outstanding[address] = segment
+            if packets:
+                self.socket.send_many(packets)
+
+            try:
+                resp = WriteResponse.parse(
+                        self.socket.receive(block=True, timeout=timeout))
+            except pebble.pulse2.exceptions.ReceiveQueueEmpty:
+                if retries >= max_retries:
+                    raise
+                retries += 1
+                segments.extendleft(reversed(outstanding.items()))
+                outstanding.clear()
+                continue
             assert resp.fd == self.fd
-            assert resp.address == self.pos
-            self.pos += len(segment)
-
-    def read(self, length):
+            if resp.address not in outstanding:
+                # Response to a segment which was sent again after a
+                # timeout, and has already been acknowledged.
+                continue
+            segment = outstanding.pop(resp.address)
+            if resp.length != len(segment):
+                raise ResponseParseError(
+                        'Write response length %d != segment length %d' % (
+                            resp.length, len(segment)))
+        self.pos += len(data)
+
+    def _read_chunks(self, length, timeout=5.0, max_retries=3):
+        """ Read `length` bytes from the current position, yielding
+        (offset, data) pairs relative to the current position as the
+        chunks arrive.
+
+        A single read command is answered with a stream of responses.
+        If the stream stalls for `timeout` seconds, the remainder is
+        requested again.
+        """
         if self.fd is None:
             raise ValueError('Handle is not open')
 
-        cmd = ReadCommand(self.fd, self.pos, length)
-        self.socket.send(cmd.packet)
-
-        data = bytearray()
-        bytes_left = length
-        while bytes_left > 0:
-            packet = self.socket.receive(block=True)
-            fd, chunk_offset, chunk = ReadResponse.parse(packet)
+        received = 0
+        retries = 0
+        self.socket.send(ReadCommand(self.fd, self.pos, length).packet)
+        while received < length:
+            try:
+                packet = self.socket.receive(block=True, timeout=timeout)
+            except pebble.pulse2.exceptions.ReceiveQueueEmpty:
+                if retries >= max_retries:
+                    raise
+                retries += 1
+                self.socket.send(ReadCommand(
+                    self.fd, self.pos + received, length - received).packet)
+                continue
+            fd, chunk_address, chunk = ReadResponse.parse(packet)
             assert fd == self.fd
-            data.extend(chunk)
+            offset = chunk_address - self.pos
+            if offset != received:
+                if offset < received:
+                    # Left over from a read which has been requested again
+                    continue
+                raise ResponseParseError(
+                        'Read response for offset %d, expected %d' % (
+                            offset, received))
+            chunk = chunk[:length - received]
+            yield offset, chunk
+            received += len(chunk)
 
-            bytes_left -= len(chunk)
+    def read(self, length):
+        data = bytearray(length)
+        self.readinto(data)
         return data
 
+    def readinto(self, buffer):
+        """ Read into a caller-supplied writable buffer, filling it. """
+        view = memoryview(buffer).cast('B')
+        for offset, chunk in self._read_chunks(len(view)):
+            view[offset:offset+len(chunk)] = chunk
+        return len(view)
+
+    def read_to_file(self, f, length):
+        """ Read `length` bytes, writing them to the file object `f` as
+        they arrive instead of buffering the whole transfer in memory.
+        """
+        for _, chunk in self._read_chunks(length):
+            f.write(chunk)
+        return length
+
     def crc(self, length):
         if self.fd is None:
             raise ValueError('Handle is not open')
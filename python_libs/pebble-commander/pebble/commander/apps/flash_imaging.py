@@ -1,17 +1,22 @@
 # SPDX-FileCopyrightText: 2024 Google LLC
 # SPDX-License-Identifier: Apache-2.0
 
-from __future__ import absolute_import
+from __future__ import absolute_import, division
 
 import collections
+import logging
 import struct
 import time
 
 import pebble.pulse2.exceptions
+from pebble.pulse2 import stats
 
 from .. import exceptions
 
 
+logger = logging.getLogger(__name__)
+
+
 class EraseCommand(object):
 
     command_type = 1
@@ -177,6 +182,8 @@ class FlashImaging(object):
 
     def __init__(self, link):
         self.socket = link.open_socket('best-effort', self.PORT_NUMBER)
+        # Statistics of the most recent write()
+        self.write_stats = None
 
     def close(self):
         self.socket.close()
@@ -200,7 +207,27 @@ class FlashImaging(object):
                 continue
         raise exceptions.CommandTimedOut
 
-    def write(self, address, data, max_retries=5, max_in_flight=5,
+    # Congestion control for write(). Up to `window` write commands are
+    # kept in flight. The window starts small and grows by one segment
+    # per ACK up to `slow_start_threshold`, then by one segment per
+    # round trip. Whenever a write is lost, the threshold and window are
+    # halved.
+    initial_window = 4
+    # The retry timeout is derived from the measured round-trip time of
+    # write commands, within these bounds.
+    initial_retry_timeout = 0.5
+    min_retry_timeout = 0.05
+    max_retry_timeout = 4.0
+
+    def _retry_timeout(self, rtt, backoff):
+        if rtt.count < 2:
+            timeout = self.initial_retry_timeout
+        else:
+            timeout = rtt.mean + 4 * rtt.stddev
+        timeout = max(timeout, self.min_retry_timeout) * backoff
+        return min(timeout, self.max_retry_timeout)
+
+    def write(self, address, data, max_retries=5, max_in_flight=32,
               progress_cb=None):
         mtu = self.socket.mtu - WriteCommand.header_len
         assert(mtu > 0)
@@ -213,17 +240,63 @@ class FlashImaging(object):
                     (seg_address, WriteCommand(seg_address, segment), 0))
 
         in_flight = collections.OrderedDict()
+        acked = set()
+        rtt = stats.OnlineStatistics()
+        window = float(min(self.initial_window, max_in_flight))
+        slow_start_threshold = max_in_flight
+        backoff = 1
         retries = 0
+        start_time = time.time()
         while unsent or in_flight:
+            # Send out fresh segments, all in one write to the link
+            packets = []
+            send_time = time.time()
+            while unsent and len(in_flight) < int(window):
+                seg_address, cmd, retry_count = unsent.pop()
+                packets.append(cmd.packet)
+                in_flight[cmd.address] = (cmd, send_time, retry_count)
+            if packets:
+                self.socket.send_many(packets)
+
+            # Block until an ACK arrives or the oldest in-flight write
+            # times out, then process any other ACKs which have arrived.
+            retry_timeout = self._retry_timeout(rtt, backoff)
+            _, oldest_send_time, _ = next(iter(in_flight.values()))
+            wait = max(oldest_send_time + retry_timeout - time.time(), 0)
+            lost = []
             try:
+                packet = self.socket.receive(timeout=wait)
                 while True:
-                    # Process ACKs (if any)
-                    ack = WriteResponse.parse(
-                            self.socket.receive(block=False))
-                    try:
-                        cmd, _, _ = in_flight[ack.address]
-                        del in_flight[ack.address]
-                    except KeyError:
+                    ack = WriteResponse.parse(packet)
+                    ack_time = time.time()
+                    if ack.address in acked:
+                        # The ACK for a segment which was retried after
+                        # the first ACK was delayed rather than lost.
+                        packet = self.socket.receive(block=False)
+                        continue
+                    if ack.address in in_flight:
+                        # Writes are carried and processed in order, so
+                        # any writes sent before this one which are still
+                        # in flight must have been lost.
+                        for seg_address in in_flight:
+                            if seg_address == ack.address:
+                                break
+                            if seg_address not in lost:
+                                lost.append(seg_address)
+                        cmd, send_time, retry_count = in_flight.pop(
+                                ack.address)
+                        # Only time writes which were sent once, as it is
+                        # ambiguous which transmission a retried write's
+                        # ACK is for.
+                        if retry_count == 0:
+                            rtt.update(ack_time - send_time)
+                        backoff = 1
+                        if window < slow_start_threshold:
+                            window += 1
+                        else:
+                            window += 1 / window
+                        window = min(window, max_in_flight)
+                    else:
                         for seg_address, cmd, retry_count in unsent:
                             if seg_address == ack.address:
                                 if retry_count == 0:
@@ -240,48 +313,62 @@ class FlashImaging(object):
                                 'Received ACK for an unknown segment: '
                                 '%#.08x' % ack.address)
 
-
                     if len(cmd.data) != ack.length:
                         raise exceptions.WriteError(
                                 'ACK length %d != data length %d' % (
                                     ack.length, len(cmd.data)))
                     assert(ack.complete)
+                    acked.add(ack.address)
                     if progress_cb:
                         progress_cb(True)
+                    packet = self.socket.receive(block=False)
             except pebble.pulse2.exceptions.ReceiveQueueEmpty:
                 pass
 
             # Retry any in_flight writes where the ACK has timed out
-            to_retry = []
-            timeout_time = time.time() - 0.5
-            for (seg_address,
-                    (cmd, send_time, retry_count)) in in_flight.copy().items():
+            timeout_time = time.time() - retry_timeout
+            timed_out = False
+            for seg_address, (_, send_time, _) in in_flight.items():
                 if send_time > timeout_time:
                     # in_flight is an OrderedDict so iteration is in
                     # chronological order.
                     break
+                if seg_address not in lost:
+                    lost.append(seg_address)
+                    timed_out = True
+
+            for seg_address in lost:
+                if seg_address not in in_flight:
+                    # ACKed after all
+                    continue
+                cmd, _, retry_count = in_flight.pop(seg_address)
                 if retry_count >= max_retries:
                     raise exceptions.WriteError(
                         'Segment %#.08x exceeded the max retry count (%d)' % (
                             seg_address, max_retries))
-                # Enqueue the packet again to resend later.
-                del in_flight[seg_address]
-                unsent.appendleft((seg_address, cmd, retry_count+1))
+                # Enqueue the packet again to resend next.
+                unsent.append((seg_address, cmd, retry_count+1))
                 retries += 1
                 if progress_cb:
                     progress_cb(False)
-
-            # Send out fresh segments
-            try:
-                while len(in_flight) < max_in_flight:
-                    seg_address, cmd, retry_count = unsent.pop()
-                    self.socket.send(cmd.packet)
-                    in_flight[cmd.address] = (cmd, time.time(), retry_count)
-            except IndexError:
-                pass
-
-            # Give other threads a chance to run
-            time.sleep(0)
+            if lost:
+                slow_start_threshold = max(window / 2, 1)
+                window = slow_start_threshold
+            if timed_out:
+                backoff = min(backoff * 2, 8)
+
+        elapsed = time.time() - start_time
+        self.write_stats = {
+            'bytes_written': len(data),
+            'elapsed': elapsed,
+            'throughput': len(data) / elapsed if elapsed else float('inf'),
+            'retries': retries,
+            'round_trip_time': rtt,
+            'window': window,
+        }
+        logger.info('Wrote %d bytes in %.3f s (%.1f KiB/s), %d retries, '
+                    'round-trip %s s', len(data), elapsed,
+                    self.write_stats['throughput'] / 1024, retries, rtt)
         return retries
 
     def _command_and_response(self, cmd, timeout=0.5):
@@ -1,6 +1,19 @@
 # SPDX-FileCopyrightText: 2024 Google LLC
 # SPDX-License-Identifier: Apache-2.0
 
+# The STM32 CRC peripheral computes a non-reflected CRC-32 (polynomial
+# 0x04C11DB7, initial value 0xFFFFFFFF, no final XOR) over 32-bit words,
+# feeding in each little-endian word most significant byte first.
+#
+# That is the bit-reversal of the standard reflected CRC-32 computed by
+# zlib over the same bytes with the bits of each byte reversed, so the
+# work is done by binascii.crc32 after translating the input with a byte
+# bit-reversal table and byte-swapping each word. process_word() is the
+# straightforward table-driven definition of the algorithm.
+
+import array
+import binascii
+
 CRC_POLY = 0x04C11DB7
 
 def precompute_table(bits):
@@ -17,23 +30,94 @@ def precompute_table(bits):
 
 lookup_table = precompute_table(8)
 
+_REVERSE_BITS = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+# Feed binascii.crc32 at most this many bytes at a time to bound the size
+# of the translated copy of the input.
+_CHUNK_SIZE = 1 << 20
+
+_WORD_TYPECODE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+def _reverse32(value):
+    return int('{:032b}'.format(value)[::-1], 2)
+
+
+def _to_zlib(crc):
+    return ~_reverse32(crc) & 0xffffffff
+
+
+def _from_zlib(value):
+    return _reverse32(~value & 0xffffffff)
+
+
+def _update_words(value, data):
+    words = array.array(_WORD_TYPECODE)
+    words.frombytes(data)
+    words.byteswap()
+    return binascii.crc32(words.tobytes().translate(_REVERSE_BITS), value)
+
+
+def _update_tail(value, tail):
+    # The CRC data is "padded" in a very unique and confusing fashion:
+    # a trailing partial word is fed in after (4 - len) zero bytes.
+    padded = b'\0' * (4 - len(tail)) + bytes(tail)
+    return binascii.crc32(padded.translate(_REVERSE_BITS), value)
+
+
+class Stm32Crc(object):
+    """ Incrementally compute the STM32 CRC of a stream of data.
+
+    Data may be fed in pieces of any length; the value is the same as
+    that of crc32() over the concatenation of all the pieces.
+    """
+
+    def __init__(self, data=b'', crc=0xffffffff):
+        self._value = _to_zlib(crc)
+        self._pending = b''
+        self.update(data)
+
+    def update(self, data):
+        data = memoryview(data).cast('B')
+        if self._pending:
+            needed = 4 - len(self._pending)
+            self._pending += data[:needed].tobytes()
+            data = data[needed:]
+            if len(self._pending) < 4:
+                return
+            self._value = _update_words(self._value, self._pending)
+            self._pending = b''
+        whole = len(data) & ~3
+        for offset in range(0, whole, _CHUNK_SIZE):
+            self._value = _update_words(
+                    self._value, data[offset:min(offset + _CHUNK_SIZE, whole)])
+        self._pending = data[whole:].tobytes()
+
+    @property
+    def crc(self):
+        value = self._value
+        if self._pending:
+            value = _update_tail(value, self._pending)
+        return _from_zlib(value)
+
+
 def process_word(data, crc=0xffffffff):
     if (len(data) < 4):
         # The CRC data is "padded" in a very unique and confusing fashion.
         data = data[::-1] + b'\0' * (4 - len(data))
 
-    for char in reversed(data):
-        b = char
+    for b in reversed(data):
         crc = ((crc << 8) ^ lookup_table[(crc >> 24) ^ b]) & 0xffffffff
     return crc
 
 def process_buffer(buf, c=0xffffffff):
-    word_count = (len(buf) + 3) // 4
+    return Stm32Crc(buf, c).crc
 
-    crc = c
-    for i in range(word_count):
-        crc = process_word(buf[i * 4 : (i + 1) * 4], crc)
-    return crc
+def process_file(f, c=0xffffffff, chunk_size=_CHUNK_SIZE):
+    crc = Stm32Crc(crc=c)
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        crc.update(chunk)
+    return crc.crc
 
 def crc32(data):
     return process_buffer(data)
@@ -41,14 +125,19 @@ def crc32(data):
 if __name__ == '__main__':
     import sys
 
-    assert(0x89f3bab2 == process_buffer("123 567 901 34"))
-    assert(0xaff19057 == process_buffer("123456789"))
-    assert(0x519b130 == process_buffer("\xfe\xff\xfe\xff"))
-    assert(0x495e02ca == process_buffer("\xfe\xff\xfe\xff\x88"))
+    assert(0x89f3bab2 == process_buffer(b"123 567 901 34"))
+    assert(0xaff19057 == process_buffer(b"123456789"))
+    assert(0x519b130 == process_buffer(b"\xfe\xff\xfe\xff"))
+    assert(0x495e02ca == process_buffer(b"\xfe\xff\xfe\xff\x88"))
 
     print("All tests passed!")
 
+    # arg1 == path to file to crc
+    # arg2 == only crc first N bytes of file specified in arg 1
     if len(sys.argv) >= 2:
-        b = open(sys.argv[1]).read()
+        if len(sys.argv) >= 3:
+            b = open(sys.argv[1], "rb").read(int(sys.argv[2]))
+        else:
+            b = open(sys.argv[1], "rb").read()
         crc = crc32(b)
         print("%u or 0x%x" % (crc, crc))
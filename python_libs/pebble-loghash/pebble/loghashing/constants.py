@@ -26,6 +26,8 @@ NEWLOG_LINE_SUPPORT_REGEX = LOG_LINE_SUPPORT_REGEX.replace('LH', 'NL')
 NEWLOG_HASHED_INFO_REGEX = r"^(?::0[>]? NL:)(?P<hash_key>(?:0x)?[a-f0-9]{1,8})\s?(?P<arg_list>.+)?$"
 POINTER_FORMAT_TAG_REGEX = r"(?P<format>%-?[0-9]*)p"
 HEX_FORMAT_SPECIFIER_REGEX =  r"%[- +#0]*\d*(\.\d+)?(hh|h|l|ll|j|z|t|L)?(x|X)"
+CONVERSION_SPECIFIER_REGEX = r"%(?:%|[- +#0]*(?:\d+|\*)?(?:\.(?:\d+|\*))?(?:hh|h|ll|l|j|z|t|L)?[a-zA-Z])"
+HEX_ARG_REGEX = r"[0-9a-fA-F]+"
 
 # re patterns
 STR_LITERAL_PATTERN = re.compile(STR_LITERAL_REGEX)
@@ -42,6 +44,8 @@ NEWLOG_LINE_SUPPORT_PATTERN = re.compile(NEWLOG_LINE_SUPPORT_REGEX)
 NEWLOG_HASHED_INFO_PATTERN = re.compile(NEWLOG_HASHED_INFO_REGEX)
 POINTER_FORMAT_TAG_PATTERN = re.compile(POINTER_FORMAT_TAG_REGEX)
 HEX_FORMAT_SPECIFIER_PATTERN = re.compile(HEX_FORMAT_SPECIFIER_REGEX)
+CONVERSION_SPECIFIER_PATTERN = re.compile(CONVERSION_SPECIFIER_REGEX)
+HEX_ARG_PATTERN = re.compile(HEX_ARG_REGEX)
 
 # Output file lines
 FORMAT_IDENTIFIER_STRING_FMT = "char *format_string_{} = \"{}\";\n"
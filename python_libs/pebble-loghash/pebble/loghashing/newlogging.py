@@ -8,6 +8,7 @@
 Module for dehashing NewLog input
 """
 
+import itertools
 import os
 import re
 import string
@@ -16,7 +17,9 @@ from pebble.loghashing.constants import (NEWLOG_LINE_CONSOLE_PATTERN,
                                          NEWLOG_LINE_SUPPORT_PATTERN,
                                          NEWLOG_HASHED_INFO_PATTERN,
                                          POINTER_FORMAT_TAG_PATTERN,
-                                         HEX_FORMAT_SPECIFIER_PATTERN)
+                                         HEX_FORMAT_SPECIFIER_PATTERN,
+                                         CONVERSION_SPECIFIER_PATTERN,
+                                         HEX_ARG_PATTERN)
 
 hex_digits = set(string.hexdigits)
 
@@ -43,6 +46,10 @@ level_strings_map = {
 PACKED_CORE_OFFSET = 30
 PACKED_CORE_MASK = 0x03
 
+# Number of lines handed to a worker process at a time by iter_dehash_file()
+DEHASH_CHUNK_LINES = 10000
+
+
 def dehash_file(file_name, log_dict):
     """
     Dehash a file
@@ -54,14 +61,66 @@ def dehash_file(file_name, log_dict):
 
     :returns: A list containing the dehashed lines
     """
-    # Grab the lines from the file
+    return list(iter_dehash_file(file_name, log_dict))
+
+
+def iter_dehash_file(file_name, log_dict, processes=None, chunk_lines=DEHASH_CHUNK_LINES):
+    """
+    Dehash a file, yielding the dehashed lines as the file is read
+
+    :param file_name: Path of the file to dehash
+    :type file_name: str
+    :param log_dict: dict of dicts created from .log_strings section from tintin_fw.elf
+    :type log_dict: dict of dicts
+    :param processes: Number of worker processes to dehash with. None or 1 dehashes in
+                      this process.
+    :type processes: int
+    :param chunk_lines: Number of lines sent to a worker process at a time
+    :type chunk_lines: int
+
+    :returns: A generator of the dehashed lines, in input order
+    """
     with open(file_name, 'r') as fp:
-        lines = fp.readlines()
+        if not processes or processes == 1:
+            for line in Dehasher(log_dict).dehash_lines(fp):
+                yield line
+            return
 
-    # Dehash the lines
-    lines = [dehash_line(x, log_dict) + "\n" for x in lines]
+        import multiprocessing
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(log_dict,))
+        try:
+            chunks = iter(lambda: list(itertools.islice(fp, chunk_lines)), [])
+            for lines in pool.imap(_dehash_chunk, chunks):
+                for line in lines:
+                    yield line
+        finally:
+            pool.terminate()
 
-    return lines
+
+_worker_dehasher = None
+
+
+def _init_worker(log_dict):
+    global _worker_dehasher
+    _worker_dehasher = Dehasher(log_dict)
+
+
+def _dehash_chunk(lines):
+    return list(_worker_dehasher.dehash_lines(lines))
+
+
+def dehash_lines(lines, log_dict):
+    """
+    Dehash an iterable of lines
+
+    :param lines: The lines to dehash, e.g. a file object
+    :type lines: iterable of str
+    :param log_dict: dict of dicts created from .log_strings section from tintin_fw.elf
+    :type log_dict: dict of dicts
+
+    :returns: A generator of the dehashed lines
+    """
+    return Dehasher(log_dict).dehash_lines(lines)
 
 
 def dehash_line(line, log_dict):
@@ -76,10 +135,18 @@ def dehash_line(line, log_dict):
     :returns: Formatted line
               On error, the provided line
     """
-    line_dict = dehash_line_unformatted(line, log_dict)
-    if not line_dict:
-        return line
+    return Dehasher(log_dict).dehash_line(line)
+
 
+def format_line_dict(line_dict):
+    """
+    Format a line_dict as returned by parse_line() with the old formatting.
+
+    :param line_dict: The parsed line
+    :type line_dict: dict
+
+    :returns: Formatted line
+    """
     output = []
     if 'date' not in line_dict and 're_level' in line_dict:
         output.append(line_dict['re_level'])
@@ -131,39 +198,7 @@ def parse_line(line, log_dict):
               'core_number' added. 
               On error, None
     """
-    if not log_dict:
-        return None
-
-    # Handle BLE logs. They have no date, time, level in the input string
-    ble_line = line.startswith(':0> NL:')
-    match = None
-
-    if not ble_line:
-        match = NEWLOG_LINE_CONSOLE_PATTERN.search(line)
-        if not match:
-            match = NEWLOG_LINE_SUPPORT_PATTERN.search(line)
-            if not match:
-                return None
-
-    # Search for the 'msg' in the entire log dictionary, getting back the sub-dictionary for this
-    # specific message
-    if ble_line:
-        line_dict = parse_message(line, log_dict)
-    else:
-        line_dict = parse_message(match.group('msg'), log_dict)
-
-    if line_dict:
-        if ble_line:
-            line_dict['task'] = '-'
-        else:
-            # Add all of the match groups (.e.g, date, time, level) to the line dict
-            line_dict.update(match.groupdict())
-
-        # Fixup 'level' which came from the msg string (re_level) with the ascii char
-        if 'level' in line_dict:
-            line_dict['re_level'] = level_strings_map.get(int(line_dict['level']), '?')
-
-    return line_dict
+    return Dehasher(log_dict).parse_line(line)
 
 
 def parse_message(msg, log_dict):
@@ -177,50 +212,223 @@ def parse_message(msg, log_dict):
 
     :returns: the dict entry for the log line and the formatted message
     """
-    match = NEWLOG_HASHED_INFO_PATTERN.search(msg)
-
-    if not match:
-        return None
-
-    try:
-        line_number = int(match.group('hash_key'), 16)
-        output_dict = log_dict[str(line_number)].copy() # Must be a copy!
-    except KeyError:
-        # Hash key not found. Wrong .elf?
-        return None
-
-    # Python's 'printf' doesn't support %p. Sigh. Convert to %x and hope for the best
-    safe_output_msg = POINTER_FORMAT_TAG_PATTERN.sub('\g<format>x', output_dict['msg'])
-  
-    # Python's 'printf' doesn't handle (negative) 32-bit hex values correct. Build a new
-    # arg list from the parsed arg list by searching for %<format>X conversions and masking
-    # them to 32 bits.
-    arg_list = []
-    index = 0
-    for arg in parse_args(match.group('arg_list')):
-        index = safe_output_msg.find('%', index)
-        if index == -1:
-            # This is going to cause an error below...
-            arg_list.append(arg)
-        elif HEX_FORMAT_SPECIFIER_PATTERN.match(safe_output_msg, index):
-            # We found a %<format>X
-            arg_list.append(arg & 0xFFFFFFFF)
+    return Dehasher(log_dict).parse_message(msg)
+
+
+class CompiledLogString(object):
+    """
+    A .log_strings entry, prepared once for formatting any number of messages
+    """
+
+    # Keys which, if present in a log_dict entry, would be overridden by or change the
+    # meaning of the fields parsed from the log line.
+    LINE_KEYS = frozenset(['task', 'date', 'time', 're_level'])
+
+    def __init__(self, line_number, entry):
+        self.entry = entry
+        self.core_number = str((line_number >> PACKED_CORE_OFFSET) & PACKED_CORE_MASK)
+
+        # Python's 'printf' doesn't support %p. Sigh. Convert to %x and hope for the best
+        self.format_string = POINTER_FORMAT_TAG_PATTERN.sub(r'\g<format>x', entry['msg'])
+
+        # Python's 'printf' doesn't handle (negative) 32-bit hex values correct. Find the
+        # arguments consumed by %<format>X conversions so that they can be masked to 32 bits.
+        self.hex_args = []
+        arg_index = 0
+        for spec in CONVERSION_SPECIFIER_PATTERN.finditer(self.format_string):
+            if spec.group() == '%%':
+                continue
+            # A '*' width or precision takes an argument of its own
+            arg_index += spec.group().count('*')
+            if HEX_FORMAT_SPECIFIER_PATTERN.match(spec.group()):
+                self.hex_args.append(arg_index)
+            arg_index += 1
+
+        # Prefix for the old line formatting, or None if the entry has unusual keys
+        # which require going through format_line_dict().
+        self.level_char = None
+        if 'level' in entry:
+            self.level_char = level_strings_map.get(int(entry['level']), '?')
+        self.location = None
+        if 'file' in entry and 'line' in entry:
+            self.location = '{}:{}>'.format(os.path.basename(entry['file']), entry['line'])
+        self.simple = not (self.LINE_KEYS & set(entry))
+
+    def format(self, msg, raw_args):
+        """
+        Format the message with the given raw argument list
+
+        :param msg: The hashed message, used in the error output
+        :type msg: str
+        :param raw_args: Raw argument list from the hashed message
+        :type raw_args: str
+
+        :returns: The formatted message
+        """
+        arg_list = parse_args(raw_args)
+        for index in self.hex_args:
+            if index < len(arg_list) and isinstance(arg_list[index], int):
+                arg_list[index] &= 0xFFFFFFFF
+
+        # Use "printf" to generate the reconstructed string. Make sure the arguments are correct
+        try:
+            return self.format_string % tuple(arg_list)
+        except (TypeError, UnicodeDecodeError) as e:
+            return msg + ' ----> ERROR: ' + str(e)
+
+
+class Dehasher(object):
+    """
+    Dehashes lines using a log_dict, compiling each log string the first time it is used.
+    """
+
+    def __init__(self, log_dict):
+        self.log_dict = log_dict
+        # hash key (as it appears in the log) -> CompiledLogString, or None if unknown
+        self.compiled = {}
+
+    def lookup(self, hash_key):
+        try:
+            return self.compiled[hash_key]
+        except KeyError:
+            pass
+        line_number = int(hash_key, 16)
+        entry = self.log_dict.get(str(line_number))
+        compiled = None
+        if entry is not None:
+            compiled = CompiledLogString(line_number, entry)
+        self.compiled[hash_key] = compiled
+        return compiled
+
+    def _match(self, line):
+        """
+        Split a line into its hashed message and parsed fields
+
+        :returns: (msg, fields dict, match) or None if the line is not a NewLog line
+        """
+        # Handle BLE logs. They have no date, time, level in the input string
+        if line.startswith(':0> NL:'):
+            return line, None
+
+        match = NEWLOG_LINE_CONSOLE_PATTERN.search(line)
+        if not match:
+            match = NEWLOG_LINE_SUPPORT_PATTERN.search(line)
+            if not match:
+                return None
+        return match.group('msg'), match
+
+    def _parse_message(self, msg):
+        match = NEWLOG_HASHED_INFO_PATTERN.search(msg)
+        if not match:
+            return None, None
+        compiled = self.lookup(match.group('hash_key'))
+        if compiled is None:
+            # Hash key not found. Wrong .elf?
+            return None, None
+        return compiled, compiled.format(msg, match.group('arg_list'))
+
+    def parse_message(self, msg):
+        """
+        Parse the log message part of a line
+
+        :returns: the dict entry for the log line and the formatted message
+        """
+        compiled, output_msg = self._parse_message(msg)
+        if not compiled:
+            return None
+
+        output_dict = compiled.entry.copy() # Must be a copy!
+        output_dict['formatted_msg'] = output_msg
+        output_dict['core_number'] = compiled.core_number
+        return output_dict
+
+    def parse_line(self, line):
+        """
+        Parse a log line
+
+        :returns: A line_dict as for the module-level parse_line(), or None
+        """
+        if not self.log_dict:
+            return None
+
+        matched = self._match(line)
+        if not matched:
+            return None
+        msg, match = matched
+
+        line_dict = self.parse_message(msg)
+        if line_dict:
+            if match is None:
+                line_dict['task'] = '-'
+            else:
+                # Add all of the match groups (.e.g, date, time, level) to the line dict
+                line_dict.update(match.groupdict())
+
+            # Fixup 'level' which came from the msg string (re_level) with the ascii char
+            if 'level' in line_dict:
+                line_dict['re_level'] = level_strings_map.get(int(line_dict['level']), '?')
+
+        return line_dict
+
+    def dehash_line(self, line):
+        """
+        Dehash a line. Return with old formatting.
+
+        :returns: Formatted line
+                  On error, the provided line
+        """
+        if not self.log_dict:
+            return line
+
+        matched = self._match(line)
+        if not matched:
+            return line
+        msg, match = matched
+
+        compiled, output_msg = self._parse_message(msg)
+        if not compiled:
+            return line
+        if not compiled.simple:
+            return format_line_dict(self.parse_line(line))
+
+        output = []
+        if match is None:
+            if compiled.level_char:
+                output.append(compiled.level_char)
+            output.append('-')
         else:
-            arg_list.append(arg)
+            fields = match.groupdict()
+            if 'date' in fields:
+                output.append(fields['date'])
+            else:
+                output.append(compiled.level_char if compiled.level_char is not None
+                              else fields['re_level'])
+                output.append(fields['task'])
+            output.append(fields['time'])
+        if compiled.location:
+            output.append(compiled.location)
+        output.append(output_msg)
+
+        return " ".join(output)
 
-    # Use "printf" to generate the reconstructed string. Make sure the arguments are correct
-    try:
-        output_msg = safe_output_msg % tuple(arg_list)
-    except (TypeError, UnicodeDecodeError) as e:
-        output_msg = msg + ' ----> ERROR: ' + str(e)
+    def dehash_lines(self, lines):
+        """
+        Dehash an iterable of lines
 
-    # Add the formatted msg to the copy of our line dict
-    output_dict['formatted_msg'] = output_msg
+        :returns: A generator of the dehashed lines, each terminated with a newline
+        """
+        for line in lines:
+            yield self.dehash_line(line) + "\n"
 
-    # Add the core number to the line dict
-    output_dict['core_number'] = str((line_number >> PACKED_CORE_OFFSET) & PACKED_CORE_MASK)
 
-    return output_dict
+def _parse_arg(arg, hex_check):
+    if not HEX_ARG_PATTERN.fullmatch(hex_check):
+        # Hack to prevent hex conversion failure
+        return arg
+    # Every parameter is a 32-bit signed integer printed as a hex string with no
+    # leading zeros. Add the zero padding if necessary, convert to 4 hex bytes, 
+    # and then reinterpret as a 32-bit signed big-endian integer.
+    return struct.unpack('>i', bytes.fromhex(arg.rjust(8, '0')))[0]
 
 
 def parse_args(raw_args):
@@ -233,60 +441,51 @@ def parse_args(raw_args):
 
     :returns: A list containing the arguments
     """
+    if not raw_args:
+        return []
+
+    if '`' not in raw_args and raw_args.isprintable():
+        # Fast path: with no strings and no whitespace other than spaces, the arguments
+        # are simply the space-separated words.
+        return [_parse_arg(arg, arg) for arg in raw_args.split()]
+
     args = []
     arg_run = []
     in_str = False
 
-    if raw_args:
-        for arg_ch in raw_args:
+    for arg_ch in raw_args:
 
-            if arg_ch not in "` ":
-                arg_run.append(arg_ch)
-                continue
+        if arg_ch not in "` ":
+            arg_run.append(arg_ch)
+            continue
 
-            if in_str:
-                if arg_ch == ' ':
-                    arg_run.append(' ')
-                else: # Must be ending `
-                    args.append("".join(arg_run).strip())
-                    in_str = False
-                    arg_run = []
-                continue
+        if in_str:
+            if arg_ch == ' ':
+                arg_run.append(' ')
+            else: # Must be ending `
+                args.append("".join(arg_run).strip())
+                in_str = False
+                arg_run = []
+            continue
 
-            # Start of a string 
-            if arg_ch == '`':
-                in_str = True
-                continue
+        # Start of a string 
+        if arg_ch == '`':
+            in_str = True
+            continue
 
-            # Must be a space boundary (arg_ch == ' ')
-
-            arg = "".join(arg_run).strip()
-            if not len(arg):
-                continue
+        # Must be a space boundary (arg_ch == ' ')
 
-            if not all(c in hex_digits for c in arg_run):
-                # Hack to prevent hex conversion failure
-                args.append(arg)
-            else:
-                # Every parameter is a 32-bit signed integer printed as a hex string with no
-                # leading zeros. Add the zero padding if necessary, convert to 4 hex bytes, 
-                # and then reinterpret as a 32-bit signed big-endian integer.
-                args.append(struct.unpack('>i', bytes.fromhex(arg.rjust(8, '0')))[0])
-                
-            arg_run = []
-
-        # Clean up if anything is remaining (there is no trailing space)
         arg = "".join(arg_run).strip()
-        if len(arg):
-            # Handle the case where the trailing ` is missing.
-            if not all(c in hex_digits for c in arg):
-                args.append(arg)
-            else:
-                # Every parameter is a 32-bit signed integer printed as a hex string with no
-                # leading zeros. Add the zero padding if necessary, convert to 4 hex bytes, 
-                # and then reinterpret as a 32-bit signed big-endian integer.
-                args.append(struct.unpack('>i', bytes.fromhex(arg.rjust(8, '0')))[0])
+        if not len(arg):
+            continue
 
-    return args
+        args.append(_parse_arg(arg, "".join(arg_run)))
+        arg_run = []
 
+    # Clean up if anything is remaining (there is no trailing space)
+    arg = "".join(arg_run).strip()
+    if len(arg):
+        # Handle the case where the trailing ` is missing.
+        args.append(_parse_arg(arg, arg))
 
+    return args
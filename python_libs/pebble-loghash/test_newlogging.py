@@ -8,7 +8,8 @@
 Tests for pebble.loghashing.newlogging
 """
 
-from pebble.loghashing.newlogging import dehash_line, dehash_line_unformatted
+from pebble.loghashing.newlogging import (dehash_line, dehash_line_unformatted, dehash_file,
+                                          iter_dehash_file, Dehasher)
 from pebble.loghashing.dehashing import dehash_line as legacy_dehash_line
 import os
 
@@ -47,6 +48,11 @@ test_log_dict = {'43': {'file':  '../src/fw/activity/activity.c',
                           'level': '0',
                           'line': '69',
                           'msg': 'Init BLE SPI Protocol'},
+                '300': {'color': 'GREY',
+                          'file': 'mixed.c',
+                          'level': '200',
+                          'line': '12',
+                          'msg': '%d %x %%d %*d %lX'},
                 'new_logging_version': 'NL0101'
                 }
 
@@ -213,3 +219,45 @@ def test_ble_decode():
     assert (os.path.basename(line_dict['file']) == "hc_protocol.c")
     assert (line_dict['line'] == "69")
     assert (line_dict['formatted_msg'] == "Init BLE SPI Protocol")
+
+
+def test_hex_mask_per_argument():
+    """
+    Only the arguments consumed by hex conversions are masked to 32 bits
+    """
+    line = "? A 21:35:14.375 :0> NL:{:x} ffffffff ffffffff 3 ffffffff ffffffff".format(300)
+    assert ("D A 21:35:14.375 mixed.c:12> -1 ffffffff %d  -1 FFFFFFFF" ==
+            dehash_line(line, test_log_dict))
+
+
+def test_dehasher_lines():
+    """
+    Test Dehasher.dehash_lines() against dehash_line()
+    """
+    lines = ["? A 21:35:14.375 :0> NL:{:x} a a `Success`".format(114),
+             "2015-09-05 02:16:19:000GMT :0> NL:{:x} 164 1FfF".format(214),
+             "D A 21:35:14.375 file.c:0> This is an app debug line",
+             ":0> NL:{:x}".format(1073741824)]
+    dehasher = Dehasher(test_log_dict)
+    assert ([dehash_line(line, test_log_dict) + "\n" for line in lines] ==
+            list(dehasher.dehash_lines(lines)))
+    # Each log string is only compiled once
+    assert (list(dehasher.dehash_lines(lines)) == list(dehasher.dehash_lines(lines)))
+    assert (len(dehasher.compiled) == 3)
+
+
+def test_dehash_file(tmp_path):
+    """
+    Test dehash_file() and iter_dehash_file() with and without worker processes
+    """
+    lines = ["? A 21:35:14.375 :0> NL:{:x} {:x} {:x} `Success`".format(114, i, i)
+             for i in range(100)]
+    lines.append("D A 21:35:14.375 file.c:0> This is an app debug line")
+    log_file = tmp_path / 'log.txt'
+    log_file.write_text("\n".join(lines))
+
+    expected = [dehash_line(line, test_log_dict) + "\n"
+                for line in log_file.read_text().splitlines(True)]
+    assert (expected == dehash_file(str(log_file), test_log_dict))
+    assert (expected == list(iter_dehash_file(str(log_file), test_log_dict,
+                                              processes=2, chunk_lines=7)))
@@ -0,0 +1,333 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+'''asyncio implementation of the PULSEv2 protocol stack.
+
+The classes in this module are variants of the threaded Interface, Link,
+transports and control protocols which do all of their work on an
+asyncio event loop. Frames are read by a task instead of a dedicated
+receive thread, protocol timers are scheduled with `loop.call_later`
+instead of a `threading.Timer` per timeout, and sockets have an
+awaitable `receive()`. One event loop can therefore drive any number of
+links concurrently.
+
+The objects are not thread-safe: they must be created and used from
+within the event loop.
+
+>>> interface = await AsyncInterface.open_dbgserial('qemu')
+>>> link = await interface.get_link()
+>>> socket = await link.open_socket('reliable', 0x3e20)
+>>> socket.send(b'ping')
+>>> response = await socket.receive(timeout=1.0)
+'''
+
+from __future__ import absolute_import
+
+import asyncio
+
+import serial
+
+from . import exceptions, framing, link, pcmp, ppp, transports
+
+
+async def wait_for_event(event, timeout):
+    '''Wait for an `asyncio.Event` to be set.
+
+    Returns True if the event was set, or False if the timeout expired.
+    '''
+    if event.is_set():
+        return True
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+class LoopTimer(object):
+    '''A `threading.Timer` work-alike which calls its function from the
+    running event loop.
+    '''
+
+    def __init__(self, interval, function):
+        self.interval = interval
+        self.function = function
+        self.daemon = True
+        self.handle = None
+        self.cancelled = False
+
+    def start(self):
+        if self.handle is not None:
+            raise RuntimeError('timers can only be started once')
+        if not self.cancelled:
+            self.handle = asyncio.get_running_loop().call_later(
+                    self.interval, self.function)
+
+    def cancel(self):
+        self.cancelled = True
+        if self.handle is not None:
+            self.handle.cancel()
+
+
+class LoopTimerMixin(object):
+    '''Schedule protocol timers on the event loop.
+    '''
+
+    def create_timer(self, interval, function):
+        return LoopTimer(interval, function)
+
+
+class AsyncSocket(transports.Socket):
+    '''A transport socket with an awaitable `receive()`.
+    '''
+
+    def __init__(self, transport, port):
+        transports.Socket.__init__(self, transport, port)
+        self.receive_queue = asyncio.Queue()
+
+    async def receive(self, timeout=None):
+        if self.closed:
+            raise exceptions.SocketClosed('I/O operation on closed socket')
+        try:
+            info_good, info = await asyncio.wait_for(
+                    self.receive_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            raise exceptions.ReceiveQueueEmpty
+        if not info_good:
+            assert self.closed
+            raise exceptions.SocketClosed('Socket closed during receive')
+        return info
+
+    def receive_nowait(self):
+        if self.closed:
+            raise exceptions.SocketClosed('I/O operation on closed socket')
+        try:
+            info_good, info = self.receive_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            raise exceptions.ReceiveQueueEmpty
+        if not info_good:
+            raise exceptions.SocketClosed('Socket closed during receive')
+        return info
+
+
+class AsyncPulseControlMessageProtocol(LoopTimerMixin,
+                                       pcmp.PulseControlMessageProtocol):
+    pass
+
+
+class AsyncTransportControlProtocol(LoopTimerMixin,
+                                    transports.TransportControlProtocol):
+    pass
+
+
+class AsyncLinkControlProtocol(LoopTimerMixin, ppp.LinkControlProtocol):
+    pass
+
+
+class AsyncBestEffortApplicationTransport(
+        transports.BestEffortApplicationTransport):
+
+    def __init__(self, interface, link_mtu):
+        transports.BestEffortApplicationTransport.__init__(
+                self, interface, link_mtu)
+        self.opened = asyncio.Event()
+
+    def create_control_protocol(self, interface, display_name):
+        return AsyncTransportControlProtocol(
+                interface=interface, transport=self,
+                ncp_protocol=self.NCP_PROTOCOL_NUMBER,
+                display_name=display_name)
+
+    def create_pcmp(self):
+        return AsyncPulseControlMessageProtocol(
+                self, pcmp.PulseControlMessageProtocol.PORT)
+
+    async def open_socket(self, port, timeout=30.0, factory=AsyncSocket):
+        if not await wait_for_event(self.opened, timeout):
+            return None
+        return transports.BestEffortTransportBase.open_socket(
+                self, port, factory)
+
+
+class AsyncReliableTransport(LoopTimerMixin, transports.ReliableTransport):
+
+    def __init__(self, interface, link_mtu):
+        transports.ReliableTransport.__init__(self, interface, link_mtu)
+        self.opened = asyncio.Event()
+
+    def create_control_protocol(self, interface, display_name):
+        return AsyncTransportControlProtocol(
+                interface=interface, transport=self,
+                ncp_protocol=self.NCP_PROTOCOL_NUMBER,
+                display_name=display_name)
+
+    def create_pcmp(self):
+        return AsyncPulseControlMessageProtocol(
+                self, pcmp.PulseControlMessageProtocol.PORT)
+
+    async def open_socket(self, port, timeout=30.0, factory=AsyncSocket):
+        self._check_port_available(port)
+        if not await wait_for_event(self.opened, timeout):
+            return None
+        return self._bind_socket(port, factory)
+
+
+class AsyncLink(link.Link):
+    '''The connectionful portion of a PULSE2 interface, with awaitable
+    socket opening.
+    '''
+
+    # Separate registry from the threaded Link
+    TRANSPORTS = {}
+
+    async def open_socket(self, transport, port, timeout=30.0):
+        if self.closed:
+            raise ValueError('Cannot open socket on closed Link')
+        if transport not in self.transports:
+            raise KeyError('Unknown transport %r' % transport)
+        return await self.transports[transport].open_socket(port, timeout)
+
+
+class SerialStream(object):
+    '''Adapts a pyserial port to the subset of the asyncio stream reader
+    and writer APIs used by AsyncInterface.
+
+    The event loop watches the port's file descriptor for received data,
+    so this only works with ports which have one (i.e. not on Windows).
+    '''
+
+    def __init__(self, port):
+        self.port = port
+        self.port.timeout = 0
+        self.loop = asyncio.get_running_loop()
+        self.reader = asyncio.StreamReader()
+        self.fd = port.fileno()
+        self.loop.add_reader(self.fd, self._data_available)
+
+    def _data_available(self):
+        try:
+            data = self.port.read(max(self.port.in_waiting, 1))
+        except serial.SerialException as e:
+            self.loop.remove_reader(self.fd)
+            self.reader.set_exception(e)
+            return
+        self.reader.feed_data(data)
+
+    async def read(self, n=-1):
+        return await self.reader.read(n)
+
+    def write(self, data):
+        self.port.write(data)
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        self.port.close()
+        self.reader.feed_eof()
+
+
+class AsyncInterface(link.Interface):
+    '''The PULSEv2 lower data-link layer, driven by an asyncio event
+    loop.
+
+    The Interface is bound to a pair of asyncio stream reader and writer
+    objects. Use the `open_connection` or `open_dbgserial` coroutines to
+    create one.
+    '''
+
+    read_size = 65536
+
+    def __init__(self, reader, writer, capture_stream=None):
+        self.reader = reader
+        self.lower_layer_finished = asyncio.Event()
+        link.Interface.__init__(self, writer, capture_stream)
+        self.link_available = asyncio.Event()
+
+    @classmethod
+    async def open_connection(cls, host='localhost', port=12345,
+                              capture_stream=None):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer, capture_stream)
+
+    @classmethod
+    async def open_dbgserial(cls, url=None, capture_stream=None):
+        if url is None:
+            url = link.get_dbgserial_tty()
+        elif url == 'qemu':
+            url = 'socket://localhost:12345'
+        if url.startswith('socket://'):
+            host, _, port = url[len('socket://'):].partition(':')
+            return await cls.open_connection(host, int(port), capture_stream)
+        stream = SerialStream(serial.serial_for_url(
+            url, **link.DBGSERIAL_PORT_SETTINGS))
+        return cls(stream, stream, capture_stream)
+
+    def start_receiving(self):
+        self.receive_task = asyncio.get_running_loop().create_task(
+                self.receive_loop())
+
+    async def receive_loop(self):
+        splitter = framing.FrameSplitter()
+        while not self.closed:
+            try:
+                data = await self.reader.read(self.read_size)
+            except IOError:
+                if not self.closed:
+                    self.logger.exception('Unexpected error while reading '
+                                          'from iostream')
+                    self._down()
+                break
+            if not data:
+                if not self.closed:
+                    self.logger.info('iostream closed; bringing interface '
+                                     'down')
+                    self._down()
+                break
+            splitter.write(data)
+            for frame in splitter:
+                self.handle_frame(frame)
+        self.logger.info('Interface closed; receive loop exiting')
+
+    def _down(self):
+        link.Interface._down(self)
+        self.lower_layer_finished.set()
+
+    def create_lcp(self):
+        return AsyncLinkControlProtocol(self)
+
+    def create_link(self, mtu):
+        return AsyncLink(self, mtu=mtu)
+
+    async def get_link(self, timeout=60.0):
+        '''Get the opened Link object for this interface.
+
+        Waits for the Link to be available. Returns `None` if the timeout
+        expires before the link is available.
+        '''
+        if self.closed:
+            raise ValueError('No link available on closed interface')
+        if await wait_for_event(self.link_available, timeout):
+            assert self._link is not None
+            return self._link
+
+    async def close(self, timeout=5.0):
+        '''Gracefully close the link, then close the interface.
+        '''
+        if self.closed:
+            return
+        if self.lcp.state not in ('Initial', 'Starting', 'Closed', 'Stopped'):
+            # The iostream could also be closed from underneath us while
+            # waiting for the peer to acknowledge the termination.
+            self.lcp.on_link_finished = self.lower_layer_finished.set
+            self.lcp.close()
+            await wait_for_event(self.lower_layer_finished, timeout)
+        self.close_all_sockets()
+        self._down()
+        if self.pcap:
+            self.pcap.close()
+        if self.receive_task is not asyncio.current_task():
+            self.receive_task.cancel()
+
+
+AsyncLink.register_transport(
+        'best-effort', AsyncBestEffortApplicationTransport)
+AsyncLink.register_transport('reliable', AsyncReliableTransport)
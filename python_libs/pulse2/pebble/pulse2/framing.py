@@ -12,18 +12,19 @@ datagrams themselves are not examined or parsed.
 from __future__ import absolute_import
 
 import binascii
+import collections
 import struct
 
-try:
-    import queue
-except ImportError:  # Py2
-    import Queue as queue
-
 from cobs import cobs
 
 
 FLAG = 0x55
+FLAG_BYTE = b'\x55'
 CRC32_RESIDUE = binascii.crc32(b'\0' * 4)
+FCS = struct.Struct('<I')
+# COBS eliminates zero bytes from the frame contents, which frees up
+# the zero value to take the place of the flag byte.
+ESCAPE_FLAG = bytes.maketrans(FLAG_BYTE, b'\0')
 
 
 class FramingException(Exception):
@@ -54,7 +55,7 @@ class FrameSplitter(object):
     '''
 
     def __init__(self, max_frame_length=0):
-        self.frames = queue.Queue()
+        self.frames = collections.deque()
         self.input_buffer = bytearray()
         self.max_frame_length = max_frame_length
         self.waiting_for_sync = True
@@ -62,28 +63,48 @@ class FrameSplitter(object):
     def write(self, data):
         '''Write bytes into the splitter for processing.
         '''
-        for char in bytearray(data):
+        # Scan for flag bytes with bytes.find() and slice out whole runs
+        # of frame content so that no per-byte work is done in Python.
+        data = bytes(data)
+        end = len(data)
+        position = 0
+        while position < end:
+            flag_position = data.find(FLAG_BYTE, position)
             if self.waiting_for_sync:
-                if char == FLAG:
-                    self.waiting_for_sync = False
-            else:
-                if char == FLAG:
-                    if self.input_buffer:
-                        self.frames.put_nowait(bytes(self.input_buffer))
-                        self.input_buffer = bytearray()
-                else:
-                    if (not self.max_frame_length or
-                            len(self.input_buffer) < self.max_frame_length):
-                        self.input_buffer.append(char)
-                    else:
-                        self.input_buffer = bytearray()
-                        self.waiting_for_sync = True
+                if flag_position < 0:
+                    return
+                self.waiting_for_sync = False
+                position = flag_position + 1
+                continue
+
+            run_end = end if flag_position < 0 else flag_position
+            room = (max(self.max_frame_length - len(self.input_buffer), 0)
+                    if self.max_frame_length else run_end - position)
+            if run_end - position > room:
+                # The byte which would have made the frame too long is
+                # discarded along with the frame, then the splitter
+                # waits for the next flag to resynchronize.
+                self.input_buffer = bytearray()
+                self.waiting_for_sync = True
+                position += room + 1
+                continue
+
+            if flag_position < 0:
+                self.input_buffer += data[position:]
+                return
+            if self.input_buffer:
+                self.input_buffer += data[position:flag_position]
+                self.frames.append(bytes(self.input_buffer))
+                self.input_buffer = bytearray()
+            elif flag_position > position:
+                self.frames.append(data[position:flag_position])
+            position = flag_position + 1
 
     def __iter__(self):
         while True:
             try:
-                yield self.frames.get_nowait()
-            except queue.Empty:
+                yield self.frames.popleft()
+            except IndexError:
                 return
 
 
@@ -125,13 +146,22 @@ def decode_frame(frame_bytes):
     return strip_fcs(decode_transparency(frame_bytes))
 
 
+def encode_frame_into(buffer, datagram):
+    '''Encode a datagram in a PULSEv2 frame, appending the frame to
+    `buffer`, which must be a bytearray.
+
+    Encoding many datagrams into the same buffer allows them to be
+    written to the I/O stream at once.
+    '''
+    fcs = binascii.crc32(datagram) & 0xffffffff
+    buffer += FLAG_BYTE
+    buffer += cobs.encode(b''.join((datagram, FCS.pack(fcs)))).translate(
+            ESCAPE_FLAG)
+    buffer += FLAG_BYTE
+    return buffer
+
+
 def encode_frame(datagram):
     '''Encode a datagram in a PULSEv2 frame.
     '''
-    datagram = bytearray(datagram)
-    fcs = binascii.crc32(datagram) & 0xffffffff
-    fcs_bytes = struct.pack('<I', fcs)
-    datagram.extend(fcs_bytes)
-    flag = bytearray([FLAG])
-    frame = cobs.encode(bytes(datagram)).replace(flag, b'\0')
-    return flag + frame + flag
+    return bytes(encode_frame_into(bytearray(), datagram))
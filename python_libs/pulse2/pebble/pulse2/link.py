@@ -54,6 +54,7 @@ class Interface(object):
         self.iostream = iostream
         self.closed = False
         self.close_lock = threading.RLock()
+        self.send_lock = threading.Lock()
         self.default_packet_handler_cb = None
         self.sockets = {}
 
@@ -62,15 +63,13 @@ class Interface(object):
             self.pcap = pcap_file.PcapWriter(
                     capture_stream, pcap_file.LINKTYPE_PPP_WITH_DIR)
 
-        self.receive_thread = threading.Thread(target=self.receive_loop)
-        self.receive_thread.daemon = True
-        self.receive_thread.start()
+        self.start_receiving()
 
         self.simplex_transport = transports.SimplexTransport(self)
 
         self._link = None
         self.link_available = threading.Event()
-        self.lcp = ppp.LinkControlProtocol(self)
+        self.lcp = self.create_lcp()
         self.lcp.on_link_up = self.on_link_up
         self.lcp.on_link_down = self.on_link_down
         self.lcp.up()
@@ -92,6 +91,19 @@ class Interface(object):
 
         return cls(ser, capture_stream)
 
+    def start_receiving(self):
+        '''Start reading frames from the iostream.
+        '''
+        self.receive_thread = threading.Thread(target=self.receive_loop)
+        self.receive_thread.daemon = True
+        self.receive_thread.start()
+
+    def create_lcp(self):
+        return ppp.LinkControlProtocol(self)
+
+    def create_link(self, mtu):
+        return Link(self, mtu=mtu)
+
     def connect(self, protocol):
         '''Open a link-layer socket for sending and receiving packets
         of a specific protocol number.
@@ -118,7 +130,11 @@ class Interface(object):
                 self.logger.info('Interface closed; receive loop exiting')
                 break
             try:
-                splitter.write(self.iostream.read(1))
+                # Block for at least one byte, but take everything that
+                # has already been buffered so that it can be split into
+                # frames in bulk.
+                splitter.write(self.iostream.read(
+                    max(getattr(self.iostream, 'in_waiting', 0), 1)))
             except IOError:
                 if self.closed:
                     self.logger.info('Interface closed; receive loop exiting')
@@ -129,28 +145,49 @@ class Interface(object):
                 break
 
             for frame in splitter:
-                try:
-                    datagram = framing.decode_frame(frame)
-                    if self.pcap:
-                        # Prepend pseudo-header meaning "received by this host"
-                        self.pcap.write_packet(b'\0' + datagram)
-                    protocol, information = ppp.unencapsulate(datagram)
-                    if protocol in self.sockets:
-                        self.sockets[protocol].handle_packet(information)
-                    else:
-                        # TODO LCP Protocol-Reject
-                        self.logger.info('Protocol-reject: %04X', protocol)
-                except (framing.DecodeError, framing.CorruptFrame):
-                    pass
+                self.handle_frame(frame)
+
+    def handle_frame(self, frame):
+        '''Decode a received frame and dispatch it to the socket bound
+        to its protocol.
+        '''
+        try:
+            datagram = framing.decode_frame(frame)
+            if self.pcap:
+                # Prepend pseudo-header meaning "received by this host"
+                self.pcap.write_packet(b'\0' + datagram)
+            protocol, information = ppp.unencapsulate(datagram)
+            if protocol in self.sockets:
+                self.sockets[protocol].handle_packet(information)
+            else:
+                # TODO LCP Protocol-Reject
+                self.logger.info('Protocol-reject: %04X', protocol)
+        except (framing.DecodeError, framing.CorruptFrame):
+            pass
 
     def send_packet(self, protocol, packet):
+        self.send_many([(protocol, packet)])
+
+    def send_many(self, packets):
+        '''Send several link-layer packets with a single write to the
+        I/O stream.
+
+        `packets` is an iterable of `(protocol, packet)` tuples. The
+        packets are framed back-to-back into one buffer, which is
+        handed to the I/O stream as-is.
+        '''
         if self.closed:
             raise ValueError('I/O operation on closed interface')
-        datagram = ppp.encapsulate(protocol, packet)
-        if self.pcap:
-            # Prepend pseudo-header meaning "sent by this host"
-            self.pcap.write_packet(b'\x01' + datagram)
-        self.iostream.write(framing.encode_frame(datagram))
+        frames = bytearray()
+        for protocol, packet in packets:
+            datagram = ppp.encapsulate(protocol, packet)
+            if self.pcap:
+                # Prepend pseudo-header meaning "sent by this host"
+                self.pcap.write_packet(b'\x01' + datagram)
+            framing.encode_frame_into(frames, datagram)
+        if frames:
+            with self.send_lock:
+                self.iostream.write(frames)
 
     def close_all_sockets(self):
         # Iterating over a copy of sockets since socket.close() can call
@@ -183,7 +220,7 @@ class Interface(object):
 
     def on_link_up(self):
         # FIXME PBL-34320 proper MTU/MRU support
-        self._link = Link(self, mtu=1500)
+        self._link = self.create_link(mtu=1500)
         # Test whether the link is ready to carry traffic
         self.lcp.ping(self._ping_done)
 
@@ -244,6 +281,14 @@ class InterfaceSocket(object):
             raise exceptions.SocketClosed('I/O operation on closed socket')
         self.interface.send_packet(self.protocol, information)
 
+    def send_many(self, informations):
+        '''Send several packets with a single write to the I/O stream.
+        '''
+        if self.closed:
+            raise exceptions.SocketClosed('I/O operation on closed socket')
+        self.interface.send_many(
+                (self.protocol, information) for information in informations)
+
     def handle_packet(self, information):
         if self.on_packet and not self.closed:
             self.on_packet(information)
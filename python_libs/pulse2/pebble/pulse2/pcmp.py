@@ -78,6 +78,11 @@ class PulseControlMessageProtocol(object):
         self.ping_attempts_remaining = 0
         self.ping_timer = None
 
+    def create_timer(self, interval, function):
+        timer = threading.Timer(interval, function)
+        timer.daemon = True
+        return timer
+
     def close(self):
         if self.closed:
             return
@@ -168,9 +173,8 @@ class PulseControlMessageProtocol(object):
             self.ping_attempts_remaining = attempts - 1
             self.ping_timeout = timeout
             self.send_echo_request(b'')
-            self.ping_timer = threading.Timer(timeout,
-                                              self._ping_timer_expired)
-            self.ping_timer.daemon = True
+            self.ping_timer = self.create_timer(timeout,
+                                                self._ping_timer_expired)
             self.ping_timer.start()
 
     def _ping_timer_expired(self):
@@ -181,9 +185,8 @@ class PulseControlMessageProtocol(object):
             if self.ping_attempts_remaining:
                 self.ping_attempts_remaining -= 1
                 self.send_echo_request(b'')
-                self.ping_timer = threading.Timer(self.ping_timeout,
-                                                  self._ping_timer_expired)
-                self.ping_timer.daemon = True
+                self.ping_timer = self.create_timer(self.ping_timeout,
+                                                    self._ping_timer_expired)
                 self.ping_timer.start()
             else:
                 self.ping_cb(False)
@@ -68,6 +68,10 @@ def OptionalGreedyString(name):
 
 class Constructors:
     '''Namespace for Construct parsers.
+
+    These are the reference specifications of the packet formats. The
+    classes below parse and build packets using precompiled struct
+    codecs which are equivalent to these definitions.
     '''
     LCPPacket = construct.Struct('LCPPacket',  # noqa
             construct.Byte('code'),
@@ -99,12 +103,9 @@ class Constructors:
         )
 
 
-def _parse_or_reraise(parser, data):
-    try:
-        parsed_data = parser.parse(data)
-    except (construct.ConstructError, ValueError) as e:
-        raise ParseError(str(e))
-    return parsed_data
+LCP_HEADER = struct.Struct('!BBH')
+OPTION_HEADER = struct.Struct('!BB')
+MAGIC_NUMBER = struct.Struct('!I')
 
 
 class LCPEncapsulation(collections.namedtuple(
@@ -117,16 +118,25 @@ class LCPEncapsulation(collections.namedtuple(
 
     @classmethod
     def parse(cls, packet):
-        fields = _parse_or_reraise(Constructors.LCPPacket, packet)
-        if len(fields.data) + cls.header_length != fields.length:
+        packet = bytes(packet)
+        if len(packet) < cls.header_length:
+            raise ParseError('packet too short')
+        code, identifier, length = LCP_HEADER.unpack_from(packet)
+        if length < cls.header_length:
+            raise ParseError('invalid length field (%d)' % length)
+        if len(packet) < length:
             raise ParseError('packet truncated or corrupt')
-        return cls(fields.code, fields.identifier, fields.data, fields.padding)
+        return cls(code, identifier, packet[cls.header_length:length],
+                   packet[length:])
 
     @classmethod
     def build(cls, code, identifier, data):
-        return Constructors.LCPPacket.build(construct.Container(
-                code=code, identifier=identifier,
-                length=len(data)+cls.header_length, data=data, padding=b''))
+        data = bytes(data)
+        try:
+            return LCP_HEADER.pack(
+                    code, identifier, len(data)+cls.header_length) + data
+        except struct.error as e:
+            raise ValueError(str(e))
 
 
 Option = collections.namedtuple('Option', 'type data')
@@ -142,16 +152,28 @@ class OptionList:
 
     @staticmethod
     def parse(data):
-        if not data:
-            return []
-        options = _parse_or_reraise(Constructors.OptionList, data).options
-        return [Option(opt.type, opt.data) for opt in options]
+        data = bytes(data)
+        options = []
+        offset = 0
+        while offset < len(data):
+            if len(data) - offset < 2:
+                raise ParseError('option truncated')
+            type_, length = OPTION_HEADER.unpack_from(data, offset)
+            if length < 2:
+                raise ParseError('invalid option length (%d)' % length)
+            if len(data) - offset < length:
+                raise ParseError('option truncated')
+            options.append(Option(type_, data[offset+2:offset+length]))
+            offset += length
+        return options
 
     @staticmethod
     def build(options):
-        return b''.join(Constructors.Option.build(construct.Container(
-                            type=type_, length=len(data)+2, data=data))
-                        for type_, data in options)
+        try:
+            return b''.join(OPTION_HEADER.pack(type_, len(data)+2) +
+                            bytes(data) for type_, data in options)
+        except struct.error as e:
+            raise ValueError(str(e))
 
 
 class ProtocolReject(collections.namedtuple(
@@ -162,7 +184,10 @@ class ProtocolReject(collections.namedtuple(
 
     @classmethod
     def parse(cls, data):
-        return cls(**_parse_or_reraise(Constructors.ProtocolReject, data))
+        data = bytes(data)
+        if len(data) < 2:
+            raise ParseError('packet too short')
+        return cls(struct.unpack_from('!H', data)[0], data[2:])
 
 
 class MagicNumberAndData(collections.namedtuple(
@@ -176,12 +201,17 @@ class MagicNumberAndData(collections.namedtuple(
 
     @classmethod
     def parse(cls, data):
-        return cls(**_parse_or_reraise(Constructors.MagicPlusData, data))
+        data = bytes(data)
+        if len(data) < MAGIC_NUMBER.size:
+            raise ParseError('packet too short')
+        return cls(MAGIC_NUMBER.unpack_from(data)[0], data[MAGIC_NUMBER.size:])
 
     @staticmethod
     def build(magic_number, data):
-        return Constructors.MagicPlusData.build(construct.Container(
-            magic_number=magic_number, data=data))
+        try:
+            return MAGIC_NUMBER.pack(magic_number) + bytes(data)
+        except struct.error as e:
+            raise ValueError(str(e))
 
 @enum.unique
 class ControlCode(enum.Enum):
@@ -564,6 +594,20 @@ class ControlProtocol(object):
         self.close()
         self.is_finished.wait()
 
+    # Timers
+
+    def create_timer(self, interval, function):
+        '''Create a timer object which calls `function` once `interval`
+        seconds after the timer is started.
+
+        The returned object must support the `start()` and `cancel()`
+        methods of `threading.Timer`. Subclasses may override this method
+        to run timers on something other than a dedicated thread.
+        '''
+        timer = threading.Timer(interval, function)
+        timer.daemon = True
+        return timer
+
     # Restart timer
 
     def start_restart_timer(self, timeout):
@@ -572,11 +616,10 @@ class ControlProtocol(object):
             if self.restart_timer is not None:
                 self.restart_timer.cancel()
                 self.restart_timer_generation_id += 1
-            self.restart_timer = threading.Timer(
+            self.restart_timer = self.create_timer(
                     timeout, functools.partial(
                         self.restart_timer_expired,
                         self.restart_timer_generation_id))
-            self.restart_timer.daemon = True
             self.restart_timer.start()
 
     def stop_restart_timer(self, *args):
@@ -786,10 +829,10 @@ class ControlProtocol(object):
                         return
                 elif code == ControlCode.Configure_Nak:
                     self.handle_configure_nak(options)
-                    self.receive_configure_nak_or_reject()
+                    self.receive_configure_nak_or_rej()
                 elif code == ControlCode.Configure_Reject:
                     self.handle_configure_reject(options)
-                    self.receive_configure_nak_or_reject()
+                    self.receive_configure_nak_or_rej()
                 else:
                     assert False, 'impossible state'
         elif code == ControlCode.Terminate_Request:
@@ -981,9 +1024,8 @@ class LinkControlProtocol(ControlProtocol):
             self.ping_attempts_remaining = attempts - 1
             self.ping_timeout = timeout
             self._send_echo_request(b'')
-            self.ping_timer = threading.Timer(timeout,
-                                              self._ping_timer_expired)
-            self.ping_timer.daemon = True
+            self.ping_timer = self.create_timer(timeout,
+                                                self._ping_timer_expired)
             self.ping_timer.start()
 
     def _send_echo_request(self, data):
@@ -1050,9 +1092,8 @@ class LinkControlProtocol(ControlProtocol):
             if self.ping_attempts_remaining:
                 self.ping_attempts_remaining -= 1
                 self._send_echo_request(b'')
-                self.ping_timer = threading.Timer(self.ping_timeout,
-                                                  self._ping_timer_expired)
-                self.ping_timer.daemon = True
+                self.ping_timer = self.create_timer(self.ping_timeout,
+                                                    self._ping_timer_expired)
                 self.ping_timer.start()
             else:
                 self.ping_cb(False)
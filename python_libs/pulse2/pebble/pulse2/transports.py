@@ -3,7 +3,9 @@
 
 from __future__ import absolute_import
 
+import collections
 import logging
+import struct
 import threading
 import time
 try:
@@ -24,6 +26,10 @@ logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
+class ParseError(exceptions.PulseException):
+    pass
+
+
 class Socket(object):
     '''A socket for sending and receiving packets over a single port
     of a PULSE2 transport.
@@ -36,7 +42,7 @@ class Socket(object):
         self.receive_queue = queue.Queue()
 
     def on_receive(self, packet):
-        self.receive_queue.put((True, packet))
+        self.receive_queue.put_nowait((True, packet))
 
     def receive(self, block=True, timeout=None):
         if self.closed:
@@ -55,6 +61,14 @@ class Socket(object):
             raise exceptions.SocketClosed('I/O operation on closed socket')
         self.transport.send(self.port, information)
 
+    def send_many(self, informations):
+        '''Send several packets, coalescing them into as few writes to
+        the underlying I/O stream as the transport allows.
+        '''
+        if self.closed:
+            raise exceptions.SocketClosed('I/O operation on closed socket')
+        self.transport.send_many(self.port, informations)
+
     def close(self):
         if self.closed:
             return
@@ -62,7 +76,7 @@ class Socket(object):
         self.transport.unregister_socket(self.port)
         # Wake up the thread blocking on a receive (if any) so that it
         # can abort the receive quickly.
-        self.receive_queue.put((False, None))
+        self.receive_queue.put_nowait((False, None))
 
     @property
     def mtu(self):
@@ -70,6 +84,22 @@ class Socket(object):
 
 
 class TransportControlProtocol(ppp.ControlProtocol):
+    '''The Network Control Protocol for a PULSE2 transport.
+
+    Transports which negotiate configuration options can register
+    callbacks by assigning callables to the appropriate attributes on
+    the control protocol object.
+
+    Available callbacks:
+      - `get_options()`: return the list of Options to request
+      - `on_options_received(options)`: return `ConfigurationAccepted`
+        if the peer's requested options are acceptable
+      - `on_options_rejected(options)`
+    '''
+
+    get_options = None
+    on_options_received = None
+    on_options_rejected = None
 
     def __init__(self, interface, transport, ncp_protocol, display_name=None):
         ppp.ControlProtocol.__init__(self, display_name)
@@ -86,7 +116,25 @@ class TransportControlProtocol(ppp.ControlProtocol):
     def this_layer_down(self, *args):
         self.transport.this_layer_down()
 
+    def get_configure_request_options(self):
+        if self.get_options:
+            return self.get_options()
+        return ppp.ControlProtocol.get_configure_request_options(self)
+
+    def handle_incoming_configure_request(self, options):
+        if self.on_options_received:
+            return self.on_options_received(options)
+        return ppp.ControlProtocol.handle_incoming_configure_request(
+                self, options)
+
+    def handle_configure_reject(self, rejected_options):
+        if self.on_options_rejected:
+            self.on_options_rejected(rejected_options)
 
+
+# The Construct definitions of the transport packet formats are the
+# reference specifications for the struct-based codecs below, which are
+# used on the packet send and receive paths.
 BestEffortPacket = construct.Struct('BestEffortPacket',  # noqa
         construct.UBInt16('port'),
         construct.UBInt16('length'),
@@ -95,6 +143,35 @@ BestEffortPacket = construct.Struct('BestEffortPacket',  # noqa
     )
 
 
+class BestEffortFields(collections.namedtuple(
+        'BestEffortFields', 'port length information padding')):
+    '''Parse or build a Best-Effort transport packet.
+    '''
+    __slots__ = ()
+
+    header = struct.Struct('!HH')
+
+    @classmethod
+    def parse(cls, packet):
+        packet = bytes(packet)
+        if len(packet) < 4:
+            raise ParseError('packet too short')
+        port, length = cls.header.unpack_from(packet)
+        if length < 4:
+            raise ParseError('invalid length field (%d)' % length)
+        if len(packet) < length:
+            raise ParseError('packet truncated (expected %d bytes, got %d)' %
+                             (length, len(packet)))
+        return cls(port, length, packet[4:length], packet[length:])
+
+    @classmethod
+    def build(cls, port, information):
+        try:
+            return cls.header.pack(port, len(information)+4) + information
+        except struct.error as e:
+            raise ValueError(str(e))
+
+
 class BestEffortTransportBase(object):
 
     def __init__(self, interface, link_mtu):
@@ -106,22 +183,27 @@ class BestEffortTransportBase(object):
         self.link_socket = interface.connect(self.PROTOCOL_NUMBER)
         self.link_socket.on_packet = self.packet_received
 
-    def send(self, port, information):
+    def _build_packet(self, port, information):
         if len(information) > self.mtu:
             raise ValueError('Packet length (%d) exceeds transport MTU (%d)' % (
                                 len(information), self.mtu))
-        packet = BestEffortPacket.build(construct.Container(
-            port=port, length=len(information)+4,
-            information=information, padding=b''))
-        self.link_socket.send(packet)
+        return BestEffortFields.build(port, bytes(information))
+
+    def send(self, port, information):
+        self.link_socket.send(self._build_packet(port, information))
+
+    def send_many(self, port, informations):
+        self.link_socket.send_many(
+                [self._build_packet(port, information)
+                 for information in informations])
 
     def packet_received(self, packet):
         if self.closed:
             self.logger.warning('Received packet on closed transport')
             return
         try:
-            fields = BestEffortPacket.parse(packet)
-        except (construct.ConstructError, ValueError):
+            fields = BestEffortFields.parse(packet)
+        except ParseError:
             self.logger.exception('Received malformed packet')
             return
         if len(fields.information) + 4 != fields.length:
@@ -182,21 +264,28 @@ class BestEffortApplicationTransport(BestEffortTransportBase):
         BestEffortTransportBase.__init__(self, interface=interface,
                                          link_mtu=link_mtu)
         self.opened = threading.Event()
-        self.ncp = TransportControlProtocol(
-                interface=interface, transport=self,
-                ncp_protocol=self.NCP_PROTOCOL_NUMBER,
-                display_name='BestEffortControlProtocol')
+        self.ncp = self.create_control_protocol(
+                interface, display_name='BestEffortControlProtocol')
         self.ncp.up()
         self.ncp.open()
 
+    def create_control_protocol(self, interface, display_name):
+        return TransportControlProtocol(
+                interface=interface, transport=self,
+                ncp_protocol=self.NCP_PROTOCOL_NUMBER,
+                display_name=display_name)
+
+    def create_pcmp(self):
+        return pcmp.PulseControlMessageProtocol(
+                self, pcmp.PulseControlMessageProtocol.PORT)
+
     def this_layer_up(self):
         # We can't let PCMP bind itself using the public open_socket
         # method as the method will block until self.opened is set, but
         # it won't be set until we use PCMP Echo to test that the
         # transport is ready to carry traffic. So we must manually bind
         # the port without waiting.
-        self.pcmp = pcmp.PulseControlMessageProtocol(
-                self, pcmp.PulseControlMessageProtocol.PORT)
+        self.pcmp = self.create_pcmp()
         self.sockets[pcmp.PulseControlMessageProtocol.PORT] = self.pcmp
         self.pcmp.on_port_closed = self.on_port_closed
         self.pcmp.ping(self._ping_done)
@@ -212,15 +301,22 @@ class BestEffortApplicationTransport(BestEffortTransportBase):
         self.opened.clear()
         self.close_all_sockets()
 
-    def send(self, *args, **kwargs):
+    def _check_ready(self):
         if self.closed:
             raise exceptions.TransportNotReady(
                     'I/O operation on closed transport')
         if not self.ncp.is_Opened():
             raise exceptions.TransportNotReady(
                     'I/O operation before transport is opened')
+
+    def send(self, *args, **kwargs):
+        self._check_ready()
         BestEffortTransportBase.send(self, *args, **kwargs)
 
+    def send_many(self, *args, **kwargs):
+        self._check_ready()
+        BestEffortTransportBase.send_many(self, *args, **kwargs)
+
     def packet_received(self, packet):
         if self.ncp.is_Opened():
             self.opened.set()
@@ -258,6 +354,9 @@ class SimplexTransport(BestEffortTransportBase):
     def send(self, *args, **kwargs):
         raise NotImplementedError
 
+    def send_many(self, *args, **kwargs):
+        raise NotImplementedError
+
     @property
     def mtu(self):
         return 0
@@ -293,25 +392,106 @@ ReliableSupervisoryPacket = construct.BitStruct(
     )
 
 
+class ReliableInfoFields(collections.namedtuple(
+        'ReliableInfoFields', 'sequence_number ack_number poll port length '
+                              'information padding')):
+    '''Parse or build a reliable transport Information packet.
+    '''
+    __slots__ = ()
+
+    header = struct.Struct('!BBHH')
+
+    @classmethod
+    def parse(cls, packet):
+        packet = bytes(packet)
+        if len(packet) < 6:
+            raise ParseError('packet too short')
+        control, ack, port, length = cls.header.unpack_from(packet)
+        if control & 0b1:
+            raise ParseError('not an Information packet')
+        if length < 6:
+            raise ParseError('invalid length field (%d)' % length)
+        if len(packet) < length:
+            raise ParseError('packet truncated (expected %d bytes, got %d)' %
+                             (length, len(packet)))
+        return cls(control >> 1, ack >> 1, bool(ack & 0b1), port, length,
+                   packet[6:length], packet[length:])
+
+    @classmethod
+    def build(cls, sequence_number, ack_number, poll, port, information):
+        if not 0 <= sequence_number < 128 or not 0 <= ack_number < 128:
+            raise ValueError('sequence number out of range')
+        try:
+            return cls.header.pack(
+                    sequence_number << 1, ack_number << 1 | bool(poll),
+                    port, len(information)+6) + information
+        except struct.error as e:
+            raise ValueError(str(e))
+
+
+class ReliableSupervisoryFields(collections.namedtuple(
+        'ReliableSupervisoryFields', 'kind ack_number poll')):
+    '''Parse or build a reliable transport Supervisory packet.
+    '''
+    __slots__ = ()
+
+    header = struct.Struct('!BB')
+    kinds = ('RR', 'RNR', 'REJ')
+    kind_codes = {kind: code << 2 | 0b01 for code, kind in enumerate(kinds)}
+
+    @property
+    def final(self):
+        return self.poll
+
+    @classmethod
+    def parse(cls, packet):
+        if len(packet) < 2:
+            raise ParseError('packet too short')
+        control, ack = cls.header.unpack_from(packet)
+        if control & 0b11 != 0b01:
+            raise ParseError('not a Supervisory packet')
+        if control >> 4:
+            raise ParseError('reserved bits are set')
+        kind = (control >> 2) & 0b11
+        if kind >= len(cls.kinds):
+            raise ParseError('unknown Supervisory packet kind %d' % kind)
+        return cls(cls.kinds[kind], ack >> 1, bool(ack & 0b1))
+
+    @classmethod
+    def build(cls, kind, ack_number, poll=False):
+        if not 0 <= ack_number < 128:
+            raise ValueError('sequence number out of range')
+        try:
+            control = cls.kind_codes[kind]
+        except KeyError:
+            raise ValueError('unknown Supervisory packet kind %r' % kind)
+        return cls.header.pack(control, ack_number << 1 | bool(poll))
+
+
 def build_reliable_info_packet(sequence_number, ack_number, poll,
                                port, information):
-    return ReliableInfoPacket.build(construct.Container(
-        sequence_number=sequence_number, ack_number=ack_number, poll=poll,
-        port=port, information=information, length=len(information)+6,
-        discriminator=None, padding=b''))
+    return ReliableInfoFields.build(sequence_number, ack_number, poll,
+                                    port, bytes(information))
 
 
 def build_reliable_supervisory_packet(
         kind, ack_number, poll=False, final=False):
-    return ReliableSupervisoryPacket.build(construct.Container(
-        kind=kind, ack_number=ack_number, poll=poll or final,
-        final=None, reserved=None, discriminator=None))
+    return ReliableSupervisoryFields.build(kind, ack_number, poll or final)
 
 
 class ReliableTransport(object):
     '''The reliable transport protocol, also known as TRAIN.
 
     The protocol is based on LAPB from ITU-T Recommendation X.25.
+
+    Up to `window_size` I-packets may be outstanding (sent but not yet
+    acknowledged) at any time. The window size is negotiated with the
+    remote peer when the transport is opened; a peer which does not
+    support the Window-Size option limits the transport to a window
+    size of one, i.e. stop-and-wait. Lost packets are recovered using
+    Go-Back-N ARQ: acknowledgements are cumulative, and a REJ from the
+    peer causes all outstanding packets from the rejected sequence
+    number onwards to be retransmitted.
     '''
 
     NCP_PROTOCOL_NUMBER = 0xBA33
@@ -320,8 +500,14 @@ class ReliableTransport(object):
 
     MODULUS = 128
 
+    # Configuration option for negotiating the window size. The option
+    # data is a single byte: the maximum number of outstanding I-packets
+    # that the sender of the Configure-Request is willing to receive.
+    WINDOW_SIZE_OPTION = 1
+
     max_retransmits = 10  # N2 system parameter in LAPB
     retransmit_timeout = 0.2  # T1 system parameter
+    max_window_size = MODULUS - 1  # k system parameter
 
     def __init__(self, interface, link_mtu):
         self.logger = pulse2_logging.TaggedAdapter(
@@ -329,17 +515,31 @@ class ReliableTransport(object):
         self.send_queue = queue.Queue()
         self.opened = threading.Event()
         self.closed = False
-        self.last_sent_packet = None
+        # I-packets which have been sent but not yet acknowledged, in
+        # sequence number order starting from V(A). Each entry is a
+        # list of [port, information, time sent].
+        self.unacked_packets = collections.deque()
+        # The sequence number of the oldest unacknowledged I-packet
+        self.acknowledge_variable = 0  # V(A) in LAPB
         # The sequence number of the next in-sequence I-packet to be Tx'ed
         self.send_variable = 0  # V(S) in LAPB
         self.retransmit_count = 0
-        self.waiting_for_ack = False
         self.last_ack_number = 0  # N(R) of the most recently received packet
         self.transmit_lock = threading.RLock()
         self.retransmit_timer = None
 
+        # The maximum number of outstanding I-packets
+        self.window_size = 1
+        # The window size requested by the peer in its Configure-Request
+        self.peer_window_size = 1
+        # Cleared if the peer rejects the Window-Size option
+        self.request_window_size = True
+
         # The expected sequence number of the next received I-packet
         self.receive_variable = 0  # V(R) in LAPB
+        # Set when a REJ has been sent and the retransmission of the
+        # rejected packet has not yet been received.
+        self.reject_exception = False
 
         self.sockets = {}
         self._mtu = link_mtu - 6
@@ -349,10 +549,11 @@ class ReliableTransport(object):
                 self.RESPONSE_PROTOCOL_NUMBER)
         self.command_socket.on_packet = self.command_packet_received
         self.response_socket.on_packet = self.response_packet_received
-        self.ncp = TransportControlProtocol(
-                interface=interface, transport=self,
-                ncp_protocol=self.NCP_PROTOCOL_NUMBER,
-                display_name='ReliableControlProtocol')
+        self.ncp = self.create_control_protocol(
+                interface, display_name='ReliableControlProtocol')
+        self.ncp.get_options = self.get_ncp_options
+        self.ncp.on_options_received = self.ncp_options_received
+        self.ncp.on_options_rejected = self.ncp_options_rejected
         self.ncp.up()
         self.ncp.open()
 
@@ -360,29 +561,69 @@ class ReliableTransport(object):
     def mtu(self):
         return self._mtu
 
+    def create_control_protocol(self, interface, display_name):
+        return TransportControlProtocol(
+                interface=interface, transport=self,
+                ncp_protocol=self.NCP_PROTOCOL_NUMBER,
+                display_name=display_name)
+
+    def create_pcmp(self):
+        return pcmp.PulseControlMessageProtocol(
+                self, pcmp.PulseControlMessageProtocol.PORT)
+
     def reset_stats(self):
         self.stats = {
                 'info_packets_sent': 0,
                 'info_packets_received': 0,
                 'retransmits': 0,
+                'rejects_received': 0,
                 'out_of_order_packets': 0,
                 'round_trip_time': stats.OnlineStatistics(),
         }
-        self.last_packet_sent_time = None
+
+    def get_ncp_options(self):
+        if not self.request_window_size:
+            return []
+        return [ppp.Option(self.WINDOW_SIZE_OPTION,
+                           struct.pack('!B', self.max_window_size))]
+
+    def ncp_options_received(self, options):
+        peer_window_size = 1
+        for option in options:
+            if option.type != self.WINDOW_SIZE_OPTION or len(option.data) != 1:
+                return ppp.ControlProtocol.handle_incoming_configure_request(
+                        self.ncp, options)
+            # A window size of zero is meaningless, and Go-Back-N
+            # cannot support more than MODULUS-1 outstanding packets.
+            # Clamping is safe as the value is only an upper bound.
+            peer_window_size = min(max(bytearray(option.data)[0], 1),
+                                   self.MODULUS - 1)
+        self.peer_window_size = peer_window_size
+        return ppp.ConfigurationAccepted
+
+    def ncp_options_rejected(self, options):
+        if any(option.type == self.WINDOW_SIZE_OPTION for option in options):
+            self.logger.info('Peer does not support the Window-Size option')
+            self.request_window_size = False
 
     def this_layer_up(self):
-        self.send_variable = 0
-        self.receive_variable = 0
-        self.retransmit_count = 0
-        self.last_ack_number = 0
-        self.waiting_for_ack = False
+        with self.transmit_lock:
+            self.send_variable = 0
+            self.acknowledge_variable = 0
+            self.unacked_packets.clear()
+            self.receive_variable = 0
+            self.reject_exception = False
+            self.retransmit_count = 0
+            self.last_ack_number = 0
+            self.window_size = min(self.peer_window_size,
+                                   self.max_window_size)
+        self.logger.info('Window size: %d', self.window_size)
         self.reset_stats()
         # We can't let PCMP bind itself using the public open_socket
         # method as the method will block until self.opened is set, but
         # it won't be set until the peer sends us a packet over the
         # transport. But we want to bind the port without waiting.
-        self.pcmp = pcmp.PulseControlMessageProtocol(
-                self, pcmp.PulseControlMessageProtocol.PORT)
+        self.pcmp = self.create_pcmp()
         self.sockets[pcmp.PulseControlMessageProtocol.PORT] = self.pcmp
         self.pcmp.on_port_closed = self.on_port_closed
 
@@ -399,22 +640,30 @@ class ReliableTransport(object):
             self.retransmit_timer.cancel()
             self.retransmit_timer = None
         self.close_all_sockets()
-        self.logger.info('Info packets sent=%d retransmits=%d',
+        self.logger.info('Info packets sent=%d retransmits=%d '
+                         'rejects received=%d',
                          self.stats['info_packets_sent'],
-                         self.stats['retransmits'])
+                         self.stats['retransmits'],
+                         self.stats['rejects_received'])
         self.logger.info('Info packets received=%d out-of-order=%d',
                          self.stats['info_packets_received'],
                          self.stats['out_of_order_packets'])
         self.logger.info('Round-trip %s ms', self.stats['round_trip_time'])
 
     def open_socket(self, port, timeout=30.0, factory=Socket):
+        self._check_port_available(port)
+        if not self.opened.wait(timeout):
+            return None
+        return self._bind_socket(port, factory)
+
+    def _check_port_available(self, port):
         if self.closed:
             raise ValueError('Cannot open socket on closed transport')
         if port in self.sockets and not self.sockets[port].closed:
             raise KeyError('Another socket is already opened '
                            'on port 0x%04x' % port)
-        if not self.opened.wait(timeout):
-            return None
+
+    def _bind_socket(self, port, factory):
         socket = factory(self, port)
         self.sockets[port] = socket
         return socket
@@ -443,16 +692,23 @@ class ReliableTransport(object):
             self.logger.exception('No socket is open on port 0x%04X!',
                                   closed_port)
 
-    def _send_info_packet(self, port, information):
-        packet = build_reliable_info_packet(
-                sequence_number=self.send_variable,
+    def _build_info_packet(self, sequence_number, port, information):
+        self.stats['info_packets_sent'] += 1
+        return build_reliable_info_packet(
+                sequence_number=sequence_number,
                 ack_number=self.receive_variable,
                 poll=True, port=port, information=information)
-        self.command_socket.send(packet)
-        self.stats['info_packets_sent'] += 1
-        self.last_packet_sent_time = time.time()
+
+    def _send_command_packets(self, packets):
+        if len(packets) == 1:
+            self.command_socket.send(packets[0])
+        elif packets:
+            self.command_socket.send_many(packets)
 
     def send(self, port, information):
+        self.send_many(port, [information])
+
+    def send_many(self, port, informations):
         if self.closed:
             raise exceptions.TransportNotReady(
                     'I/O operation on closed transport')
@@ -460,66 +716,107 @@ class ReliableTransport(object):
             raise exceptions.TransportNotReady(
                     'Attempted to send a packet while the reliable transport '
                     'is not open')
-        if len(information) > self.mtu:
-            raise ValueError('Packet length (%d) exceeds transport MTU (%d)' % (
-                                len(information), self.mtu))
-        self.send_queue.put((port, information))
+        informations = list(informations)
+        for information in informations:
+            if len(information) > self.mtu:
+                raise ValueError(
+                        'Packet length (%d) exceeds transport MTU (%d)' % (
+                            len(information), self.mtu))
+        for information in informations:
+            self.send_queue.put((port, information))
         self.pump_send_queue()
 
     def process_ack(self, ack_number):
         with self.transmit_lock:
-            if not self.waiting_for_ack:
+            if not self.unacked_packets:
                 # Could be in the timer recovery condition (waiting for
-                # a response to an RR Poll command). This is a bit
-                # hacky and should probably be changed to use an
-                # explicit state machine when this transport is
-                # extended to support Go-Back-N ARQ.
+                # a response to an RR Poll command).
                 if self.retransmit_timer:
                     self.retransmit_timer.cancel()
                     self.retransmit_timer = None
                     self.retransmit_count = 0
-            if (ack_number - 1) % self.MODULUS == self.send_variable:
-                if self.retransmit_timer:
-                    self.retransmit_timer.cancel()
-                    self.retransmit_timer = None
-                self.retransmit_count = 0
-                self.waiting_for_ack = False
-                self.send_variable = (self.send_variable + 1) % self.MODULUS
-                if self.last_packet_sent_time:
-                    self.stats['round_trip_time'].update(
-                            (time.time() - self.last_packet_sent_time) * 1000)
+                return
+            # Acknowledgements are cumulative: N(R) acknowledges every
+            # I-packet up to and including N(R)-1.
+            acked_count = (
+                    ack_number - self.acknowledge_variable) % self.MODULUS
+            if acked_count == 0 or acked_count > len(self.unacked_packets):
+                # Nothing new acknowledged, or N(R) is outside the window.
+                return
+            for _ in range(acked_count):
+                _, _, sent_time = self.unacked_packets.popleft()
+            self.stats['round_trip_time'].update(
+                    (time.time() - sent_time) * 1000)
+            self.acknowledge_variable = ack_number
+            self.retransmit_count = 0
+            if self.unacked_packets:
+                self.start_retransmit_timer()
+            elif self.retransmit_timer:
+                self.retransmit_timer.cancel()
+                self.retransmit_timer = None
+
+    def process_reject(self, ack_number):
+        with self.transmit_lock:
+            self.stats['rejects_received'] += 1
+            self.process_ack(ack_number)
+            if self.unacked_packets:
+                self._retransmit_unacked_packets()
+                self.start_retransmit_timer()
 
     def pump_send_queue(self):
         with self.transmit_lock:
-            if not self.waiting_for_ack:
+            packets = []
+            while len(self.unacked_packets) < self.window_size:
                 try:
                     port, information = self.send_queue.get_nowait()
-                    self.last_sent_packet = (port, information)
-                    self.waiting_for_ack = True
-                    self._send_info_packet(port, information)
-                    self.start_retransmit_timer()
                 except queue.Empty:
-                    pass
+                    break
+                self.unacked_packets.append([port, information, time.time()])
+                packets.append(self._build_info_packet(
+                        self.send_variable, port, information))
+                self.send_variable = (self.send_variable + 1) % self.MODULUS
+            self._send_command_packets(packets)
+            if packets and not self.retransmit_timer:
+                self.start_retransmit_timer()
+
+    def _retransmit_unacked_packets(self):
+        '''Go back N: retransmit every outstanding I-packet, starting
+        with the oldest.
+        '''
+        now = time.time()
+        packets = []
+        for offset, entry in enumerate(self.unacked_packets):
+            port, information, _ = entry
+            entry[2] = now
+            self.stats['retransmits'] += 1
+            packets.append(self._build_info_packet(
+                    (self.acknowledge_variable + offset) % self.MODULUS,
+                    port, information))
+        self._send_command_packets(packets)
+
+    def create_timer(self, interval, function):
+        timer = threading.Timer(interval, function)
+        timer.daemon = True
+        return timer
 
     def start_retransmit_timer(self):
         if self.retransmit_timer:
             self.retransmit_timer.cancel()
-        self.retransmit_timer = threading.Timer(
+        self.retransmit_timer = self.create_timer(
                 self.retransmit_timeout,
                 self.retransmit_timeout_expired)
-        self.retransmit_timer.daemon = True
         self.retransmit_timer.start()
 
     def retransmit_timeout_expired(self):
         with self.transmit_lock:
             self.retransmit_count += 1
             if self.retransmit_count < self.max_retransmits:
-                self.stats['retransmits'] += 1
-                if self.last_sent_packet:
-                    self._send_info_packet(*self.last_sent_packet)
+                if self.unacked_packets:
+                    self._retransmit_unacked_packets()
                 else:
                     # No info packet to retransmit; must be an RR command
                     # that needs to be retransmitted.
+                    self.stats['retransmits'] += 1
                     self.send_supervisory_command(kind='RR', poll=True)
                 self.start_retransmit_timer()
             else:
@@ -549,10 +846,10 @@ class ReliableTransport(object):
         is_info = (bytearray(packet[0:1])[0] & 0b1) == 0
         try:
             if is_info:
-                fields = ReliableInfoPacket.parse(packet)
+                fields = ReliableInfoFields.parse(packet)
             else:
-                fields = ReliableSupervisoryPacket.parse(packet)
-        except (construct.ConstructError, ValueError):
+                fields = ReliableSupervisoryFields.parse(packet)
+        except ParseError:
             self.logger.exception('Received malformed command packet')
             self.ncp.restart()
             return
@@ -563,6 +860,7 @@ class ReliableTransport(object):
             if fields.sequence_number == self.receive_variable:
                 self.receive_variable = (
                         self.receive_variable + 1) % self.MODULUS
+                self.reject_exception = False
                 self.stats['info_packets_received'] += 1
                 if len(fields.information) + 6 == fields.length:
                     if fields.port in self.sockets:
@@ -577,16 +875,33 @@ class ReliableTransport(object):
                             'Received truncated or corrupt info packet '
                             '(expected %d data bytes, got %d)',
                             fields.length-6, len(fields.information))
+                self.send_supervisory_response(kind='RR', final=fields.poll)
             else:
                 self.stats['out_of_order_packets'] += 1
-            self.send_supervisory_response(kind='RR', final=fields.poll)
+                # A sequence number ahead of V(R) means that packets
+                # were lost in transit; ask the peer to go back to V(R).
+                # Packets behind V(R) are duplicates of packets which
+                # have already been received, and only need to be
+                # acknowledged again.
+                ahead = ((fields.sequence_number - self.receive_variable) %
+                         self.MODULUS) < self.MODULUS // 2
+                if ahead and not self.reject_exception:
+                    self.reject_exception = True
+                    self.send_supervisory_response(
+                            kind='REJ', final=fields.poll)
+                else:
+                    self.send_supervisory_response(
+                            kind='RR', final=fields.poll)
         else:
             if fields.kind not in ('RR', 'REJ'):
                 self.logger.error('Received a %s command packet, which is not '
                                   'yet supported by this implementation',
                                   fields.kind)
                 # Pretend it is an RR packet
-            self.process_ack(fields.ack_number)
+            if fields.kind == 'REJ':
+                self.process_reject(fields.ack_number)
+            else:
+                self.process_ack(fields.ack_number)
             if fields.poll:
                 self.send_supervisory_response(kind='RR', final=True)
             self.pump_send_queue()
@@ -601,14 +916,17 @@ class ReliableTransport(object):
         # Information packets cannot be responses; we only need to
         # handle receiving Supervisory packets.
         try:
-            fields = ReliableSupervisoryPacket.parse(packet)
-        except (construct.ConstructError, ValueError):
+            fields = ReliableSupervisoryFields.parse(packet)
+        except ParseError:
             self.logger.exception('Received malformed response packet')
             self.ncp.restart()
             return
 
         self.opened.set()
-        self.process_ack(fields.ack_number)
+        if fields.kind == 'REJ':
+            self.process_reject(fields.ack_number)
+        else:
+            self.process_ack(fields.ack_number)
         self.pump_send_queue()
 
         if fields.kind not in ('RR', 'REJ'):
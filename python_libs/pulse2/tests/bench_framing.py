@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+'''Microbenchmark for splitting a received byte stream into frames.
+
+A synthetic capture of encoded frames is fed to the FrameSplitter in
+chunks, as the Interface receive loop does. Run from the pulse2 package
+directory:
+
+    python -m tests.bench_framing [--size-mb 8] [--chunk 4096]
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import random
+import time
+
+from pebble.pulse2 import framing
+
+
+def make_capture(size, seed=0):
+    rng = random.Random(seed)
+    frames = []
+    length = 0
+    while length < size:
+        datagram = os.urandom(rng.randint(8, 1500))
+        frame = framing.encode_frame(datagram)
+        frames.append(frame)
+        length += len(frame)
+    return b''.join(frames), len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=8)
+    parser.add_argument('--chunk', type=int, nargs='+',
+                        default=[1, 64, 4096, 1 << 20])
+    parser.add_argument('--max-frame-length', type=int, default=0)
+    args = parser.parse_args()
+
+    capture, frame_count = make_capture(int(args.size_mb * 1024 * 1024))
+    print('capture: %d bytes, %d frames' % (len(capture), frame_count))
+    for chunk in args.chunk:
+        # Feeding a multi-megabyte capture one byte at a time takes too
+        # long to be useful; scale the input down for small chunks.
+        data = capture if chunk >= 64 else capture[:1 << 20]
+        splitter = framing.FrameSplitter(args.max_frame_length)
+        split = 0
+        start = time.time()
+        for offset in range(0, len(data), chunk):
+            splitter.write(data[offset:offset+chunk])
+            for _ in splitter:
+                split += 1
+        elapsed = time.time() - start
+        print('chunk=%8d  %8.1f MiB/s  (%d frames)' % (
+            chunk, len(data) / elapsed / (1 << 20), split))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+'''Throughput benchmark for the reliable transport over a loopback peer.
+
+The loopback link models a 1 Mbaud serial line with a small one-way
+latency, like dbgserial. Run from the pulse2 package directory:
+
+    python -m tests.bench_transports [--window 1 4 16] [--loss 0.01]
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import time
+
+from pebble.pulse2 import transports
+
+from . import loopback, timer_helper
+
+
+def run(window_size, packets, latency, byte_time, loss):
+    interfaces = loopback.LoopbackInterface.pair(
+            latency=latency, byte_time=byte_time, seed=0)
+    ends = []
+    for interface in interfaces:
+        transport = transports.ReliableTransport(interface, link_mtu=1500)
+        transport.max_window_size = window_size
+        ends.append(transport)
+    sender, receiver = [t.open_socket(0xbeef, timeout=5.0) for t in ends]
+    for interface in interfaces:
+        interface.loss = loss
+
+    payload = b'\xa5' * sender.mtu
+    start = time.time()
+    for _ in range(packets):
+        sender.send(payload)
+    for _ in range(packets):
+        receiver.receive(timeout=30.0)
+    elapsed = time.time() - start
+
+    stats = ends[0].stats
+    for transport in ends:
+        transport.down()
+    for interface in interfaces:
+        interface.close()
+    timer_helper.cancel_all_timers()
+    return packets * len(payload) / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--window', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16])
+    parser.add_argument('--packets', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='one-way latency in seconds')
+    parser.add_argument('--baud', type=int, default=1000000)
+    parser.add_argument('--loss', type=float, default=0.0)
+    args = parser.parse_args()
+
+    byte_time = 10.0 / args.baud if args.baud else 0.0
+    for window_size in args.window:
+        throughput, stats = run(window_size, args.packets, args.latency,
+                                byte_time, args.loss)
+        print('window=%3d  %8.1f KiB/s  retransmits=%d rejects=%d '
+              'rtt %s ms' % (window_size, throughput / 1024,
+                             stats['retransmits'], stats['rejects_received'],
+                             stats['round_trip_time']))
+
+
+if __name__ == '__main__':
+    main()
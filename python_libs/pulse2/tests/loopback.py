@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import
+
+import heapq
+import random
+import threading
+import time
+
+from pebble.pulse2 import link
+
+
+class LoopbackInterface(object):
+    '''A stand-in for `link.Interface` which delivers link-layer packets
+    to a peer LoopbackInterface in the same process.
+
+    The link is modelled as a serial line: each packet occupies the line
+    for `byte_time` seconds per byte, then arrives at the peer after a
+    further `latency` seconds. Packets are dropped with probability
+    `loss`. Packets are delivered on a dedicated thread so that the
+    protocol layers on each end are not reentered.
+    '''
+
+    def __init__(self, latency=0.0, byte_time=0.0, loss=0.0, seed=None):
+        self.latency = latency
+        self.byte_time = byte_time
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.sockets = {}
+        self.closed = False
+        self.peer = None
+        self.line_free_at = 0.0
+        self.in_flight = []
+        self.sequence = 0
+        self.cond = threading.Condition()
+        self.delivery_thread = threading.Thread(target=self.delivery_loop)
+        self.delivery_thread.daemon = True
+        self.delivery_thread.start()
+
+    @classmethod
+    def pair(cls, **kwargs):
+        a, b = cls(**kwargs), cls(**kwargs)
+        a.peer, b.peer = b, a
+        return a, b
+
+    def connect(self, protocol):
+        self.sockets[protocol] = socket = link.InterfaceSocket(self, protocol)
+        return socket
+
+    def unregister_socket(self, protocol):
+        self.sockets.pop(protocol, None)
+
+    def send_packet(self, protocol, packet):
+        if self.closed:
+            raise ValueError('I/O operation on closed interface')
+        with self.cond:
+            now = time.time()
+            self.line_free_at = (max(now, self.line_free_at) +
+                                 len(packet) * self.byte_time)
+            if self.loss and self.random.random() < self.loss:
+                return
+            heapq.heappush(self.in_flight,
+                           (self.line_free_at + self.latency, self.sequence,
+                            protocol, bytes(packet)))
+            self.sequence += 1
+            self.cond.notify()
+
+    def send_many(self, packets):
+        for protocol, packet in packets:
+            self.send_packet(protocol, packet)
+
+    def delivery_loop(self):
+        while True:
+            with self.cond:
+                while not self.closed:
+                    now = time.time()
+                    if self.in_flight and self.in_flight[0][0] <= now:
+                        break
+                    self.cond.wait(self.in_flight[0][0] - now
+                                   if self.in_flight else None)
+                if self.closed:
+                    return
+                _, _, protocol, packet = heapq.heappop(self.in_flight)
+            socket = self.peer.sockets.get(protocol)
+            if socket:
+                socket.handle_packet(packet)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        for socket in list(self.sockets.values()):
+            socket.close()
@@ -0,0 +1,117 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import absolute_import
+
+import asyncio
+import socket
+import unittest
+from unittest import mock
+
+from pebble.pulse2 import aio, exceptions
+
+
+class TestLoopTimer(unittest.IsolatedAsyncioTestCase):
+
+    async def test_timer_fires(self):
+        fired = asyncio.Event()
+        timer = aio.LoopTimer(0.001, fired.set)
+        timer.start()
+        self.assertTrue(await aio.wait_for_event(fired, 1.0))
+
+    async def test_cancelled_timer_does_not_fire(self):
+        fired = []
+        timer = aio.LoopTimer(0.001, lambda: fired.append(True))
+        timer.start()
+        timer.cancel()
+        await asyncio.sleep(0.01)
+        self.assertFalse(fired)
+
+    async def test_timer_can_only_be_started_once(self):
+        timer = aio.LoopTimer(1.0, lambda: None)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with self.assertRaises(RuntimeError):
+            timer.start()
+
+
+class TestAsyncSocket(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.transport = mock.Mock()
+        self.uut = aio.AsyncSocket(self.transport, 1234)
+
+    async def test_receive(self):
+        self.uut.on_receive(b'data')
+        self.assertEqual(b'data', await self.uut.receive())
+
+    async def test_receive_timeout(self):
+        with self.assertRaises(exceptions.ReceiveQueueEmpty):
+            await self.uut.receive(timeout=0.001)
+
+    async def test_receive_nowait_with_empty_queue(self):
+        with self.assertRaises(exceptions.ReceiveQueueEmpty):
+            self.uut.receive_nowait()
+
+    async def test_close_during_receive_aborts_the_receive(self):
+        receive = asyncio.ensure_future(self.uut.receive(timeout=1.0))
+        await asyncio.sleep(0)
+        self.uut.close()
+        with self.assertRaises(exceptions.SocketClosed):
+            await receive
+
+
+class TestAsyncInterfacePair(unittest.IsolatedAsyncioTestCase):
+    '''Two complete asyncio protocol stacks talking to each other.
+    '''
+
+    async def asyncSetUp(self):
+        sock_a, sock_b = socket.socketpair()
+        self.interfaces = []
+        for sock in (sock_a, sock_b):
+            reader, writer = await asyncio.open_connection(sock=sock)
+            interface = aio.AsyncInterface(reader, writer)
+            interface.lcp.restart_timeout = 0.05
+            self.interfaces.append(interface)
+        self.links = [await interface.get_link(timeout=5.0)
+                      for interface in self.interfaces]
+
+    async def asyncTearDown(self):
+        for interface in self.interfaces:
+            await interface.close(timeout=1.0)
+
+    async def open_socket_pair(self, transport, port):
+        return await asyncio.gather(
+                *(link.open_socket(transport, port, timeout=5.0)
+                  for link in self.links))
+
+    async def test_links_come_up(self):
+        for link in self.links:
+            self.assertIsInstance(link, aio.AsyncLink)
+
+    async def test_reliable_transport(self):
+        a, b = await self.open_socket_pair('reliable', 0xbeef)
+        self.assertIsInstance(a, aio.AsyncSocket)
+        self.assertEqual(
+                a.transport.max_window_size, a.transport.window_size)
+        data = [b'packet %d' % i for i in range(50)]
+        a.send_many(data)
+        received = [await b.receive(timeout=5.0) for _ in data]
+        self.assertEqual(data, received)
+        b.send(b'reply')
+        self.assertEqual(b'reply', await a.receive(timeout=5.0))
+
+    async def test_best_effort_transport(self):
+        a, b = await self.open_socket_pair('best-effort', 0xcafe)
+        a.send(b'hello')
+        self.assertEqual(b'hello', await b.receive(timeout=5.0))
+
+    async def test_closing_interface_closes_sockets(self):
+        a, _ = await self.open_socket_pair('reliable', 0xbeef)
+        await self.interfaces[0].close(timeout=1.0)
+        self.assertTrue(a.closed)
+        self.assertTrue(self.interfaces[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@
 
 from __future__ import absolute_import
 
+import random
 import unittest
 
 from pebble.pulse2 import framing
@@ -101,6 +102,57 @@ class TestFrameSplitter(unittest.TestCase):
         self.assertEqual(list(self.splitter), [b'123456'])
 
 
+class ReferenceFrameSplitter(object):
+    '''Byte-at-a-time frame splitter which the FrameSplitter is checked
+    against.
+    '''
+
+    def __init__(self, max_frame_length=0):
+        self.frames = []
+        self.input_buffer = bytearray()
+        self.max_frame_length = max_frame_length
+        self.waiting_for_sync = True
+
+    def write(self, data):
+        for char in bytearray(data):
+            if self.waiting_for_sync:
+                if char == framing.FLAG:
+                    self.waiting_for_sync = False
+            elif char == framing.FLAG:
+                if self.input_buffer:
+                    self.frames.append(bytes(self.input_buffer))
+                    self.input_buffer = bytearray()
+            elif (not self.max_frame_length or
+                    len(self.input_buffer) < self.max_frame_length):
+                self.input_buffer.append(char)
+            else:
+                self.input_buffer = bytearray()
+                self.waiting_for_sync = True
+
+
+class TestFrameSplitterMatchesReference(unittest.TestCase):
+
+    def test_random_streams(self):
+        rng = random.Random(1234)
+        for _ in range(200):
+            max_frame_length = rng.choice([0, 1, 2, 5, 16])
+            uut = framing.FrameSplitter(max_frame_length)
+            reference = ReferenceFrameSplitter(max_frame_length)
+            frames = []
+            for _ in range(rng.randint(1, 30)):
+                chunk = bytes(bytearray(
+                        rng.choice([0x55, 0x55, 0x00, 0x41, 0x42])
+                        for _ in range(rng.randint(0, 40))))
+                if rng.random() < 0.2:
+                    max_frame_length = rng.choice([0, 1, 2, 5, 16])
+                    uut.max_frame_length = max_frame_length
+                    reference.max_frame_length = max_frame_length
+                uut.write(chunk)
+                reference.write(chunk)
+                frames.extend(uut)
+            self.assertEqual(reference.frames, frames)
+
+
 class TestDecodeTransparency(unittest.TestCase):
 
     def test_easy_decode(self):
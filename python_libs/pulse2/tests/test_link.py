@@ -72,6 +72,23 @@ class TestInterface(unittest.TestCase):
         self.assertIn(framing.encode_frame(ppp.encapsulate(0x8889, b'data')),
                       self.iostream.pop_all_written_data())
 
+    def test_send_many_coalesces_frames_into_one_write(self):
+        self.iostream.pop_all_written_data()
+        self.uut.send_many([(0x8889, b'data'), (0x8887, b'more data')])
+        self.assertEqual(
+                [framing.encode_frame(ppp.encapsulate(0x8889, b'data')) +
+                 framing.encode_frame(ppp.encapsulate(0x8887, b'more data'))],
+                self.iostream.pop_all_written_data())
+
+    def test_send_many_from_socket(self):
+        socket = self.uut.connect(0xf0f1)
+        self.iostream.pop_all_written_data()
+        socket.send_many([b'one', b'two'])
+        self.assertEqual(
+                [framing.encode_frame(ppp.encapsulate(0xf0f1, b'one')) +
+                 framing.encode_frame(ppp.encapsulate(0xf0f1, b'two'))],
+                self.iostream.pop_all_written_data())
+
     def test_connect_returns_socket(self):
         self.assertIsNotNone(self.uut.connect(0xf0f1))
 
@@ -0,0 +1,265 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+'''Differential tests of the struct-based packet codecs against the
+reference Construct definitions of the packet formats.
+'''
+
+from __future__ import absolute_import
+
+import random
+import struct
+import unittest
+
+import construct
+
+from pebble.pulse2 import ppp, transports
+
+
+ITERATIONS = 2000
+
+
+def parse_reference(parser, data):
+    '''Parse with a Construct parser, returning None on error.'''
+    try:
+        return parser.parse(data)
+    except (construct.ConstructError, ValueError):
+        return None
+
+
+def parse_codec(parser, data, exception):
+    try:
+        return parser(data)
+    except exception:
+        return None
+
+
+class FuzzMixin(object):
+
+    def setUp(self):
+        self.random = random.Random(0x5eed)
+
+    def random_bytes(self, max_length):
+        length = self.random.randint(0, max_length)
+        return bytes(bytearray(self.random.getrandbits(8)
+                               for _ in range(length)))
+
+    def random_packet(self, header_format, length_offset, header_length):
+        '''Generate a random packet which has a plausible length field
+        most of the time, so that both valid and malformed packets are
+        well represented.
+        '''
+        header_size = struct.calcsize(header_format)
+        if self.random.random() < 0.1:
+            return self.random_bytes(header_size - 1)
+        header = bytearray(self.random.getrandbits(8)
+                           for _ in range(header_size))
+        body = self.random_bytes(16)
+        if self.random.random() < 0.8:
+            length = header_length + self.random.randint(-2, len(body) + 2)
+            struct.pack_into('!H', header, length_offset, max(length, 0))
+        return bytes(header) + body
+
+
+class TestTransportCodecs(FuzzMixin, unittest.TestCase):
+
+    def test_best_effort_parse(self):
+        for _ in range(ITERATIONS):
+            packet = self.random_packet('!HH', 2, 4)
+            expected = parse_reference(transports.BestEffortPacket, packet)
+            actual = parse_codec(transports.BestEffortFields.parse, packet,
+                                 transports.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, packet)
+            else:
+                self.assertEqual(
+                        (expected.port, expected.length, expected.information,
+                         expected.padding), actual, packet)
+
+    def test_best_effort_build(self):
+        for _ in range(ITERATIONS):
+            port = self.random.getrandbits(16)
+            information = self.random_bytes(32)
+            self.assertEqual(
+                    transports.BestEffortPacket.build(construct.Container(
+                        port=port, length=len(information)+4,
+                        information=information, padding=b'')),
+                    transports.BestEffortFields.build(port, information))
+
+    def test_reliable_info_parse(self):
+        for _ in range(ITERATIONS):
+            packet = self.random_packet('!BBHH', 4, 6)
+            if packet:
+                # Bias towards Information packets
+                packet = bytes(bytearray([packet[0] & 0xfe])) + packet[1:]
+            expected = parse_reference(transports.ReliableInfoPacket, packet)
+            actual = parse_codec(transports.ReliableInfoFields.parse, packet,
+                                 transports.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, packet)
+            else:
+                self.assertEqual(
+                        (expected.sequence_number, expected.ack_number,
+                         expected.poll, expected.port, expected.length,
+                         expected.information, expected.padding),
+                        actual, packet)
+
+    def test_reliable_info_build(self):
+        for _ in range(ITERATIONS):
+            fields = dict(sequence_number=self.random.randrange(128),
+                          ack_number=self.random.randrange(128),
+                          poll=self.random.random() < 0.5,
+                          port=self.random.getrandbits(16),
+                          information=self.random_bytes(32))
+            self.assertEqual(
+                    transports.ReliableInfoPacket.build(construct.Container(
+                        length=len(fields['information'])+6,
+                        discriminator=None, padding=b'', **fields)),
+                    transports.build_reliable_info_packet(**fields))
+
+    def test_reliable_supervisory_parse(self):
+        for _ in range(ITERATIONS):
+            packet = self.random_bytes(3)
+            if packet and self.random.random() < 0.8:
+                # Bias towards plausible Supervisory packets
+                packet = bytes(bytearray(
+                    [packet[0] & 0x1f | 0b01])) + packet[1:]
+            expected = parse_reference(
+                    transports.ReliableSupervisoryPacket, packet)
+            actual = parse_codec(transports.ReliableSupervisoryFields.parse,
+                                 packet, transports.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, packet)
+            else:
+                self.assertEqual(
+                        (expected.kind, expected.ack_number, expected.poll,
+                         expected.final),
+                        (actual.kind, actual.ack_number, actual.poll,
+                         actual.final), packet)
+
+    def test_reliable_supervisory_build(self):
+        for kind in ('RR', 'RNR', 'REJ'):
+            for ack_number in range(128):
+                for poll in (False, True):
+                    self.assertEqual(
+                            transports.ReliableSupervisoryPacket.build(
+                                construct.Container(
+                                    kind=kind, ack_number=ack_number,
+                                    poll=poll, final=None, reserved=None,
+                                    discriminator=None)),
+                            transports.build_reliable_supervisory_packet(
+                                kind=kind, ack_number=ack_number, poll=poll))
+
+    def test_reliable_supervisory_build_invalid_kind(self):
+        with self.assertRaises(ValueError):
+            transports.build_reliable_supervisory_packet(
+                    kind='SREJ', ack_number=0)
+
+    def test_reliable_info_build_sequence_number_out_of_range(self):
+        with self.assertRaises(ValueError):
+            transports.build_reliable_info_packet(
+                    sequence_number=128, ack_number=0, poll=True,
+                    port=1, information=b'')
+
+
+class TestPPPCodecs(FuzzMixin, unittest.TestCase):
+
+    def test_lcp_encapsulation_parse(self):
+        for _ in range(ITERATIONS):
+            packet = self.random_packet('!BBH', 2, 4)
+            expected = parse_reference(ppp.Constructors.LCPPacket, packet)
+            actual = parse_codec(ppp.LCPEncapsulation.parse, packet,
+                                 ppp.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, packet)
+            else:
+                self.assertEqual(
+                        (expected.code, expected.identifier, expected.data,
+                         expected.padding), actual, packet)
+
+    def test_lcp_encapsulation_build(self):
+        for _ in range(ITERATIONS):
+            code = self.random.getrandbits(8)
+            identifier = self.random.getrandbits(8)
+            data = self.random_bytes(32)
+            self.assertEqual(
+                    ppp.Constructors.LCPPacket.build(construct.Container(
+                        code=code, identifier=identifier,
+                        length=len(data)+4, data=data, padding=b'')),
+                    ppp.LCPEncapsulation.build(code, identifier, data))
+
+    def random_option_list(self):
+        data = bytearray()
+        for _ in range(self.random.randint(0, 4)):
+            option_data = self.random_bytes(6)
+            length = len(option_data) + 2
+            if self.random.random() < 0.1:
+                length = self.random.randint(0, 10)
+            data += struct.pack('!BB', self.random.getrandbits(8), length)
+            data += option_data
+        if self.random.random() < 0.1:
+            data = data[:self.random.randint(0, len(data))]
+        return bytes(data)
+
+    def test_option_list_parse(self):
+        for _ in range(ITERATIONS):
+            data = self.random_option_list()
+            if not data:
+                self.assertEqual([], ppp.OptionList.parse(data))
+                continue
+            expected = parse_reference(ppp.Constructors.OptionList, data)
+            actual = parse_codec(ppp.OptionList.parse, data, ppp.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, data)
+            else:
+                self.assertEqual(
+                        [(opt.type, opt.data) for opt in expected.options],
+                        actual, data)
+
+    def test_option_list_build(self):
+        for _ in range(ITERATIONS):
+            options = [(self.random.getrandbits(8), self.random_bytes(6))
+                       for _ in range(self.random.randint(0, 4))]
+            self.assertEqual(
+                    b''.join(ppp.Constructors.Option.build(
+                        construct.Container(type=type_, length=len(data)+2,
+                                            data=data))
+                             for type_, data in options),
+                    ppp.OptionList.build(options))
+
+    def test_protocol_reject_parse(self):
+        for _ in range(ITERATIONS):
+            data = self.random_bytes(8)
+            expected = parse_reference(ppp.Constructors.ProtocolReject, data)
+            actual = parse_codec(ppp.ProtocolReject.parse, data,
+                                 ppp.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, data)
+            else:
+                self.assertEqual((expected.rejected_protocol,
+                                  expected.rejected_information), actual)
+
+    def test_magic_number_and_data_parse(self):
+        for _ in range(ITERATIONS):
+            data = self.random_bytes(10)
+            expected = parse_reference(ppp.Constructors.MagicPlusData, data)
+            actual = parse_codec(ppp.MagicNumberAndData.parse, data,
+                                 ppp.ParseError)
+            if expected is None:
+                self.assertIsNone(actual, data)
+            else:
+                self.assertEqual((expected.magic_number, expected.data),
+                                 actual)
+
+    def test_magic_number_and_data_build(self):
+        for _ in range(ITERATIONS):
+            magic_number = self.random.getrandbits(32)
+            data = self.random_bytes(10)
+            self.assertEqual(
+                    ppp.Constructors.MagicPlusData.build(construct.Container(
+                        magic_number=magic_number, data=data)),
+                    ppp.MagicNumberAndData.build(magic_number, data))
+
+
+if __name__ == '__main__':
+    unittest.main()
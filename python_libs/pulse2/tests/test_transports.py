@@ -13,10 +13,10 @@ except ImportError:
 
 import construct
 
-from pebble.pulse2 import exceptions, pcmp, transports
+from pebble.pulse2 import exceptions, pcmp, ppp, transports
 
 from .fake_timer import FakeTimer
-from . import timer_helper
+from . import loopback, timer_helper
 
 
 # Save a reference to the real threading.Timer for tests which need to
@@ -123,6 +123,19 @@ class TestBestEffortTransport(CommonTransportTestCases, unittest.TestCase):
                 transports.BestEffortPacket.build(construct.Container(
                     port=0xabcd, length=8, information=b'info', padding=b'')))
 
+    def test_send_many_from_socket(self):
+        socket = self.uut.open_socket(0xabcd, timeout=0)
+        socket.send_many([b'one', b'two'])
+        self.uut.link_socket.send_many.assert_called_once_with(
+                [transports.BestEffortPacket.build(construct.Container(
+                    port=0xabcd, length=7, information=info, padding=b''))
+                 for info in (b'one', b'two')])
+
+    def test_send_many_greater_than_mtu(self):
+        with self.assertRaisesRegex(ValueError, 'Packet length'):
+            self.uut.send_many(0xaaaa, [b'a', b'a'*1497])
+        self.uut.link_socket.send_many.assert_not_called()
+
     def test_receive_from_socket_with_empty_queue(self):
         socket = self.uut.open_socket(0xabcd, timeout=0)
         with self.assertRaises(exceptions.ReceiveQueueEmpty):
@@ -449,6 +462,214 @@ class TestReliableTransport(CommonTransportTestCases,
             information=b'\x81\xaa\xaa'))
 
 
+class TestReliableTransportWindowNegotiation(unittest.TestCase):
+
+    def setUp(self):
+        control_protocol_patcher = mock.patch(
+                'pebble.pulse2.transports.TransportControlProtocol')
+        control_protocol_patcher.start()
+        self.addCleanup(control_protocol_patcher.stop)
+        self.addCleanup(timer_helper.cancel_all_timers)
+        self.uut = transports.ReliableTransport(
+                interface=mock.MagicMock(), link_mtu=1500)
+
+    def test_window_size_option_is_requested(self):
+        self.assertEqual([ppp.Option(1, b'\x7f')],
+                         self.uut.get_ncp_options())
+
+    def test_window_size_option_not_requested_after_reject(self):
+        self.uut.ncp_options_rejected([ppp.Option(1, b'\x7f')])
+        self.assertEqual([], self.uut.get_ncp_options())
+
+    def test_window_size_is_one_without_option(self):
+        self.assertIs(ppp.ConfigurationAccepted,
+                      self.uut.ncp_options_received([]))
+        self.uut.this_layer_up()
+        self.assertEqual(1, self.uut.window_size)
+
+    def test_window_size_from_peer_option(self):
+        self.assertIs(ppp.ConfigurationAccepted,
+                      self.uut.ncp_options_received([ppp.Option(1, b'\x08')]))
+        self.uut.this_layer_up()
+        self.assertEqual(8, self.uut.window_size)
+
+    def test_window_size_limited_by_max_window_size(self):
+        self.uut.max_window_size = 4
+        self.uut.ncp_options_received([ppp.Option(1, b'\x08')])
+        self.uut.this_layer_up()
+        self.assertEqual(4, self.uut.window_size)
+
+    def test_out_of_range_window_size_is_clamped(self):
+        self.uut.ncp_options_received([ppp.Option(1, b'\xff')])
+        self.uut.this_layer_up()
+        self.assertEqual(127, self.uut.window_size)
+        self.uut.this_layer_down()
+        self.uut.ncp_options_received([ppp.Option(1, b'\x00')])
+        self.uut.this_layer_up()
+        self.assertEqual(1, self.uut.window_size)
+
+
+class TestReliableTransportWindowed(unittest.TestCase):
+
+    def setUp(self):
+        FakeTimer.clear_timer_list()
+        timer_patcher = mock.patch('threading.Timer', new=FakeTimer)
+        timer_patcher.start()
+        self.addCleanup(timer_patcher.stop)
+
+        control_protocol_patcher = mock.patch(
+                'pebble.pulse2.transports.TransportControlProtocol')
+        control_protocol_patcher.start()
+        self.addCleanup(control_protocol_patcher.stop)
+
+        self.uut = transports.ReliableTransport(
+                interface=mock.MagicMock(), link_mtu=1500)
+        self.uut.ncp.is_Opened.return_value = True
+        self.uut.peer_window_size = 4
+        self.uut.this_layer_up()
+        self.uut.response_packet_received(
+                transports.build_reliable_supervisory_packet(
+                    kind='RR', ack_number=0, final=True))
+        self.uut.command_socket.reset_mock()
+
+    def info_packet(self, sequence_number, information):
+        return transports.build_reliable_info_packet(
+                sequence_number=sequence_number, ack_number=0, poll=True,
+                port=0xbeef, information=information)
+
+    def send_packets(self, count):
+        for i in range(count):
+            self.uut.send(0xbeef, b'packet %d' % i)
+
+    def assert_info_packets_sent(self, sequence_numbers):
+        sent = []
+        for name, args, _ in self.uut.command_socket.method_calls:
+            if name == 'send':
+                sent.append(args[0])
+            elif name == 'send_many':
+                sent.extend(args[0])
+        self.assertEqual(
+                [self.info_packet(seq, b'packet %d' % seq)
+                 for seq in sequence_numbers], sent)
+        self.uut.command_socket.reset_mock()
+
+    def receive_response(self, kind, ack_number):
+        self.uut.response_packet_received(
+                transports.build_reliable_supervisory_packet(
+                    kind=kind, ack_number=ack_number, final=True))
+
+    def test_window_limits_outstanding_packets(self):
+        self.send_packets(6)
+        self.assert_info_packets_sent([0, 1, 2, 3])
+        self.assertEqual(1, len(FakeTimer.get_active_timers()))
+
+    def test_cumulative_ack_opens_window(self):
+        self.send_packets(6)
+        self.assert_info_packets_sent([0, 1, 2, 3])
+        self.receive_response('RR', 2)
+        self.assert_info_packets_sent([4, 5])
+        self.assertEqual(1, len(FakeTimer.get_active_timers()))
+
+    def test_ack_of_all_outstanding_packets_stops_timer(self):
+        self.send_packets(3)
+        self.receive_response('RR', 3)
+        self.assertFalse(FakeTimer.get_active_timers())
+        self.assertFalse(self.uut.unacked_packets)
+
+    def test_duplicate_ack_is_ignored(self):
+        self.send_packets(3)
+        self.receive_response('RR', 1)
+        self.uut.command_socket.reset_mock()
+        self.receive_response('RR', 1)
+        self.assertEqual(2, len(self.uut.unacked_packets))
+        self.assertFalse(self.uut.command_socket.method_calls)
+
+    def test_ack_outside_window_is_ignored(self):
+        self.send_packets(3)
+        self.receive_response('RR', 100)
+        self.assertEqual(3, len(self.uut.unacked_packets))
+
+    def test_send_many_coalesces_packets(self):
+        self.uut.send_many(0xbeef, [b'packet %d' % i for i in range(6)])
+        self.uut.command_socket.send_many.assert_called_once_with(
+                [self.info_packet(seq, b'packet %d' % seq)
+                 for seq in range(4)])
+
+    def test_send_many_from_generator(self):
+        self.uut.send_many(0xbeef, (b'packet %d' % i for i in range(2)))
+        self.uut.command_socket.send_many.assert_called_once_with(
+                [self.info_packet(seq, b'packet %d' % seq)
+                 for seq in range(2)])
+
+    def test_reject_retransmits_from_rejected_packet(self):
+        self.send_packets(4)
+        self.assert_info_packets_sent([0, 1, 2, 3])
+        self.receive_response('REJ', 1)
+        self.assert_info_packets_sent([1, 2, 3])
+        self.assertEqual(1, self.uut.stats['rejects_received'])
+
+    def test_timeout_retransmits_all_outstanding_packets(self):
+        self.send_packets(3)
+        self.assert_info_packets_sent([0, 1, 2])
+        FakeTimer.get_active_timers()[-1].expire()
+        self.assert_info_packets_sent([0, 1, 2])
+        self.assertEqual(1, len(FakeTimer.get_active_timers()))
+
+    def test_sequence_numbers_wrap_around(self):
+        for i in range(self.uut.MODULUS + 2):
+            self.uut.send(0xbeef, b'x')
+            self.receive_response('RR', (i + 1) % self.uut.MODULUS)
+        self.assertEqual(2, self.uut.send_variable)
+        self.assertFalse(self.uut.unacked_packets)
+
+    def test_out_of_sequence_packet_is_rejected_once(self):
+        socket = self.uut.open_socket(0xbeef, timeout=0)
+        self.uut.command_packet_received(self.info_packet(1, b'one'))
+        self.uut.command_packet_received(self.info_packet(2, b'two'))
+        self.uut.command_packet_received(self.info_packet(0, b'zero'))
+        self.assertEqual(
+                [mock.call(transports.build_reliable_supervisory_packet(
+                    kind='REJ', ack_number=0, final=True)),
+                 mock.call(transports.build_reliable_supervisory_packet(
+                    kind='RR', ack_number=0, final=True)),
+                 mock.call(transports.build_reliable_supervisory_packet(
+                    kind='RR', ack_number=1, final=True))],
+                self.uut.response_socket.send.call_args_list)
+        self.assertEqual(b'zero', socket.receive(block=False))
+        with self.assertRaises(exceptions.ReceiveQueueEmpty):
+            socket.receive(block=False)
+
+
+class TestReliableTransportLoopback(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(timer_helper.cancel_all_timers)
+        self.interfaces = loopback.LoopbackInterface.pair(
+                latency=0.001, seed=1)
+        self.transports = []
+        for interface in self.interfaces:
+            transport = transports.ReliableTransport(interface, link_mtu=1500)
+            transport.retransmit_timeout = 0.05
+            self.transports.append(transport)
+            self.addCleanup(transport.down)
+            self.addCleanup(interface.close)
+        self.sockets = [t.open_socket(0xbeef, timeout=5.0)
+                        for t in self.transports]
+
+    def test_window_size_is_negotiated(self):
+        for transport in self.transports:
+            self.assertEqual(transport.max_window_size, transport.window_size)
+
+    def test_in_order_delivery_over_lossy_link(self):
+        for interface in self.interfaces:
+            interface.loss = 0.05
+        data = [b'packet %d' % i for i in range(300)]
+        for datum in data:
+            self.sockets[0].send(datum)
+        received = [self.sockets[1].receive(timeout=5.0) for _ in data]
+        self.assertEqual(data, received)
+
+
 class TestSocket(unittest.TestCase):
 
     def setUp(self):
@@ -5,7 +5,6 @@ import os.path
 import re
 import sh
 import subprocess
-import sys
 import tempfile
 
 
@@ -135,64 +134,18 @@ def nm_generator(elf_path, use_fast_nm=True):
 
 def _get_symbols_table(f):
     # NOTE: nm crashes when we pass in the -l command line option. As a
-    # workaround, we use readelf to get the symbol to address mappings and then
-    # we use addr2line to get file/lines from the addresses.
-    infile = sh.arm_none_eabi_readelf('-s', '-W', f)
-
-    line_pattern = re.compile(r"""\s+([0-9]+\:)\s+  # number
-                                  ([0-9a-f]+)\s+    # address
-                                  ([0-9]+)\s+       # size
-                                  (\S+)\s+          # type
-                                  (\S+)\s+          # Bind
-                                  (\S+)\s+          # Visibility
-                                  (\S+)\s+          # Ndx
-                                  (\S+)             # symbol name
-                                  """, flags=re.VERBOSE)
-
-    def create_addr2line_process():
-        return subprocess.Popen(['arm-none-eabi-addr2line', '-e', f],
-                                stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE)
-    addr2line = create_addr2line_process()
+    # workaround, we get the symbols and their file/lines from the symbol table
+    # and debug info with the symbolizer.
+    from symbolizer import get_symbolizer
+    symbolizer = get_symbolizer(f)
 
     symbols = {}
-    for line_num, line in enumerate(infile):
-        if (line_num % 300) == 0:
-            sys.stdout.write(".")
-            sys.stdout.flush()
-
-        match = line_pattern.match(line)
-
-        if match is None:
-            continue
-
-        type = match.group(4)
-        if type not in ['FUNC', 'OBJECT']:
-            continue
-        addr = match.group(2)
-        symbol_name = match.group(8)
-
-        success = False
-        while not success:
-            try:
-                addr2line.stdin.write("0x%s\n" % addr)
-                success = True
-            except IOError:
-                # This happens if the previous iteration caused an error
-                addr2line = create_addr2line_process()
-
-        src_file_line = addr2line.stdout.readline().strip()
-        if src_file_line:
-            # Some Bluetopia paths start with 'C:\...'
-            components = src_file_line.split(':')
-            src_file = ":".join(components[:-1])
-            line = components[-1:][0]
+    for symbol_name, addr, _, _ in symbolizer.symbols():
+        location = symbolizer.symbolize(addr)
+        if location.filename:
+            symbols[symbol_name] = (location.filename, str(location.line))
         else:
-            (src_file, line) = ('?', '0')
-        symbols[symbol_name] = (src_file, line)
-
-    addr2line.kill()
+            symbols[symbol_name] = ('?', '0')
 
     return symbols
 
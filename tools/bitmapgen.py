@@ -11,6 +11,12 @@ import sys
 import png
 import itertools
 
+try:
+    import numpy
+except ImportError:
+    # Fall back to converting the image pixel by pixel
+    numpy = None
+
 import generate_c_byte_array
 from pebble_image_routines import (rgba32_triplet_to_argb8, num_colors_to_bitdepth,
                                    get_reduction_func)
@@ -82,13 +88,19 @@ class PebbleBitmap(object):
         self.color_reduction_method = color_reduction_method
         width, height, pixels, metadata = png.Reader(filename=path).asRGBA8()
 
-        # convert planar boxed row flat pixel to 2d array of (R, G, B, A) 
-        self._im_pixels = []
-        for row in pixels:
-            row_list = []
-            for (r, g, b, a) in grouper(row, 4):
-                row_list.append((r, g, b, a))
-            self._im_pixels.append(row_list)
+        if numpy is not None:
+            # height x width x (R, G, B, A) array
+            self._im_array = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+            for y, row in enumerate(pixels):
+                self._im_array[y] = numpy.asarray(row, dtype=numpy.uint8).reshape(width, 4)
+        else:
+            # convert planar boxed row flat pixel to 2d array of (R, G, B, A) 
+            self._im_pixels = []
+            for row in pixels:
+                row_list = []
+                for (r, g, b, a) in grouper(row, 4):
+                    row_list.append((r, g, b, a))
+                self._im_pixels.append(row_list)
 
         self._im_size = (width, height)
         self._set_bbox(crop)
@@ -97,7 +109,21 @@ class PebbleBitmap(object):
         left, top = (0, 0)
         right, bottom = self._im_size
 
-        if crop:
+        if crop and numpy is not None:
+            opaque = self._im_array[:, :, 3] != 0
+            rows = numpy.flatnonzero(opaque.any(axis=1))
+            columns = numpy.flatnonzero(opaque.any(axis=0))
+            if len(rows):
+                top, bottom = int(rows[0]), int(rows[-1]) + 1
+                left = int(columns[0])
+            else:
+                # Fully transparent
+                top, bottom = bottom, top
+                left = right
+            # NB: The per-pixel crop below trims the right edge by the number of transparent rows
+            # at the bottom rather than the number of transparent columns. Match it.
+            right -= self._im_size[1] - bottom
+        elif crop:
             alphas = [[p[3] for p in row] for row in self._im_pixels]
             alphas_transposed = list(zip(*alphas))
             for row in alphas:
@@ -160,6 +186,9 @@ class PebbleBitmap(object):
         The returned bitmap will always be y * row_size_bytes large.
         """
 
+        if numpy is not None:
+            return self._image_bits_bw_array()
+
         def get_monochrome_value_for_pixel(pixel):
             if pixel[3] < 127:
                 return self.color_map['transparent']
@@ -191,17 +220,87 @@ class PebbleBitmap(object):
 
         return b''.join(out_pixels)
 
+    def _image_bits_bw_array(self):
+        row_size_bytes = self.row_size_bytes()
+
+        # Like image_bits_bw, pixels to the right of the bitmap are included in the padding of
+        # each row, up to the width of the image.
+        pixels = self._im_array[self.y:self.y + self.h, self.x:self.x + row_size_bytes * 8]
+        alpha = pixels[:, :, 3]
+        # (r + g + b) / 3 < 127
+        dark = pixels[:, :, :3].sum(axis=2, dtype=numpy.uint16) < 381
+        values = numpy.where(alpha < 127, self.color_map['transparent'],
+                             numpy.where(dark, self.color_map['black'], self.color_map['white']))
+
+        bits = numpy.zeros((self.h, row_size_bytes * 8), dtype=numpy.uint8)
+        bits[:, :values.shape[1]] = values
+        # The least significant bit of each little-endian word is the leftmost pixel
+        return numpy.packbits(bits, axis=1, bitorder='little').tobytes()
+
+    def _reduced_argb8_array(self):
+        """
+        Return a height x width array of the ARGB8 colors of the bitmap, after color reduction.
+        """
+
+        pixels = self._im_array[self.y:self.y + self.h, self.x:self.x + self.w]
+        packed = pixels.astype(numpy.uint32)
+        packed = packed[:, :, 0] << 24 | packed[:, :, 1] << 16 | packed[:, :, 2] << 8 | packed[:, :, 3]
+
+        # Reduce each distinct color once
+        fn = get_reduction_func(self.palette_name, self.color_reduction_method)
+        colors, inverse = numpy.unique(packed, return_inverse=True)
+        lut = numpy.zeros(len(colors), dtype=numpy.uint8)
+        for i, color in enumerate(colors.tolist()):
+            r, g, b, a = fn(color >> 24, (color >> 16) & 0xff, (color >> 8) & 0xff, color & 0xff)
+            if a == 0:
+                # clear values in transparent pixels
+                r, g, b = (0, 0, 0)
+            lut[i] = rgba32_triplet_to_argb8(r, g, b, a)
+
+        return lut[inverse.reshape(-1)].reshape(packed.shape)
+
+    def _image_bits_color_array(self, argb8):
+        if self.bitdepth == 8:
+            return argb8.tobytes()
+
+        # all palettized color bitdepths (1, 2, 4)
+        # look up the color indexes in the palette, preferring the first of any duplicates
+        palette_lut = numpy.zeros(256, dtype=numpy.uint8)
+        for color_index in reversed(range(len(self.palette))):
+            palette_lut[self.palette[color_index]] = color_index
+        indexes = palette_lut[argb8]
+
+        # pack the color indexes with the first pixel in the most significant bits, padding the
+        # end of each row to a whole byte
+        pixels_per_byte = 8 // self.bitdepth
+        row_size_bytes = self.row_size_bytes()
+        padded = numpy.zeros((self.h, row_size_bytes * pixels_per_byte), dtype=numpy.uint8)
+        padded[:, :self.w] = indexes
+        shifts = self.bitdepth * numpy.arange(pixels_per_byte - 1, -1, -1, dtype=numpy.uint8)
+        packed = (padded.reshape(self.h, row_size_bytes, pixels_per_byte) << shifts).sum(
+            axis=2, dtype=numpy.uint8)
+        return packed.tobytes()
+
     def image_bits_color(self):
         """
         Return a raw color bitmap capable of being rendered using Pebble's bitblt graphics routines.
         """
 
+        if numpy is not None:
+            argb8 = self._reduced_argb8_array()
+
         if self.bitmap_format == FORMAT_COLOR_RAW:
             self.bitdepth = 8  # forced to 8-bit depth for color_raw, no palette
+        elif numpy is not None:
+            self._generate_palette_from_argb8(argb8)
         else:
             self.generate_palette()
 
         assert self.bitdepth is not None
+        if numpy is not None:
+            return self._image_bits_color_array(argb8)
+
+        fn = get_reduction_func(self.palette_name, self.color_reduction_method)
         out_pixels = []
         for row in range(self.y, self.y + self.h):
             packed_count = 0
@@ -211,7 +310,6 @@ class PebbleBitmap(object):
                 r, g, b, a = [pixel[i] for i in range(4)]
 
                 # convert RGBA 32-bit image colors to pebble color table
-                fn = get_reduction_func(self.palette_name, self.color_reduction_method)
                 r, g, b, a = fn(r, g, b, a)
                 if a == 0:
                     # clear values in transparent pixels
@@ -295,6 +393,11 @@ class PebbleBitmap(object):
         return to_file
 
     def generate_palette(self):
+        if numpy is not None:
+            self._generate_palette_from_argb8(self._reduced_argb8_array())
+            return
+
+        fn = get_reduction_func(self.palette_name, self.color_reduction_method)
         self.palette = []
         for row in range(self.y, self.y + self.h):
             for column in range(self.x, self.x + self.w):
@@ -302,7 +405,6 @@ class PebbleBitmap(object):
                 r, g, b, a = [pixel[i] for i in range(4)]
 
                 # convert RGBA 32-bit image colors to pebble color table
-                fn = get_reduction_func(self.palette_name, self.color_reduction_method)
                 r, g, b, a = fn(r, g, b, a)
 
                 if a == 0:
@@ -312,8 +414,17 @@ class PebbleBitmap(object):
                 # store color value as ARGB8 entry in the palette
                 self.palette.append(rgba32_triplet_to_argb8(r, g, b, a))
 
+        self._set_palette_colors(self.palette)
+
+    def _generate_palette_from_argb8(self, argb8):
+        # The colors in the order they first appear. Building the set from these gives the same
+        # palette order as building it from every pixel.
+        colors, first_indexes = numpy.unique(argb8, return_index=True)
+        self._set_palette_colors(colors[numpy.argsort(first_indexes)].tolist())
+
+    def _set_palette_colors(self, colors):
         # remove duplicate colors
-        self.palette = list(set(self.palette))
+        self.palette = list(set(colors))
 
         # get the bitdepth for the number of colors
         min_bitdepth = num_colors_to_bitdepth(len(self.palette))
@@ -0,0 +1,44 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import tempfile
+
+
+class FileCache(object):
+    """
+    A persistent cache of byte strings, stored as a directory of files named after their keys.
+
+    Keys must be usable as file names, such as hex digests. Files are replaced atomically, so
+    concurrent builds may share a cache, and failing to read or write it is never an error.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        """ Return the data stored for key, or None if there isn't any. """
+        try:
+            with open(self._file_path(key), 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def put(self, key, data):
+        """ Store data for key, replacing whatever was stored before. """
+        path = self._file_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except (IOError, OSError):
+            pass
@@ -5,6 +5,7 @@
 
 import argparse
 import freetype
+import hashlib
 import os
 import re
 import struct
@@ -13,8 +14,16 @@ import itertools
 import json
 from math import ceil
 
+try:
+    import numpy
+except ImportError:
+    # Fall back to building glyphs bit by bit
+    numpy = None
+
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 import generate_c_byte_array
+from file_cache import FileCache
+from process_pool import spawn_pool
 
 # Font v3 -- https://pebbletechnology.atlassian.net/wiki/display/DEV/Pebble+Resource+Pack+Format
 #   FontInfo
@@ -89,6 +98,18 @@ OFFSET_TABLE_MAX_SIZE = 128
 MAX_GLYPHS_EXTENDED = HASH_TABLE_SIZE * OFFSET_TABLE_MAX_SIZE
 MAX_GLYPHS = 256
 
+# If a font has been given more than one process to use and has at least PARALLEL_MIN_GLYPHS
+# glyphs (which is the case for the CJK language packs), its glyphs are rendered in chunks of
+# GLYPHS_PER_JOB by a pool of worker processes. Smaller fonts are quicker to render than it takes
+# to start the workers.
+PARALLEL_MIN_GLYPHS = 4096
+GLYPHS_PER_JOB = 512
+
+RLE_LEN = 2**(4-1)
+
+# Bump this when a change to glyph_bits changes the glyphs it renders.
+GLYPH_CACHE_VERSION = 1
+
 def grouper(n, iterable, fillvalue=None):
     """grouper(3, 'ABCDEFG', 'x') --> ABC DEF Gxx"""
     args = [iter(iterable)] * n
@@ -104,6 +125,73 @@ def bits(x):
         x = x >> 1
     return data
 
+def _rle4_nibbles(bitmap):
+    """ Return an array of the RLE4 units of a non-empty numpy array of bits, each as a nibble
+    holding the bit in bit 3 and the run length - 1 in bits 0-2.
+    """
+    starts = numpy.concatenate(([0], numpy.flatnonzero(bitmap[1:] != bitmap[:-1]) + 1))
+    lengths = numpy.diff(numpy.append(starts, len(bitmap)))
+
+    # Split the runs into units of at most RLE_LEN symbols; all but the last unit of a run are
+    # full length.
+    units_per_run = (lengths + RLE_LEN - 1) // RLE_LEN
+    unit_lengths = numpy.full(units_per_run.sum(), RLE_LEN)
+    unit_lengths[numpy.cumsum(units_per_run) - 1] = lengths - RLE_LEN * (units_per_run - 1)
+
+    return (numpy.repeat(bitmap[starts], units_per_run) << 3) | (unit_lengths - 1)
+
+class GlyphCache(FileCache):
+    """ A persistent cache of rendered glyphs, shared between builds and platforms.
+
+    The glyphs of each font configuration (font file contents, height and the flags which affect
+    rendering) are stored in one file of (glyph index, glyph_bits) records, so glyphs are only
+    rendered again when the font or its configuration changes.
+
+    hits and misses count the glyphs which were and weren't found in the cache.
+    """
+
+    _RECORD = struct.Struct('<II')
+
+    def __init__(self, path):
+        super(GlyphCache, self).__init__(path)
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, key):
+        """ Return a dictionary of glyph index to glyph_bits for a font configuration. """
+        data = self.get(key) or b''
+        glyphs = {}
+        offset = 0
+        while offset + self._RECORD.size <= len(data):
+            gindex, length = self._RECORD.unpack_from(data, offset)
+            offset += self._RECORD.size
+            glyphs[gindex] = data[offset:offset + length]
+            offset += length
+        return glyphs
+
+    def save(self, key, glyphs):
+        """ Add glyphs, a dictionary of glyph index to glyph_bits, to a font configuration. """
+        # Keep whatever was added by anyone else since the cache was loaded
+        all_glyphs = self.load(key)
+        all_glyphs.update(glyphs)
+        self.put(key, b''.join(self._RECORD.pack(gindex, len(glyph_bits)) + glyph_bits
+                               for gindex, glyph_bits in sorted(all_glyphs.items())))
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+_worker_font = None
+
+def _init_glyph_worker(font_args, features, tracking_adjust):
+    global _worker_font
+    _worker_font = Font(*font_args)
+    _worker_font.features = features
+    _worker_font.tracking_adjust = tracking_adjust
+
+def _render_glyphs(glyphs):
+    return [_worker_font.glyph_bits(codepoint, gindex) for codepoint, gindex in glyphs]
+
 class Font:
     def __init__(self, ttf_path, height, max_glyphs, max_glyph_size, legacy):
         self.version = FONT_VERSION_3
@@ -127,6 +215,8 @@ class Font:
         self.offset_tables = [[] for i in range(self.table_size)]
         self.offset_size_bytes = 4
         self.features = 0
+        self.processes = 1
+        self.glyph_cache = None
 
         self.glyph_header = ''.join((
             '<',  # little_endian
@@ -146,6 +236,14 @@ class Font:
             raise Exception("Unsupported compression engine: '{}'. Font {}".format(engine,
                             self.ttf_path))
 
+    def set_processes(self, processes):
+        """ Render the glyphs of large fonts with a pool of this many worker processes. """
+        self.processes = processes
+
+    def set_glyph_cache(self, glyph_cache):
+        """ Look up rendered glyphs in a GlyphCache and add newly rendered ones to it. """
+        self.glyph_cache = glyph_cache
+
     def set_version(self, version):
         self.version = version
 
@@ -176,10 +274,22 @@ class Font:
         # symbol and the length of the run. The length of each run of symbols is limited to
         # [1..2**(RLElen-1)]. For RLE4, the length is 3 bits (0-7), or 1-8 consecutive symbols.
         # For example: 11110111 is compressed to 1*4, 0*1, 1*3. or [(1, 4), (0, 1), (1, 3)]
-
-        RLE_LEN = 2**(4-1)  # TODO possibly make this a parameter.
-        # It would likely be a good idea to look into the 'bitstream' package for lengths that won't
-        # easily fit into a byte/short/int.
+        #
+        # Each unit is stored as a nibble (bit << 3 | length - 1), two units to a byte with the
+        # first one in the low nibble. Returns the packed bytes, padded with a (0, 1) unit to a
+        # whole number of bytes and with zeros to a multiple of 4 bytes, and the number of units
+        # (not including the padding).
+
+        if numpy is not None:
+            nibbles = _rle4_nibbles(numpy.asarray(bitmap, dtype=numpy.uint8))
+            num_units = len(nibbles)
+
+            # If the list is odd, add a padding unit
+            packed = numpy.zeros(((num_units + 7) // 8) * 4, dtype=numpy.uint8)
+            packed[:num_units // 2] = nibbles[0:num_units - 1:2] | (nibbles[1::2] << 4)
+            if num_units % 2:
+                packed[num_units // 2] = nibbles[-1]
+            return packed.tobytes(), num_units
 
         # First, generate a list of tuples (bit, count).
         unit_list = [(name, len(list(group))) for name, group in itertools.groupby(bitmap)]
@@ -201,18 +311,16 @@ class Font:
             rle_unit_list.append((0, 1))
 
         # Now pack the tuples into a binary stream. We can't pack nibbles, so join two
-        glyph_packed = []
+        glyph_packed = bytearray()
         it = iter(rle_unit_list)
         for name, length in it:
             name2, length2 = next(it)
-            packed_byte = name << 3 | (length - 1) | name2 << 7 | (length2 - 1) << 4
-            glyph_packed.append(struct.pack('<B', packed_byte))
+            glyph_packed.append(name << 3 | (length - 1) | name2 << 7 | (length2 - 1) << 4)
 
         # Pad out to the nearest 4 bytes
-        while (len(glyph_packed) % 4) > 0:
-            glyph_packed.append(struct.pack('<B', 0))
+        glyph_packed.extend(b'\0' * (-len(glyph_packed) % 4))
 
-        return (glyph_packed, num_units)
+        return (bytes(glyph_packed), num_units)
 
     # Make sure that we will be able to decompress the glyph in-place
     def check_decompress_glyph_RLE4(self, glyph_packed, width, rle_units):
@@ -220,61 +328,38 @@ class Font:
         #  [ <header> | <free space> | <encoded glyph> ]
         # Make sure that we can decode the encoded glyph to end up with the following arrangement:
         #  [ <header> |       <decoded glyph>          ]
-        # without overwriting the unprocessed encoded glyph in the process
+        # without overwriting the unprocessed encoded glyph in the process.
+        #
+        # Only the positions of the decoder matter: each byte of units is read from src_ptr, and
+        # a decoded byte is written to dst_ptr every time 8 bits have been decoded.
 
         header_size = struct.calcsize(self.glyph_header)
         dst_ptr = header_size
         src_ptr = self.max_glyph_size - len(glyph_packed)
 
-        def glyph_packed_iterator(tbl, num):
-            for i in range(0, num):
-                yield struct.unpack('<B', tbl[i])[0]
-
-        # Generate glyph buffer. Ignore the header
-        bitmap = [0] * self.max_glyph_size
-        bitmap[-len(glyph_packed):] = glyph_packed_iterator(glyph_packed, len(glyph_packed))
-
         out_num_bits = 0
-        out = 0
-        total_length = 0
-        while rle_units > 0:
-            if src_ptr >= self.max_glyph_size:
-                raise Exception("Error: input stream too large for buffer. Font {}".
-                                format(self.ttf_path))
-
-            unit_pair = bitmap[src_ptr]
-            src_ptr += 1
-            for i in range(min(rle_units, 2)):
-                colour = (unit_pair >> 3) & 1
-                length = (unit_pair & 0x07) + 1
-                total_length += length
-
-                if colour:
-                    # Generate the bitpattern 111...
-                    add = (1 << length) - 1
-                    out |= (add << out_num_bits)
-                out_num_bits += length
-
-                if out_num_bits >= 8:
-                    if dst_ptr >= src_ptr:
-                        raise Exception("Error: unable to RLE4 decode in place! Overrun. Font {}".
-                                        format(self.ttf_path))
-                    if dst_ptr >= self.max_glyph_size:
-                        raise Exception("Error: output bitmap too large for buffer. Font {}".
-                                        format(self.ttf_path))
-                    bitmap[dst_ptr] = (out & 0xFF)
-                    dst_ptr += 1
-                    out >>= 8
-                    out_num_bits -= 8
-
-                unit_pair >>= 4
-                rle_units -= 1
-
-        while out_num_bits > 0:
-            bitmap[dst_ptr] = (out & 0xFF)
-            dst_ptr += 1
-            out >>= 8
-            out_num_bits -= 8
+        for unit in range(rle_units):
+            if unit % 2 == 0:
+                if src_ptr >= self.max_glyph_size:
+                    raise Exception("Error: input stream too large for buffer. Font {}".
+                                    format(self.ttf_path))
+                src_ptr += 1
+
+            out_num_bits += ((glyph_packed[unit // 2] >> (4 * (unit % 2))) & 0x07) + 1
+
+            if out_num_bits >= 8:
+                if dst_ptr >= src_ptr:
+                    raise Exception("Error: unable to RLE4 decode in place! Overrun. Font {}".
+                                    format(self.ttf_path))
+                if dst_ptr >= self.max_glyph_size:
+                    raise Exception("Error: output bitmap too large for buffer. Font {}".
+                                    format(self.ttf_path))
+                dst_ptr += 1
+                out_num_bits -= 8
+
+        if out_num_bits > 0 and dst_ptr >= self.max_glyph_size:
+            raise Exception("Error: output bitmap too large for buffer. Font {}".
+                            format(self.ttf_path))
 
         # Success! We can in-place decode this glyph
         return True
@@ -293,8 +378,19 @@ class Font:
         bottom = self.max_height - self.face.glyph.bitmap_top
         pixel_mode = self.face.glyph.bitmap.pixel_mode
 
-        glyph_packed = []
-        if height and width:
+        glyph_packed = b''
+        if height and width and numpy is not None:
+            buf = numpy.array(bitmap.buffer, dtype=numpy.uint8)
+            if pixel_mode == 1:  # monochrome font, 1 bit per pixel
+                glyph_bitmap = numpy.unpackbits(buf.reshape(bitmap.rows, bitmap.pitch),
+                                                axis=1)[:, :bitmap.width].ravel()
+            elif pixel_mode == 2:  # grey font, 255 bits per pixel
+                glyph_bitmap = (buf > 127).view(numpy.uint8)
+            else:
+                # freetype-py should never give us a value not in (1,2)
+                raise Exception("Unsupported pixel mode: {}. Font {}".
+                                format(pixel_mode, self.ttf_path))
+        elif height and width:
             glyph_bitmap = []
             if pixel_mode == 1:  # monochrome font, 1 bit per pixel
                 for i in range(bitmap.rows):
@@ -310,30 +406,96 @@ class Font:
                 raise Exception("Unsupported pixel mode: {}. Font {}".
                                 format(pixel_mode, self.ttf_path))
 
+        if height and width:
             if (self.features & FEATURE_RLE4):
                 # HACK WARNING: override the height with the number of RLE4 units.
                 glyph_packed, height = self.compress_glyph_RLE4(glyph_bitmap)
                 if height > 255:
                     raise Exception("Unable to RLE4 compress -- more than 255 units required"
                                     "({}). Font {}".format(height, self.ttf_path))
-                # Check that we can in-place decompress. Will raise an exception if not.
-                self.check_decompress_glyph_RLE4(glyph_packed, width, height)
             else:
-                for word in grouper(32, glyph_bitmap, 0):
-                    w = 0
-                    for index, bit in enumerate(word):
-                        w |= bit << index
-                    glyph_packed.append(struct.pack('<I', w))
-
-                # Confirm that we're smaller than the cache size
-                size = ((width * height) + (8 - 1)) // 8
-                if size > self.max_glyph_size:
-                    raise Exception("Glyph too large! codepoint {}: {} > {}. Font {}".
-                                    format(codepoint, size, self.max_glyph_size, self.ttf_path))
+                if numpy is not None:
+                    # Rows of bits are packed LSB first into little-endian 32-bit words
+                    padded = numpy.zeros(-(-len(glyph_bitmap) // 32) * 32, dtype=numpy.uint8)
+                    padded[:len(glyph_bitmap)] = glyph_bitmap
+                    glyph_packed = numpy.packbits(padded, bitorder='little').tobytes()
+                else:
+                    glyph_packed = b''.join(
+                        struct.pack('<I', sum(bit << index for index, bit in enumerate(word)))
+                        for word in grouper(32, glyph_bitmap, 0))
+
+            self.check_glyph_size(codepoint, width, height, glyph_packed)
 
         glyph_header = struct.pack(self.glyph_header, width, height, left, bottom, advance)
 
-        return glyph_header + b''.join(glyph_packed)
+        return glyph_header + glyph_packed
+
+    def check_glyph_size(self, codepoint, width, height, glyph_packed):
+        """ Raise an exception if a glyph doesn't fit in the glyph cache on the watch. """
+        if (self.features & FEATURE_RLE4):
+            # Check that we can in-place decompress. Will raise an exception if not.
+            self.check_decompress_glyph_RLE4(glyph_packed, width, height)
+        else:
+            # Confirm that we're smaller than the cache size
+            size = ((width * height) + (8 - 1)) // 8
+            if size > self.max_glyph_size:
+                raise Exception("Glyph too large! codepoint {}: {} > {}. Font {}".
+                                format(codepoint, size, self.max_glyph_size, self.ttf_path))
+
+    def glyph_cache_key(self):
+        """ Return the key of the glyphs of this font configuration in a GlyphCache. The maximum
+        glyph size isn't part of it, since it doesn't change the glyphs: check_glyph_size is run
+        again on every glyph found in the cache.
+        """
+        h = hashlib.sha256()
+        with open(self.ttf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        key = (GLYPH_CACHE_VERSION, freetype.version(), h.hexdigest(), self.max_height,
+               bool(self.legacy), bool(self.features & FEATURE_RLE4), self.tracking_adjust)
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    def render_glyphs(self, glyphs):
+        """ Return the glyph_bits of each of a list of (codepoint, glyph index) pairs, taking them
+        from the glyph cache where possible.
+        """
+        if self.glyph_cache is None:
+            return self._render_glyphs(glyphs)
+
+        key = self.glyph_cache_key()
+        cached = self.glyph_cache.load(key)
+        header_size = struct.calcsize(self.glyph_header)
+
+        misses = []
+        for codepoint, gindex in glyphs:
+            glyph_bits = cached.get(gindex)
+            if glyph_bits is None:
+                misses.append((codepoint, gindex))
+                continue
+            width, height = struct.unpack_from('<BB', glyph_bits)
+            if height and width:
+                self.check_glyph_size(codepoint, width, height, glyph_bits[header_size:])
+
+        self.glyph_cache.hits += len(glyphs) - len(misses)
+        self.glyph_cache.misses += len(misses)
+
+        if misses:
+            rendered = dict(zip((gindex for _, gindex in misses), self._render_glyphs(misses)))
+            self.glyph_cache.save(key, rendered)
+            cached.update(rendered)
+
+        return [cached[gindex] for _, gindex in glyphs]
+
+    def _render_glyphs(self, glyphs):
+        if self.processes <= 1 or len(glyphs) < PARALLEL_MIN_GLYPHS:
+            return [self.glyph_bits(codepoint, gindex) for codepoint, gindex in glyphs]
+
+        font_args = (self.ttf_path, self.max_height, self.max_glyphs, self.max_glyph_size,
+                     self.legacy)
+        jobs = [glyphs[i:i + GLYPHS_PER_JOB] for i in range(0, len(glyphs), GLYPHS_PER_JOB)]
+        with spawn_pool(min(self.processes, len(jobs)), initializer=_init_glyph_worker,
+                        initargs=(font_args, self.features, self.tracking_adjust)) as pool:
+            return [glyph_bits for job in pool.map(_render_glyphs, jobs) for glyph_bits in job]
 
     def fontinfo_bits(self):
         if self.version == FONT_VERSION_2:
@@ -380,45 +542,23 @@ class Font:
                     print("error: %d > 127" % bucket_sizes[glyph_hash])
             return bucket_sizes
 
-        def add_glyph(codepoint, next_offset, gindex, glyph_indices_lookup):
-            offset = next_offset
-            if gindex not in glyph_indices_lookup:
-                glyph_bits = self.glyph_bits(codepoint, gindex)
-                glyph_indices_lookup[gindex] = offset
-                self.glyph_table.append(glyph_bits)
-                next_offset += len(glyph_bits)
-            else:
-                offset = glyph_indices_lookup[gindex]
-
-            if (codepoint > MAX_2_BYTES_CODEPOINT):
-                self.codepoint_bytes = 4
-
-            self.number_of_glyphs += 1
-            return offset, next_offset, glyph_indices_lookup
+        codepoints = set(self.codepoints)
 
         def codepoint_is_in_subset(codepoint):
            if (codepoint not in (WILDCARD_CODEPOINT, ELLIPSIS_CODEPOINT)):
               if self.regex is not None:
                   if self.regex.match(chr(codepoint)) is None:
                       return False
-              if codepoint not in self.codepoints:
+              if codepoint not in codepoints:
                  return False
            return True
 
-        glyph_entries = []
-        # MJZ: The 0th offset of the glyph table is 32-bits of
-        # padding, no idea why.
-        self.glyph_table.append(struct.pack('<I', 0))
-        self.number_of_glyphs = 0
-        glyph_indices_lookup = dict()
-        next_offset = 4
+        # First find the glyph index of every codepoint in the font, starting with the wildcard
+        # glyph, and then render each distinct glyph once.
+        self.number_of_glyphs = 1
+        codepoint_gindices = [(WILDCARD_CODEPOINT, 0)]
         codepoint, gindex = self.face.get_first_char()
 
-        # add wildcard_glyph
-        offset, next_offset, glyph_indices_lookup = add_glyph(WILDCARD_CODEPOINT, next_offset, 0,
-                                                              glyph_indices_lookup)
-        glyph_entries.append((WILDCARD_CODEPOINT, offset))
-
         while gindex:
             # Hard limit on the number of glyphs in a font
             if (self.number_of_glyphs > self.max_glyphs):
@@ -433,12 +573,31 @@ class Font:
                                 format(self.ttf_path))
 
             if (codepoint_is_in_subset(codepoint)):
-                offset, next_offset, glyph_indices_lookup = add_glyph(codepoint, next_offset,
-                                                                      gindex, glyph_indices_lookup)
-                glyph_entries.append((codepoint, offset))
+                codepoint_gindices.append((codepoint, gindex))
+                if (codepoint > MAX_2_BYTES_CODEPOINT):
+                    self.codepoint_bytes = 4
+                self.number_of_glyphs += 1
 
             codepoint, gindex = self.face.get_next_char(codepoint, gindex)
 
+        glyphs = {}
+        for codepoint, gindex in codepoint_gindices:
+            glyphs.setdefault(gindex, codepoint)
+        glyphs = [(codepoint, gindex) for gindex, codepoint in glyphs.items()]
+
+        # MJZ: The 0th offset of the glyph table is 32-bits of
+        # padding, no idea why.
+        self.glyph_table.append(struct.pack('<I', 0))
+        glyph_offsets = {}
+        next_offset = 4
+        for (codepoint, gindex), glyph_bits in zip(glyphs, self.render_glyphs(glyphs)):
+            glyph_offsets[gindex] = next_offset
+            self.glyph_table.append(glyph_bits)
+            next_offset += len(glyph_bits)
+
+        glyph_entries = [(codepoint, glyph_offsets[gindex])
+                         for codepoint, gindex in codepoint_gindices]
+
         # Decide if we need 2 byte or 4 byte offsets
         glyph_data_bytes = sum(len(glyph) for glyph in self.glyph_table)
         if self.version == FONT_VERSION_3 and glyph_data_bytes < 65536:
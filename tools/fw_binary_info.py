@@ -47,13 +47,15 @@ class PebbleFirmwareBinaryInfo(object):
         _, ext = os.path.splitext(self.path)
         assert ext == '.bin', 'Can only calculate crc for .bin files'
         with open(self.path, 'rb') as f:
-            image = f.read()
-        if self.hw_platform in self.LEGACY_CRC_PLATFORMS:
-            # use the legacy defective crc
-            return stm32_crc.crc32(image)
-        else:
-            # use a regular crc
-            return crc32(image) & 0xFFFFFFFF
+            if self.hw_platform in self.LEGACY_CRC_PLATFORMS:
+                # use the legacy defective crc
+                return stm32_crc.process_file(f)
+            else:
+                # use a regular crc
+                crc = 0
+                for chunk in iter(lambda: f.read(65536), b''):
+                    crc = crc32(chunk, crc)
+                return crc & 0xFFFFFFFF
 
     def _get_footer_struct(self):
         fmt = '<' + reduce(lambda s, t: s + t[0],
@@ -25,6 +25,77 @@ facts and functionalities of graphs.
 import pprint
 
 
+# Stands in for the vertex which decompose_into_trails connects to every odd-degree vertex
+_VIRTUAL_VERTEX = object()
+
+
+def decompose_into_trails(edges):
+    """ Splits an undirected graph, given as a list of (vertex, vertex) edges, into the fewest
+        trails (walks which don't repeat an edge) which together use every edge exactly once.
+
+        A connected component with 2k odd-degree vertices can't be drawn in fewer than k trails
+        (or one closed trail if k is 0), and that many are enough: joining every odd-degree
+        vertex to a virtual vertex makes all degrees even, so the graph has Euler circuits
+        (found with Hierholzer's algorithm), and cutting them wherever they pass through the
+        virtual vertex leaves k trails for each component.
+
+        Runs in time linear in the number of edges. Trails are returned longest first, each as
+        a list of vertices; closed trails start and end on the same vertex. Edges from a vertex
+        to itself are allowed.
+    """
+    neighbours = {}
+    for edge_id, (vertex1, vertex2) in enumerate(edges):
+        neighbours.setdefault(vertex1, []).append((vertex2, edge_id))
+        neighbours.setdefault(vertex2, []).append((vertex1, edge_id))
+
+    odd_vertices = [vertex for vertex in neighbours if len(neighbours[vertex]) % 2]
+    for edge_id, vertex in enumerate(odd_vertices, len(edges)):
+        neighbours[vertex].append((_VIRTUAL_VERTEX, edge_id))
+    neighbours[_VIRTUAL_VERTEX] = [(vertex, edge_id)
+                                   for edge_id, vertex in enumerate(odd_vertices, len(edges))]
+
+    used = [False] * (len(edges) + len(odd_vertices))
+    next_neighbour = dict.fromkeys(neighbours, 0)
+
+    def euler_circuit(start_vertex):
+        circuit = []
+        stack = [start_vertex]
+        while stack:
+            vertex = stack[-1]
+            vertex_neighbours = neighbours[vertex]
+            i = next_neighbour[vertex]
+            while i < len(vertex_neighbours) and used[vertex_neighbours[i][1]]:
+                i += 1
+            next_neighbour[vertex] = i
+            if i == len(vertex_neighbours):
+                circuit.append(stack.pop())
+            else:
+                neighbour, edge_id = vertex_neighbours[i]
+                used[edge_id] = True
+                stack.append(neighbour)
+        circuit.reverse()
+        return circuit
+
+    trails = []
+    # The components with odd-degree vertices all pass through the virtual vertex
+    if odd_vertices:
+        trail = []
+        for vertex in euler_circuit(_VIRTUAL_VERTEX)[1:]:
+            if vertex is _VIRTUAL_VERTEX:
+                trails.append(trail)
+                trail = []
+            else:
+                trail.append(vertex)
+    for vertex in neighbours:
+        if next_neighbour[vertex] < len(neighbours[vertex]):
+            circuit = euler_circuit(vertex)
+            if len(circuit) > 1:
+                trails.append(circuit)
+
+    trails.sort(key=len, reverse=True)
+    return trails
+
+
 def is_line_segment_in_path(path, vertex_1, vertex_2):
     for i in range(len(path) - 1):
         if path[i] == vertex_1 and path[i + 1] == vertex_2 \
@@ -44,6 +44,7 @@ def parse_color(color_opacity, truncate):
 def parse_json_line_data(json_line_data, viewbox_size=(DISPLAY_DIM_X, DISPLAY_DIM_Y)):
     # A list of one-way vectors, but intended to store their negatives at all times.
     bidirectional_lines = []
+    seen_lines = set()
 
     for line_data in json_line_data:
         # Skip invisible lines
@@ -66,53 +67,48 @@ def parse_json_line_data(json_line_data, viewbox_size=(DISPLAY_DIM_X, DISPLAY_DI
         reverse_line = (end_point, start_point)
 
         # Skip duplicate lines
-        if line in bidirectional_lines:
+        if line in seen_lines:
             continue
 
         bidirectional_lines.append(line)
         bidirectional_lines.append(reverse_line)
+        seen_lines.add(line)
+        seen_lines.add(reverse_line)
 
     return bidirectional_lines
 
 
+def determine_paths(bidirectional_lines):
+    '''
+    Returns the fewest paths which together draw every line segment in 'bidirectional_lines' once,
+    longest first. Each path is drawn by a single command.
+    '''
+    # Every segment is in 'bidirectional_lines' in both directions, keep one of them
+    segments = []
+    seen_lines = set()
+    for line in bidirectional_lines:
+        if line not in seen_lines:
+            segments.append(line)
+            seen_lines.add(line)
+            seen_lines.add((line[1], line[0]))
+
+    return graph.decompose_into_trails(segments)
+
+
 def determine_longest_path(bidirectional_lines):
     '''
     Returns the longest path in 'bidirectional_lines', and removes all its segments from 'bidirectional_lines'
     If 'bidirectional_lines' contains more than one possible longest path, only one will be returned.
     '''
-    # Construct graph out of bidirectional_lines
-    g = graph.Graph({})
-    for line in bidirectional_lines:
-        g.add_edge(line)
-
-    # Find longest path
-    longest_path_length = 0
-    longest_path = []
-    vertices = g.get_vertices()
-    for i in range(len(vertices)):
-        start_vertex = vertices[i]
-
-        for j in range(i, len(vertices)):
-            end_vertex = vertices[j]
-            paths = g.find_all_paths(start_vertex, end_vertex)
-            for path in paths:
-                if (len(path) - 1) > longest_path_length:
-                    longest_path = path
-                    longest_path_length = len(path) - 1
-
-    # Edge case - Line is a point
-    if len(longest_path) == 1:
-        longest_path = [longest_path, longest_path]
+    longest_path = determine_paths(bidirectional_lines)[0]
 
     # Remove longest_path's line segments from bidirectional_lines
     # Since bidirectional_lines is a list of one-way vectors but represents
     # bidirectional lines, a line segment and its reverse must be removed to
     # keep its integrity
-    for k in range(len(longest_path) - 1):
-        path_line = (longest_path[k], longest_path[k + 1])
-        reverse_path_line = (path_line[1], path_line[0])
-        bidirectional_lines.remove(path_line)
-        bidirectional_lines.remove(reverse_path_line)
+    path_lines = set(zip(longest_path, longest_path[1:]))
+    path_lines.update([(line[1], line[0]) for line in path_lines])
+    bidirectional_lines[:] = [line for line in bidirectional_lines if line not in path_lines]
 
     return longest_path
 
@@ -131,11 +127,9 @@ def process_unique_group_of_lines(unique_group_data, translate, viewbox_size, pa
     if not bidirectional_lines:
         return unique_group_commands
 
-    while bidirectional_lines:
-        longest_path = determine_longest_path(bidirectional_lines)
-
+    for path in determine_paths(bidirectional_lines):
         try:
-            c = pebble_commands.PathCommand(longest_path,
+            c = pebble_commands.PathCommand(path,
                                             path_open,
                                             translate,
                                             stroke_width,
@@ -289,7 +283,7 @@ def get_commands(translate, viewbox_size, frame_data, precise=False, raise_error
     return commands, errors
 
 
-def parse_json_sequence(filename, viewbox_size, precise=False, raise_error=False):
+def parse_json_sequence(filename, viewbox_size, precise=False, raise_error=False, processes=1):
     frames = []
     errors = []
     translate = (0, 0)
@@ -303,14 +297,12 @@ def parse_json_sequence(filename, viewbox_size, precise=False, raise_error=False
 
         frames_data = data['lineData']
         frame_duration = int(data['compData']['frameDuration'] * 1000)
-        for idx, frame_data in enumerate(frames_data):
-            cmd_list, frame_errors = get_commands(
-                                        translate,
-                                        viewbox_size,
-                                        frame_data,
-                                        precise,
-                                        raise_error)
-
+        results = pebble_commands.map_frames(
+                    get_commands,
+                    [(translate, viewbox_size, frame_data, precise, raise_error)
+                     for frame_data in frames_data],
+                    processes)
+        for idx, (cmd_list, frame_errors) in enumerate(results):
             if frame_errors:
                 errors.append((idx, frame_errors))
             elif cmd_list is not None:
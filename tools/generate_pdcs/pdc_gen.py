@@ -18,7 +18,8 @@ from . import json2commands
 
 
 def create_pdc_data_from_path(path, viewbox_size, verbose, duration, play_count,
-                              precise=False, raise_error=False):
+                              precise=False, raise_error=False, processes=1,
+                              coalesce_frames=False):
     dir_name = path
     output = ''
     errors = []
@@ -36,13 +37,14 @@ def create_pdc_data_from_path(path, viewbox_size, verbose, duration, play_count,
         ext = os.path.splitext(path)[-1]
         if ext == '.json':
             # JSON file
-            result = json2commands.parse_json_sequence(path, viewbox_size, precise, raise_error)
+            result = json2commands.parse_json_sequence(path, viewbox_size, precise, raise_error,
+                                                       processes)
             if result:
                 frames = result[0]
                 errors += result[1]
                 frame_duration = result[2]
                 output = pebble_commands.serialize_sequence(
-                    frames, viewbox_size, frame_duration, play_count)
+                    frames, viewbox_size, frame_duration, play_count, coalesce_frames)
         elif ext == '.svg':
             # SVG file
             size, commands, error = svg2commands.parse_svg_image(path, verbose, precise,
@@ -54,12 +56,14 @@ def create_pdc_data_from_path(path, viewbox_size, verbose, duration, play_count,
     else:
         # SVG files
         # get all .svg files in directory
-        result = svg2commands.parse_svg_sequence(dir_name, verbose, precise, raise_error)
+        result = svg2commands.parse_svg_sequence(dir_name, verbose, precise, raise_error,
+                                                 processes)
         if result:
             frames = result[1]
             size = result[0]
             errors += result[2]
-            output = pebble_commands.serialize_sequence(frames, size, duration, play_count)
+            output = pebble_commands.serialize_sequence(frames, size, duration, play_count,
+                                                        coalesce_frames)
 
     if verbose:
         if frames:
@@ -71,10 +75,10 @@ def create_pdc_data_from_path(path, viewbox_size, verbose, duration, play_count,
 
 
 def create_pdc_from_path(path, out_path, viewbox_size, verbose, duration, play_count,
-                         precise=False, raise_error=False):
+                         precise=False, raise_error=False, processes=1, coalesce_frames=False):
 
     output, errors = create_pdc_data_from_path(path, viewbox_size, verbose, duration, play_count,
-                                               precise, raise_error)
+                                               precise, raise_error, processes, coalesce_frames)
 
     sequence = True
     dirname = path
@@ -101,7 +105,8 @@ def main(args):
     path = os.path.abspath(args.path)
     viewbox_size = (args.viewbox_x, args.viewbox_y)
     errors = create_pdc_from_path(path, args.output, viewbox_size, args.verbose, args.duration,
-                                  args.play_count, args.precise)
+                                  args.play_count, args.precise, processes=args.jobs,
+                                  coalesce_frames=args.coalesce_frames)
     if errors:
         print("Errors in the following files or frames:")
         for ef in errors:
@@ -123,6 +128,13 @@ if __name__ == '__main__':
                         help="Number of times the sequence should play - default = 1")
     parser.add_argument('-p', '--precise', action='store_true',
                         help="Use sub-pixel precision for paths")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Number of processes to parse the frames of large sequences with "
+                             "- default = number of CPUs")
+    parser.add_argument('--coalesce_frames', action='store_true',
+                        help="Store consecutive identical frames of a sequence as one frame "
+                             "which lasts as long as all of them. Only use this for sequences "
+                             "which are played by elapsed time rather than by frame index")
     parser.add_argument('-x', '--viewbox_x', help="Viewbox length (JSON sequence only)",
                         type=int, default=json2commands.DISPLAY_DIM_X)
     parser.add_argument('-y', '--viewbox_y', help="Viewbox height (JSON sequence only)",
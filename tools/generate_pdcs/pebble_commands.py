@@ -12,13 +12,12 @@ There are two types of Draw Commands ('PathCommand' and 'CircleCommand') that ca
 The serialization of both types of commands is described in the 'Command' class below.
 '''
 
-import sys
+import math
 from struct import pack
 from pebble_image_routines import nearest_color_to_pebble64_palette, \
     truncate_color_to_pebble64_palette, \
     rgba32_triplet_to_argb8
-
-epsilon = sys.float_info.epsilon
+from process_pool import spawn_pool
 
 DRAW_COMMAND_VERSION = 1
 DRAW_COMMAND_TYPE_PATH = 1
@@ -27,6 +26,14 @@ DRAW_COMMAND_TYPE_PRECISE_PATH = 3
 
 COORDINATE_SHIFT_WARNING_THRESHOLD = 0.1
 
+# Frame durations are 16-bit
+MAX_FRAME_DURATION = 0xFFFF
+
+# If a sequence has been given more than one process to use and has at least PARALLEL_MIN_FRAMES
+# frames, its frames are parsed by a pool of worker processes. The frames of smaller sequences are
+# quicker to parse than it takes to start the workers.
+PARALLEL_MIN_FRAMES = 256
+
 xmlns = '{http://www.w3.org/2000/svg}'
 
 
@@ -39,9 +46,8 @@ def subtract_points(p1, p2):
 
 
 def round_point(p):
-    # hack to get around the fact that python rounds negative
-    # numbers downwards
-    return round(p[0] + epsilon), round(p[1] + epsilon)
+    # round halves upwards, the same for negative numbers as for positive ones
+    return math.floor(p[0] + 0.5), math.floor(p[1] + 0.5)
 
 
 def scale_point(p, factor):
@@ -251,10 +257,37 @@ def pack_header(size):
     return pack('<BBhh', DRAW_COMMAND_VERSION, 0, int(round(size[0])), int(round(size[1])))
 
 
-def serialize_sequence(frames, size, duration, play_count):
-    s = pack_header(size) + pack('H', play_count) + pack('H', len(frames))
-    for f in frames:
-        s += serialize_frame(f, duration)
+def coalesce_frames(serialized_frames, duration):
+    """
+    Merge runs of identical serialized frames into one frame which is shown for as long as the
+    whole run. Returns a list of (serialized frame, duration) tuples.
+    """
+    coalesced = []
+    for frame in serialized_frames:
+        if coalesced and coalesced[-1][0] == frame and \
+                coalesced[-1][1] + duration <= MAX_FRAME_DURATION:
+            coalesced[-1] = (frame, coalesced[-1][1] + duration)
+        else:
+            coalesced.append((frame, duration))
+    return coalesced
+
+
+def serialize_sequence(frames, size, duration, play_count, coalesce=False):
+    """
+    Serialize a sequence of frames which are each shown for duration ms. If coalesce is set,
+    consecutive frames which are identical are stored once with their durations added up. That
+    doesn't change how the sequence plays by elapsed time, but it does change the number of
+    frames, so it's not suitable for sequences which are played by frame index.
+    """
+    serialized_frames = [serialize(f) for f in frames]
+    if coalesce:
+        timed_frames = coalesce_frames(serialized_frames, duration)
+    else:
+        timed_frames = [(frame, duration) for frame in serialized_frames]
+
+    s = pack_header(size) + pack('H', play_count) + pack('H', len(timed_frames))
+    for frame, frame_duration in timed_frames:
+        s += pack('H', frame_duration) + frame   # Frame duration
 
     output = b"PDCS"
     output += pack('I', len(s))
@@ -262,6 +295,18 @@ def serialize_sequence(frames, size, duration, play_count):
     return output
 
 
+def map_frames(function, frames_args, processes=1):
+    """
+    Return [function(*args) for args in frames_args], in the same order, calling function from a
+    pool of processes if there are enough frames to make it worthwhile.
+    """
+    if processes <= 1 or len(frames_args) < PARALLEL_MIN_FRAMES:
+        return [function(*args) for args in frames_args]
+
+    with spawn_pool(processes) as pool:
+        return pool.starmap(function, frames_args)
+
+
 def serialize_image(commands, size):
     s = pack_header(size)
     s += serialize(commands)
@@ -294,15 +294,22 @@ def parse_svg_image(filename, verbose=False, precise=False, raise_error=False):
     return size, cmd_list, error
 
 
-def parse_svg_sequence(dir_name, verbose=False, precise=False, raise_error=False):
+def parse_svg_frame(translate, filename, verbose=False, precise=False, raise_error=False):
+    return get_commands(translate, get_xml(filename), verbose, precise, raise_error)
+
+
+def parse_svg_sequence(dir_name, verbose=False, precise=False, raise_error=False, processes=1):
     frames = []
     error_files = []
     file_list = sorted(glob.glob(dir_name + "/*.svg"))
     if not file_list:
         return
     translate, size = get_info(get_xml(file_list[0]))  # get the viewbox from the first file
-    for filename in file_list:
-        cmd_list, error = get_commands(translate, get_xml(filename), verbose, precise, raise_error)
+    results = pebble_commands.map_frames(
+        parse_svg_frame,
+        [(translate, filename, verbose, precise, raise_error) for filename in file_list],
+        processes)
+    for filename, (cmd_list, error) in zip(file_list, results):
         if cmd_list is not None:
             frames.append(cmd_list)
         if error:
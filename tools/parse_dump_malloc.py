@@ -3,9 +3,10 @@
 
 import argparse
 import os
-import sh
 import sys
 
+from symbolizer import get_symbolizer
+
 
 total_alloc_size = 0
 alloc_count = 0
@@ -24,20 +25,16 @@ current_size = 0
 high_water_mark = 0
 
 def get_filename_linenumber(addr_str):
-  try:
-    line = sh.arm_none_eabi_addr2line(addr_str, exe=elf_path)
-  except:
+  location = get_symbolizer(elf_path).symbolize(int(addr_str, 0))
+  if location.filename is None:
     return ("?", 0)
-    
-  line = line.strip()
 
-  index = line.rfind(':')
-  filename = line[:index]
-  linenumber = line[index + 1:]
+  filename = location.filename
+  # Some Bluetopia paths start with 'C:\...'
   if ':' not in filename:
     filename = os.path.relpath(filename, root_path)
 
-  return (filename, linenumber)
+  return (filename, location.line)
 
 def handle_line(line, verbose):
   parts = line.split(' ')
@@ -74,10 +71,10 @@ def handle_line(line, verbose):
   is_free = (int(pc, 0) == 0)
   if verbose:
     if is_free:
-      print "Size: %6u, Addr: 0x%08x PC: 0x%08x FREE" % (actual_size, int(addr, 0), int(pc, 0))
+      print("Size: %6u, Addr: 0x%08x PC: 0x%08x FREE" % (actual_size, int(addr, 0), int(pc, 0)))
     else:
-      print "Size: %6u, Addr: 0x%08x PC: 0x%08x %s:%s" % (actual_size, int(addr, 0), int(pc, 0), filename,
-                                                          linenumber)
+      print("Size: %6u, Addr: 0x%08x PC: 0x%08x %s:%s" % (actual_size, int(addr, 0), int(pc, 0),
+                                                           filename, linenumber))
 
   global total_alloc_size
   global alloc_count
@@ -134,7 +131,7 @@ def draw_image():
 
   ctx.stroke()
   surface.write_to_png("dump_malloc.png")
-  print "Drew image to dump_malloc.png"
+  print("Drew image to dump_malloc.png")
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser()
@@ -169,20 +166,20 @@ if __name__ == '__main__':
       if high_addr > max_addr: max_addr = high_addr
 
   if verbose:
-    print ""
-  print "Heap start: 0x%x" % min_addr
-  print "Heap end: 0x%x" % max_addr
-  print "Heap size: %u bytes" % (max_addr - min_addr)
-  print "Total allocated: %u bytes, %u blocks" % (total_alloc_size, alloc_count);
-  print "High water mark: %u" % high_water_mark
-  print "Total free: %u bytes, %u blocks" % (total_free_size, free_count);
-  print "Largest free block: %u" % largest_free_block
-  print
-
-  per_file_list = [[k, v] for k, v in per_file_dict.iteritems()]
+    print("")
+  print("Heap start: 0x%x" % min_addr)
+  print("Heap end: 0x%x" % max_addr)
+  print("Heap size: %u bytes" % (max_addr - min_addr))
+  print("Total allocated: %u bytes, %u blocks" % (total_alloc_size, alloc_count))
+  print("High water mark: %u" % high_water_mark)
+  print("Total free: %u bytes, %u blocks" % (total_free_size, free_count))
+  print("Largest free block: %u" % largest_free_block)
+  print()
+
+  per_file_list = [[k, v] for k, v in per_file_dict.items()]
   sorted_per_file_list = sorted(per_file_list, key=lambda v: v[1], reverse=True)
   for k, v in sorted_per_file_list:
-    print "%s: %u bytes" % (k, v)
+    print("%s: %u bytes" % (k, v))
 
   if args.image:
     draw_image()
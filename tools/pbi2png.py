@@ -3,8 +3,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-import os, sys
+import argparse
+import multiprocessing
+import os
+import sys
 from ctypes import *
+
+import numpy
 from PIL import Image
 
 format_dict = {
@@ -53,83 +58,206 @@ def palette_size(fmt):
     return 2 ** pbi_bitdepth(fmt)
 
 
-def pbi_to_png(pbi, pixel_bytearray):
+# Reverses the order of the bits in a byte, indexed by the byte
+FLIP_BYTE_TABLE = bytes(flip_byte(abyte) for abyte in range(256))
+
+# RGBA32 colors indexed by argb8 color
+ARGB8_TO_RGBA32 = numpy.array([argb8_to_rgba32(argb8) for argb8 in range(256)],
+                              dtype=numpy.uint8)
+
+
+def unpack_rows(pixel_bytearray, pbi, bitdepth):
+    """
+    Unpack the bitdepth-bit pixel values of the rows of a bitmap (most significant bits first)
+    into an array of shape (bounds_h, bounds_w), leaving out the padding at the end of each row.
+    """
+    rows = numpy.frombuffer(bytes(pixel_bytearray), dtype=numpy.uint8,
+                            count=pbi.stride * pbi.bounds_h).reshape(pbi.bounds_h, pbi.stride)
+    if bitdepth != 8:
+        shifts = numpy.arange(8 - bitdepth, -1, -bitdepth, dtype=numpy.uint8)
+        rows = ((rows[:, :, numpy.newaxis] >> shifts) & ((1 << bitdepth) - 1)).reshape(
+            pbi.bounds_h, -1)
+    return rows[:, :pbi.bounds_w]
+
+
+def rgba_image(rgba_pixels):
+    height, width, _ = rgba_pixels.shape
+    return Image.frombuffer('RGBA', (width, height), rgba_pixels.tobytes(), 'raw', 'RGBA', 0, 1)
+
+
+def pbi_to_png(pbi, pixel_bytearray, verbose=True):
     gbitmap_version = (pbi.info >> 12) & 0x0F
     gbitmap_format = pbi_format(pbi.info)
     # if version is 2 and format is 0x01 (GBitmapFormat8Bit)
     if gbitmap_version == 1 and gbitmap_format == format_dict['GBitmapFormat8Bit']:
-        print("8-bit ARGB color image")
-        pixel_rgba_array = bytearray()
-        for (idx, abyte) in enumerate(pixel_bytearray):
-            argb8 = pixel_bytearray[idx]
-            pixel_rgba_array.append(((argb8 >> 4) & 0x3) * 85)  # r
-            pixel_rgba_array.append(((argb8 >> 2) & 0x3) * 85)  # g
-            pixel_rgba_array.append(((argb8 >> 0) & 0x3) * 85)  # b
-            pixel_rgba_array.append(((argb8 >> 6) & 0x3) * 85)  # a
-
-        png = Image.frombuffer('RGBA', (pbi.bounds_w, pbi.bounds_h),
-                               memoryview(pixel_rgba_array), 'raw', 'RGBA', pbi.stride * 4, 1)
+        if verbose:
+            print("8-bit ARGB color image")
+        png = rgba_image(ARGB8_TO_RGBA32[unpack_rows(pixel_bytearray, pbi, 8)])
 
     elif gbitmap_version == 1 and pbi_is_palettized(gbitmap_format):
         bitdepth = int(pbi_bitdepth(gbitmap_format))
-        print("{}-bit palettized color image".format(bitdepth))
+        if verbose:
+            print("{}-bit palettized color image".format(bitdepth))
 
         # Create palette colors in format R, G, B, A
-        palette = []
         palette_offset = pbi.stride * pbi.bounds_h
-        for argb8 in pixel_bytearray[palette_offset:]:
-            palette.append((argb8_to_rgba32(argb8)))
-
-        pixels = []
-        # go through the image data byte by byte, and handle
-        # converting the depth-packed indexes for the palette to an unpacked list
-        idx = 0  # index of actual packed values including padded values
-        for pxl8 in pixel_bytearray[:palette_offset]:
-            for i in range(0, 8 // bitdepth):
-                # only append actual pixels, ignoring padding pixels
-                # which is the difference between the width and the stride
-                if (idx % (pbi.stride * (8 / bitdepth)) < pbi.bounds_w):
-                    pixels.append(
-                        ((pxl8 >> (bitdepth * (8 // bitdepth - (i + 1)))) & ~(~0 << bitdepth)))
-                idx = idx + 1
+        palette = ARGB8_TO_RGBA32[numpy.frombuffer(bytes(pixel_bytearray[palette_offset:]),
+                                                   dtype=numpy.uint8)]
 
         # Manually convert from paletted to RGBA
         # as PIL doesn't seem to handle palette with alpha
-        rgba_pixels = []
-        for pal_pxl in pixels:
-            rgba_pixels.append(palette[pal_pxl])
-
-        png = Image.new('RGBA', (pbi.bounds_w, pbi.bounds_h))
-        png.putdata(rgba_pixels)
+        png = rgba_image(palette[unpack_rows(pixel_bytearray, pbi, bitdepth)])
 
     # legacy 1-bit format
     elif gbitmap_version == 0 or \
             (gbitmap_version == 1 and gbitmap_format == format_dict['GBitmapFormat1Bit']):
-        print("1-bit b&w image")
+        if verbose:
+            print("1-bit b&w image")
         # pbi has bits in bytes reversed, so flip here
-        for (idx, abyte) in enumerate(pixel_bytearray):
-            pixel_bytearray[idx] = flip_byte(pixel_bytearray[idx])
-
         png = Image.frombuffer('1', (pbi.bounds_w, pbi.bounds_h),
-                               buffer(pixel_bytearray), 'raw', '1', pbi.stride, 1)
+                               bytes(pixel_bytearray).translate(FLIP_BYTE_TABLE),
+                               'raw', '1', pbi.stride, 1)
     else:
-        print("Bad PBI")
+        if verbose:
+            print("Bad PBI")
         png = None
 
     return png
 
 
+def parse_pbi(data):
+    """
+    Split the contents of a PBI file into its header and pixel data. Returns None if the data
+    doesn't look like a PBI, which is how batch conversion picks out the images from resources
+    extracted from a pbpack.
+    """
+    if len(data) < sizeof(pbi_struct):
+        return None
+    pbi = pbi_struct.from_buffer_copy(data)
+    pixel_bytearray = bytearray(data[sizeof(pbi_struct):])
+
+    gbitmap_version = (pbi.info >> 12) & 0x0F
+    gbitmap_format = pbi_format(pbi.info)
+    if gbitmap_version == 0:
+        bitdepth = 1
+    elif gbitmap_version == 1 and gbitmap_format < len(format_dict):
+        bitdepth = pbi_bitdepth(gbitmap_format)
+    else:
+        return None
+
+    if not pbi.bounds_w or not pbi.bounds_h or pbi.stride * 8 < pbi.bounds_w * bitdepth:
+        return None
+    palette_bytes = len(pixel_bytearray) - pbi.stride * pbi.bounds_h
+    if palette_bytes < 0:
+        return None
+    if gbitmap_version == 1 and pbi_is_palettized(gbitmap_format) and \
+            not 0 < palette_bytes <= palette_size(gbitmap_format):
+        return None
+
+    return pbi, pixel_bytearray
+
+
+def convert_file(job):
+    """
+    Convert a PBI for the batch conversion. The job is a (path or data, output_path, pbi_only)
+    tuple; if pbi_only is set, data which isn't a PBI is skipped rather than reported as an error.
+    Returns the output path and an error message or None.
+    """
+    source, output_filename, pbi_only = job
+    if isinstance(source, str):
+        with open(source, 'rb') as afile:
+            source = afile.read()
+
+    parsed = parse_pbi(source)
+    if parsed is None:
+        return output_filename, None if pbi_only else "not a PBI"
+    try:
+        png = pbi_to_png(*parsed, verbose=False)
+    except (ValueError, IndexError) as e:
+        return output_filename, str(e)
+
+    os.makedirs(os.path.dirname(output_filename) or '.', exist_ok=True)
+    png.save(output_filename)
+    return output_filename, None
+
+
+def find_batch_jobs(inputs, output_dir, is_system=True):
+    """
+    Generate the jobs for convert_file() which convert every PBI in a list of PBI files,
+    directories and pbpacks. Directories are searched for .pbi files and for .dat files which
+    are PBIs (the resources written by unpack.py); each image in a pbpack is written to a
+    directory named after the pack.
+    """
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            for dirpath, dirnames, filenames in os.walk(input_path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    base, ext = os.path.splitext(filename)
+                    if ext in ('.pbi', '.dat'):
+                        yield (os.path.join(dirpath, filename),
+                               os.path.join(output_dir, os.path.relpath(dirpath, input_path),
+                                            base + '.png'),
+                               ext == '.dat')
+        elif input_path.endswith('.pbpack'):
+            from pbpack import MappedResourcePack
+
+            pack_name = os.path.splitext(os.path.basename(input_path))[0]
+            with MappedResourcePack.open(input_path, is_system) as resource_pack:
+                for resource_id in range(1, len(resource_pack) + 1):
+                    data = resource_pack.get_resource(resource_id).tobytes()
+                    if parse_pbi(data) is not None:
+                        yield (data,
+                               os.path.join(output_dir, pack_name, '{}.png'.format(resource_id)),
+                               True)
+        else:
+            base = os.path.splitext(os.path.basename(input_path))[0]
+            yield input_path, os.path.join(output_dir, base + '.png'), False
+
+
+def convert_batch(inputs, output_dir, processes=None, is_system=True):
+    """
+    Convert every PBI found in inputs into output_dir with a pool of worker processes. Returns
+    the number of images which could not be converted.
+    """
+    failures = 0
+    pool = multiprocessing.Pool(processes)
+    try:
+        for output_filename, error in pool.imap_unordered(convert_file,
+                                                          find_batch_jobs(inputs, output_dir,
+                                                                          is_system),
+                                                          chunksize=8):
+            if error is not None:
+                print("{}: {}".format(output_filename, error))
+                failures += 1
+    finally:
+        pool.terminate()
+    return failures
+
+
 def main():
-    # arguments, print an example of correct usage.
-    if len(sys.argv) - 1 != 2:
-        print("********************")
-        print("Usage suggestion:")
-        print("python " + sys.argv[0] + " <in_image.pbi> <out_image.png>")
-        print("********************")
-        exit()
-
-    input_filename = sys.argv[1]
-    output_filename = sys.argv[2]
+    parser = argparse.ArgumentParser(description="Convert PBI images to PNG.")
+    parser.add_argument('input', nargs='+',
+                        help="the PBI to convert, or with --batch any number of PBIs, "
+                             "directories and pbpacks")
+    parser.add_argument('output', help="the PNG to write, or with --batch the output directory")
+    parser.add_argument('--batch', action='store_true',
+                        help="convert all the PBIs found in the inputs across processes")
+    parser.add_argument('--app', action='store_true',
+                        help="pbpacks given with --batch are app resource packs")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="the number of processes to use with --batch "
+                             "(default: one per CPU)")
+    args = parser.parse_args()
+
+    if args.batch:
+        sys.exit(1 if convert_batch(args.input, args.output, args.jobs,
+                                  is_system=not args.app) else 0)
+    if len(args.input) != 1:
+        parser.error("only one input can be converted without --batch")
+
+    input_filename = args.input[0]
+    output_filename = args.output
 
     print("Converting PBI to PNG...")
     pbi = pbi_struct()
@@ -4,6 +4,9 @@
 
 
 import argparse
+import hashlib
+import mmap
+import os
 import stm32_crc
 import struct
 import time
@@ -57,8 +60,10 @@ class ResourcePack(object):
     MANIFEST_SIZE_BYTES = 12
 
     def get_content_crc(self):
-        all_contents = self.serialize_content()
-        return stm32_crc.crc32(all_contents)
+        crc = stm32_crc.Stm32Crc()
+        for content in self.iter_content():
+            crc.update(content)
+        return crc.crc
 
     def serialize_manifest(self, crc=None, timestamp=None):
         fmt = self.MANIFEST_FMT
@@ -66,34 +71,36 @@ class ResourcePack(object):
         return struct.pack(fmt, len(self.table_entries), self.crc, self.timestamp)
 
     def serialize_table(self):
-        # Serialize these entries into table_data
-        cur_file_id = 1
-        table_data = b''
+        # Serialize these entries into table_data. Unused entries at the end of the table are
+        # left zeroed, which is the same as an entry with a file_id of 0.
+        table_data = bytearray(self.table_size * self.TABLE_ENTRY_SIZE_BYTES)
+        fmt = ResourcePackTableEntry.TABLE_ENTRY_FMT
         for cur_file_id, table_entry in enumerate(self.table_entries, start=1):
-            table_data += table_entry.serialize(cur_file_id)
+            struct.pack_into(fmt, table_data, (cur_file_id - 1) * self.TABLE_ENTRY_SIZE_BYTES,
+                             cur_file_id, table_entry.offset, table_entry.length, table_entry.crc)
 
-        # Pad the rest of the table_data up to table_size
-        for i in range(cur_file_id, self.table_size):
-            table_data += ResourcePackTableEntry(0, 0, 0, 0).serialize(0)
+        return bytes(table_data)
 
-        return table_data
-
-    def serialize_content(self):
+    def iter_content(self):
         """
-        Serialize the content in the order dictated by offsets in the table entries
+        Yield each unique piece of content in the order dictated by offsets in the table entries
         """
 
         serialized_content_indexes = set()
-        serialized_content = []
         for entry in sorted(self.table_entries, key=lambda e: e.offset):
             if entry.content_index in serialized_content_indexes:
                 continue
 
             serialized_content_indexes.add(entry.content_index)
 
-            serialized_content.append(self.contents[entry.content_index])
+            yield self.contents[entry.content_index]
 
-        return b"".join(serialized_content)
+    def serialize_content(self):
+        """
+        Serialize the content in the order dictated by offsets in the table entries
+        """
+
+        return b"".join(self.iter_content())
 
     @classmethod
     def deserialize(cls, f_in, is_system=True):
@@ -130,13 +137,10 @@ class ResourcePack(object):
         # length combinations and then assign content indexes appropriately. We need to include the
         # length because we allow zero length resources and a zero length resource will have the
         # same offset as a non-zero length resource
-        unique_offsets = set()
+        unique_offsets = {}
         for e in resource_pack.table_entries:
-            unique_offsets.add((e.offset, e.length))
-        unique_offsets = list(unique_offsets)
-
-        for e in resource_pack.table_entries:
-            e.content_index = unique_offsets.index((e.offset, e.length))
+            e.content_index = unique_offsets.setdefault((e.offset, e.length),
+                                                        len(unique_offsets))
 
         # Fetch the contents, make sure we only load each unique piece of content once
         loaded_content_indexes = set()
@@ -182,16 +186,17 @@ class ResourcePack(object):
         # beginning of the table, that final resource would end up pointing to an assigned
         # offset somewhere in the middle of the pack, causing the pack to appear to be truncated.
         current_offset = sum((len(c) for c in self.contents))
+        content_offsets = {}
         for table_entry in reversed(self.table_entries):
             if table_entry.offset == -1:
-                # This entry doesn't have an offset in the output file yet, assign one to all
-                # entries that share the same content index
-
-                current_offset -= table_entry.length
-
-                for e in self.table_entries:
-                    if e.content_index == table_entry.content_index:
-                        e.offset = current_offset
+                # This entry doesn't have an offset in the output file yet. If another entry
+                # sharing the same content index was given one already, share it.
+                offset = content_offsets.get(table_entry.content_index)
+                if offset is None:
+                    current_offset -= table_entry.length
+                    offset = current_offset
+                    content_offsets[table_entry.content_index] = offset
+                table_entry.offset = offset
 
         self.crc = self.get_content_crc()
 
@@ -203,7 +208,8 @@ class ResourcePack(object):
 
         f_out.write(self.serialize_manifest(self.crc))
         f_out.write(self.serialize_table())
-        f_out.write(self.serialize_content())
+        for content in self.iter_content():
+            f_out.write(content)
 
         return self.crc
 
@@ -213,14 +219,13 @@ class ResourcePack(object):
                             "resource pack has already been finalized")
 
         # If resource already is present, add to table only
-        try:
-            # Try to find the index for this content if it already exists. If it doesn't we'll
-            # throw the ValueError.
-            content_index = self.contents.index(content)
-        except ValueError:
+        digest = hashlib.sha256(content).digest()
+        content_index = self.content_indexes.get(digest)
+        if content_index is None:
             # This content is completely new, add it to the contents list.
             self.contents.append(content)
             content_index = len(self.contents) - 1
+            self.content_indexes[digest] = content_index
 
         crc = stm32_crc.crc32(content)
 
@@ -255,6 +260,11 @@ class ResourcePack(object):
         # resource.
         self.contents = []
 
+        # Maps the SHA-256 digest of each piece of content added with add_resource to its index
+        # in self.contents, so that duplicates can be found without comparing against every
+        # earlier resource.
+        self.content_indexes = {}
+
         # List of resources that are in the pack. Note that this list may be longer than the
         # self.contents list if there are duplicates, duplicated entries (exact same data) will
         # not be repeated in self.contents. Each entry is a ResourcePackTableEntry
@@ -264,6 +274,448 @@ class ResourcePack(object):
         self.finalized = False
 
 
+def _verify_worker_init(path, is_system):
+    global _verify_worker_pack
+    _verify_worker_pack = MappedResourcePack.open(path, is_system)
+
+
+def _verify_worker_crc(offset_length):
+    offset, length = offset_length
+    return stm32_crc.crc32(_verify_worker_pack.get_content(offset, length))
+
+
+class MappedResourcePack(object):
+    """ Read-only, memory-mapped view of a .pbpack file.
+
+        Only the manifest and table are parsed up front. Resource content is accessed in place
+        through memoryviews of the mapping, and its CRCs are only checked on request. Use this
+        instead of ResourcePack.deserialize when inspecting or extracting from an existing pack.
+
+        Resource ids are the 1-based file ids used in the table, the same as RESOURCE_ID_*
+        values in the firmware.
+
+    """
+
+    def __init__(self, f_in, is_system=True, path=None):
+        self.table_size = 512 if is_system else 256
+        self.content_start = (ResourcePack.MANIFEST_SIZE_BYTES +
+                              self.table_size * ResourcePack.TABLE_ENTRY_SIZE_BYTES)
+        self.is_system = is_system
+        # Path of the mapped file, needed to verify the pack from other processes
+        self.path = path
+
+        # An empty file can't be mapped, so check the size before mapping it. The table is always
+        # written in full, so anything shorter than the manifest and table isn't a pbpack.
+        size = os.fstat(f_in.fileno()).st_size
+        if size < self.content_start:
+            raise Exception("File is %u bytes, but a pbpack is at least %u bytes" %
+                            (size, self.content_start))
+
+        self._mmap = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        (num_files, crc, timestamp) = struct.unpack_from(ResourcePack.MANIFEST_FMT, self._mmap)
+        self.num_files = num_files
+        self.crc = crc
+        self.timestamp = timestamp
+
+        self.table_entries = []
+        for n in range(num_files):
+            file_id, entry = ResourcePackTableEntry.deserialize(
+                self._mmap[ResourcePack.MANIFEST_SIZE_BYTES +
+                           n * ResourcePack.TABLE_ENTRY_SIZE_BYTES:
+                           ResourcePack.MANIFEST_SIZE_BYTES +
+                           (n + 1) * ResourcePack.TABLE_ENTRY_SIZE_BYTES])
+
+            if file_id == 0:
+                # No more entries
+                break
+
+            if file_id != n + 1:
+                raise Exception("File ID is expected to be %u, but was %u" %
+                                (n + 1, file_id))
+
+            self.table_entries.append(entry)
+
+        if len(self.table_entries) != num_files:
+            raise Exception("Number of files in manifest is %u, but actual"
+                            "number is %u" % (num_files, len(self.table_entries)))
+
+        for entry in self.table_entries:
+            if self.content_start + entry.offset + entry.length > len(self._mmap):
+                raise Exception("Entry %s extends past the end of the pack" % entry)
+
+    @classmethod
+    def open(cls, path, is_system=True):
+        with open(path, 'rb') as f_in:
+            # The mapping stays valid after the file is closed
+            return cls(f_in, is_system, path=path)
+
+    def close(self):
+        if self._mmap is None:
+            return
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views of resources are still referenced. The mapping is unmapped when the last of
+            # them is garbage collected instead.
+            pass
+        self._mmap = None
+        self._view = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.table_entries)
+
+    def get_entry(self, resource_id):
+        if not 1 <= resource_id <= len(self.table_entries):
+            raise IndexError("No resource with id %u" % resource_id)
+        return self.table_entries[resource_id - 1]
+
+    def get_content(self, offset, length):
+        start = self.content_start + offset
+        return self._view[start:start + length]
+
+    def get_header(self):
+        """
+        Return a memoryview of the manifest and table
+        """
+        return self._view[:self.content_start]
+
+    def get_content_length(self):
+        return len(self._mmap) - self.content_start
+
+    def get_resource(self, resource_id, verify=False):
+        """
+        Return a memoryview of the content of the given resource. The view stays valid after the
+        pack is closed, and keeps the file mapped until it is released.
+        """
+
+        if verify:
+            self.verify(resource_id)
+        entry = self.get_entry(resource_id)
+        return self.get_content(entry.offset, entry.length)
+
+    def verify(self, resource_id):
+        entry = self.get_entry(resource_id)
+        self._check_crc(entry, stm32_crc.crc32(self.get_content(entry.offset, entry.length)))
+
+    def verify_all(self, processes=None):
+        """
+        Check the CRC of every resource, raising an Exception on the first mismatch. Content
+        shared by several entries is only checked once. If processes is more than 1 and the pack
+        was opened from a path, the CRCs are calculated by a pool of that many processes.
+        """
+
+        unique = {}
+        for entry in self.table_entries:
+            unique.setdefault((entry.offset, entry.length), []).append(entry)
+        keys = list(unique)
+
+        if processes and processes > 1 and self.path is not None:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes, initializer=_verify_worker_init,
+                                        initargs=(self.path, self.is_system))
+            try:
+                crcs = pool.map(_verify_worker_crc, keys)
+            finally:
+                pool.terminate()
+        else:
+            crcs = [stm32_crc.crc32(self.get_content(*key)) for key in keys]
+
+        for key, calculated_crc in zip(keys, crcs):
+            for entry in unique[key]:
+                self._check_crc(entry, calculated_crc)
+
+    def _check_crc(self, entry, calculated_crc):
+        if calculated_crc != entry.crc:
+            raise Exception("Entry %s does not match CRC of content (%u). "
+                            "Hint: try with%s the --app flag"
+                            % (entry, calculated_crc, "" if self.is_system else "out"))
+
+    def get_content_crc(self):
+        """
+        Calculate the CRC over the unique content in offset order, like
+        ResourcePack.get_content_crc
+        """
+
+        crc = stm32_crc.Stm32Crc()
+        for offset, length in sorted(set((e.offset, e.length) for e in self.table_entries)):
+            crc.update(self.get_content(offset, length))
+        return crc.crc
+
+    def to_resource_pack(self):
+        """
+        Return a ResourcePack with a copy of the contents of this pack, without checking CRCs.
+        """
+
+        resource_pack = ResourcePack(self.is_system)
+        resource_pack.num_files = self.num_files
+        resource_pack.crc = self.crc
+        resource_pack.timestamp = self.timestamp
+
+        content_indexes = {}
+        for entry in self.table_entries:
+            key = (entry.offset, entry.length)
+            if key not in content_indexes:
+                content_indexes[key] = len(resource_pack.contents)
+                resource_pack.contents.append(self.get_content(*key).tobytes())
+            resource_pack.table_entries.append(ResourcePackTableEntry(
+                content_indexes[key], entry.offset, entry.length, entry.crc))
+
+        resource_pack.finalized = True
+
+        return resource_pack
+
+    def dump(self):
+        """
+        Dump a bunch of information about this pbpack to stdout
+        """
+
+        print('Manifest CRC: 0x%x' % self.crc)
+        print('Calculated CRC: 0x%x' % self.get_content_crc())
+        print('Num Items: %u' % len(self.table_entries))
+        for i, entry in enumerate(self.table_entries, start=1):
+            print('  %u: Offset %u Length %u CRC 0x%x' % (i, entry.offset, entry.length, entry.crc))
+
+
+class ResourcePackPatch(object):
+    """ Edits to an existing pack which can be written without rebuilding the whole pack.
+
+        Resources are replaced, appended or removed on top of a MappedResourcePack. The content
+        before the first change keeps its place, and only the resources that are new or have
+        moved are written out. changed_ranges() lists the byte ranges of the pack file that
+        differ from the original, so that only those need to be written or flashed.
+
+        Removing a resource renumbers the resources that follow it.
+
+    """
+
+    def __init__(self, mapped_pack):
+        self.pack = mapped_pack
+
+        # Content is tracked as a list of keys, in the order it appears in the pack. Content
+        # already in the pack is keyed by its (offset, length), new content by an int.
+        self.entries = []
+        self.order = []
+        for entry in mapped_pack.table_entries:
+            key = (entry.offset, entry.length)
+            if key not in self.order:
+                self.order.append(key)
+            self.entries.append([key, entry.length, entry.crc])
+        self.order.sort(key=lambda k: k[0])
+
+        self.new_contents = []
+
+        self._offsets = None
+
+    def _add_content(self, content):
+        self.new_contents.append(bytes(content))
+        self._offsets = None
+        return len(self.new_contents) - 1
+
+    def _drop_if_unused(self, key):
+        if all(entry[0] != key for entry in self.entries):
+            self.order.remove(key)
+
+    def _check_resource_id(self, resource_id):
+        if not 1 <= resource_id <= len(self.entries):
+            raise IndexError("No resource with id %u" % resource_id)
+
+    def _keep_last_content_last(self):
+        # The firmware finds the size of the pack from the final resource in the table, so its
+        # content has to be at the end. See ResourcePack.finalize.
+        if self.entries and self.order[-1] != self.entries[-1][0]:
+            self.order.remove(self.entries[-1][0])
+            self.order.append(self.entries[-1][0])
+
+    def replace(self, resource_id, content):
+        """
+        Replace the content of a resource. The new content takes the place of the old content
+        in the pack. If the old content is shared with other resources, it stays where it is and
+        the new content goes at the end, so that none of the content after it moves.
+        """
+
+        self._check_resource_id(resource_id)
+        old_key = self.entries[resource_id - 1][0]
+        shared = sum(entry[0] == old_key for entry in self.entries) > 1
+        key = self._add_content(content)
+        if shared:
+            self.order.append(key)
+        else:
+            self.order.insert(self.order.index(old_key) + 1, key)
+        self.entries[resource_id - 1] = [key, len(content), stm32_crc.crc32(content)]
+        self._drop_if_unused(old_key)
+        self._keep_last_content_last()
+
+    def append(self, content):
+        """
+        Add a resource to the end of the pack, returning its resource id.
+        """
+
+        if len(self.entries) >= self.pack.table_size:
+            raise Exception("Exceeded max number of resources. Must have %d or "
+                            "fewer" % self.pack.table_size)
+        key = self._add_content(content)
+        self.order.append(key)
+        self.entries.append([key, len(content), stm32_crc.crc32(content)])
+        self._keep_last_content_last()
+        return len(self.entries)
+
+    def remove(self, resource_id):
+        self._check_resource_id(resource_id)
+        key = self.entries.pop(resource_id - 1)[0]
+        self._offsets = None
+        self._drop_if_unused(key)
+        self._keep_last_content_last()
+
+    def _get_content(self, key):
+        if isinstance(key, int):
+            return self.new_contents[key]
+        return self.pack.get_content(*key)
+
+    def _layout(self):
+        """
+        Assign offsets to the content, returning a dict of key to offset.
+        """
+
+        if self._offsets is not None:
+            return self._offsets
+
+        self._offsets = {}
+        offset = 0
+        for key in self.order:
+            self._offsets[key] = offset
+            offset += key[1] if isinstance(key, tuple) else len(self.new_contents[key])
+        self._content_length = offset
+        return self._offsets
+
+    def _first_changed_offset(self):
+        """
+        Return the offset from which the content differs from the original pack.
+        """
+
+        offsets = self._layout()
+        for key in self.order:
+            if not isinstance(key, tuple) or offsets[key] != key[0]:
+                return offsets[key]
+        if self._content_length != self.pack.get_content_length():
+            return min(self._content_length, self.pack.get_content_length())
+        return None
+
+    def get_content_crc(self):
+        """
+        Calculate the CRC of the patched content. The CRC of the unchanged start of the content
+        is calculated directly from the mapped pack.
+        """
+
+        first_changed = self._first_changed_offset()
+        if first_changed is None:
+            return self.pack.crc
+
+        offsets = self._layout()
+        crc = stm32_crc.Stm32Crc(self.pack.get_content(0, first_changed))
+        for key in self.order:
+            offset = offsets[key]
+            content = self._get_content(key)
+            if offset + len(content) <= first_changed:
+                continue
+            crc.update(content[max(first_changed - offset, 0):])
+        return crc.crc
+
+    def serialize_manifest(self, crc=None):
+        if crc is None:
+            crc = self.get_content_crc()
+        return struct.pack(ResourcePack.MANIFEST_FMT, len(self.entries), crc, self.pack.timestamp)
+
+    def serialize_table(self):
+        offsets = self._layout()
+        table_data = bytearray(self.pack.table_size * ResourcePack.TABLE_ENTRY_SIZE_BYTES)
+        for file_id, (key, length, crc) in enumerate(self.entries, start=1):
+            struct.pack_into(ResourcePackTableEntry.TABLE_ENTRY_FMT, table_data,
+                             (file_id - 1) * ResourcePack.TABLE_ENTRY_SIZE_BYTES,
+                             file_id, offsets[key], length, crc)
+        return bytes(table_data)
+
+    def get_size(self):
+        self._layout()
+        return self.pack.content_start + self._content_length
+
+    def changed_ranges(self):
+        """
+        Return a list of (start, data) tuples for each range of the pack file that differs from
+        the original. Ranges that are next to each other are merged. If get_size() is less than
+        the size of the original file, it also has to be truncated.
+        """
+
+        ranges = []
+
+        def add(start, data):
+            if ranges and ranges[-1][0] + len(ranges[-1][1]) == start:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + data)
+            else:
+                ranges.append((start, bytes(data)))
+
+        original = self.pack.get_header()
+        manifest = self.serialize_manifest()
+        if manifest != original[:ResourcePack.MANIFEST_SIZE_BYTES]:
+            add(0, manifest)
+
+        table = self.serialize_table()
+        for i in range(0, len(table), ResourcePack.TABLE_ENTRY_SIZE_BYTES):
+            start = ResourcePack.MANIFEST_SIZE_BYTES + i
+            data = table[i:i + ResourcePack.TABLE_ENTRY_SIZE_BYTES]
+            if data != original[start:start + ResourcePack.TABLE_ENTRY_SIZE_BYTES]:
+                add(start, data)
+
+        first_changed = self._first_changed_offset()
+        if first_changed is not None:
+            offsets = self._layout()
+            for key in self.order:
+                offset = offsets[key]
+                if isinstance(key, tuple) and offset == key[0]:
+                    continue
+                content = self._get_content(key)
+                if content and content != self.pack.get_content(offset, len(content)):
+                    add(self.pack.content_start + offset, content)
+
+        return ranges
+
+    def write(self, f_out):
+        """
+        Write the whole patched pack to a file.
+        """
+
+        crc = self.get_content_crc()
+        f_out.write(self.serialize_manifest(crc))
+        f_out.write(self.serialize_table())
+        for key in self.order:
+            f_out.write(self._get_content(key))
+        return crc
+
+    def apply(self, f_out, ranges=None):
+        """
+        Patch the original pack file in place, given a copy of it opened for reading and writing.
+        Only the changed ranges are written. The ranges may be collected with changed_ranges()
+        beforehand so that the mapped pack can be closed first.
+        """
+
+        if ranges is None:
+            ranges = self.changed_ranges()
+        size = self.get_size()
+        for start, data in ranges:
+            f_out.seek(start)
+            f_out.write(data)
+        f_out.truncate(size)
+        return ranges
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='dump pbpack metadata')
 
@@ -273,8 +725,6 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
-    with open(args.pbpack_path, 'rb') as f:
-        pack = ResourcePack.deserialize(f, is_system=not args.app)
-
-    pack.dump()
+    with MappedResourcePack.open(args.pbpack_path, is_system=not args.app) as pack:
+        pack.dump()
 
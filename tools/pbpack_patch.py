@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+
+import argparse
+import shutil
+
+from pbpack import MappedResourcePack, ResourcePackPatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=
+        'Replace, append or remove individual resources in an existing pbpack, and report the '
+        'byte ranges of the pack that changed.')
+
+    parser.add_argument('pbpack', help='pbpack to patch')
+    parser.add_argument('--app', default=False, action='store_true',
+                        help='Indicate this pbpack is an app pbpack')
+    parser.add_argument('--replace', nargs=2, action='append', default=[],
+                        metavar=('RESOURCE_ID', 'FILE'),
+                        help='replace the content of a resource with the content of a file')
+    parser.add_argument('--append', action='append', default=[], metavar='FILE',
+                        help='add the content of a file as a new resource at the end of the pack')
+    parser.add_argument('--remove', type=int, action='append', default=[],
+                        metavar='RESOURCE_ID',
+                        help='remove a resource, renumbering the resources that follow it')
+    parser.add_argument('--output',
+                        help='write the patched pack to this file instead of patching in place')
+
+    args = parser.parse_args()
+
+    with MappedResourcePack.open(args.pbpack, is_system=not args.app) as pack:
+        patch = ResourcePackPatch(pack)
+        for resource_id, filename in args.replace:
+            with open(filename, 'rb') as f:
+                patch.replace(int(resource_id), f.read())
+        # Remove from the end first so that the ids given refer to the original pack
+        for resource_id in sorted(args.remove, reverse=True):
+            patch.remove(resource_id)
+        for filename in args.append:
+            with open(filename, 'rb') as f:
+                patch.append(f.read())
+
+        ranges = patch.changed_ranges()
+        size = patch.get_size()
+        original_size = pack.content_start + pack.get_content_length()
+
+    output = args.output or args.pbpack
+    if output != args.pbpack:
+        shutil.copyfile(args.pbpack, output)
+    with open(output, 'r+b') as f:
+        patch.apply(f, ranges)
+
+    for start, data in ranges:
+        print('Changed 0x%x-0x%x (%u bytes)' % (start, start + len(data), len(data)))
+    if size != original_size:
+        print('Size changed from %u to %u bytes' % (original_size, size))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,18 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+import array
 import png
 import itertools
 from io import BytesIO
 
+try:
+    import numpy
+except ImportError:
+    # Without numpy, _reduce_colors maps each pixel to the palette through a dict of the colors
+    # already reduced
+    numpy = None
+
 import pebble_image_routines
 
 # color reduction methods
@@ -50,25 +58,10 @@ def convert_png_to_pebble_png_bytes(input_filename, palette_name,
 # Implementation
 def _convert_png_to_pebble_png_writer(input_filename, palette_name, color_reduction_method,
                                       force_bitdepth=None):
-    input_png = png.Reader(filename=input_filename)
-
-    # sbit breaks pypngs convert_rgb_to_rgba routine
-    # and is unnecessary, as it is only an optional optimization
-    # so disable it by loading the PNG pre-data and disabling sbit
-    input_png.preamble()
-    input_png.sbit = None
-
-    # open as RGBA 32-bit (allows for simpler parsing cases)
-    width, height, pixels, metadata = input_png.asRGBA8()
-
-    # convert RGBA 32-bit boxed rows to list for output
-    rgba32_list = grouper(itertools.chain.from_iterable(pixels), 4)
-
-    color_reduction_func = pebble_image_routines.get_reduction_func(palette_name,
-                                                                    color_reduction_method)
-    is_grey, has_alpha, bitdepth, palette = get_palette_for_png(input_filename,
-                                                                palette_name,
-                                                                color_reduction_method)
+    width, height, pixels = _read_rgba8(input_filename)
+    rgba_palette, palette_indexes = _reduce_colors(width, height, pixels, palette_name,
+                                                   color_reduction_method)
+    is_grey, has_alpha, bitdepth, palette = _get_palette_info(rgba_palette)
 
     if force_bitdepth is not None:
         if bitdepth > force_bitdepth:
@@ -96,38 +89,34 @@ def _convert_png_to_pebble_png_writer(input_filename, palette_name, color_reduct
                     transparent_grey = lum >> (8 - bitdepth)
                     break
 
-    # second pass of pixel data, converts rgba32 pixels to greyscale or palettized output
-    image = []
-    for (r, g, b, a) in rgba32_list:
-        # operating on original pixel values, need to do the same color reduction
-        # as when the palette was generated
-        (r, g, b, a) = color_reduction_func(r, g, b, a)
-
-        if is_grey:
-            # convert red channel (as luminosity value) to a greyscale at bitdepth
-            # if transparent, output the transparent_grey value for that bitdepth
-            if a == 0:
-                image.append(transparent_grey)
-            else:
-                image.append(r >> (8 - bitdepth))
-        elif has_alpha:
-            # append the palette index for output
-            image.append(palette.index((r, g, b, a)))
+    if is_grey:
+        # convert red channel (as luminosity value) to a greyscale at bitdepth
+        # if transparent, output the transparent_grey value for that bitdepth
+        grey_values = [transparent_grey if a == 0 else r >> (8 - bitdepth)
+                       for (r, g, b, a) in rgba_palette]
+        if numpy is not None:
+            palette_indexes = numpy.array(grey_values, dtype=numpy.uint8)[palette_indexes]
         else:
-            # append the palette index for output
-            image.append(palette.index((r, g, b)))
+            palette_indexes = [grey_values[i] for i in palette_indexes]
 
-    if is_grey:
         # remove the palette for greyscale output with writer
         palette = None
 
+    if numpy is not None:
+        image = array.array('B', palette_indexes.astype(numpy.uint8).tobytes())
+    else:
+        image = array.array('B', palette_indexes)
+
     output_png = png.Writer(width=width, height=height, compression=9, bitdepth=bitdepth,
                             palette=palette, greyscale=is_grey, transparent=transparent_grey)
 
     return (output_png, image)
 
 
-def get_palette_for_png(input_filename, palette_name, color_reduction_method):
+def _read_rgba8(input_filename):
+    """
+    Decode a png, returning its width, height and rows of RGBA 32-bit pixels
+    """
     input_png = png.Reader(filename=input_filename)
 
     # sbit breaks pypngs convert_rgb_to_rgba routine
@@ -138,33 +127,69 @@ def get_palette_for_png(input_filename, palette_name, color_reduction_method):
 
     # open as RGBA 32-bit (allows for simpler parsing cases)
     width, height, pixels, metadata = input_png.asRGBA8()
+    return width, height, pixels
 
-    palette = []  # rgba32 image palette
-    is_grey = True  # does the image only contain greyscale pixels (and only full or opaque)
-    has_alpha = False  # does the image contain alpha
 
-    # iterators are one shot, so make a copy of just the iterator and not the data
-    # to be able to parse the data twice (we do not modify the pixel data itself)
-    # once to generate the palette
-    # once to output the final pixel data as greyscale or palette indexes
-    pixels, pixels2 = itertools.tee(pixels)
+def _reduce_colors(width, height, pixels, palette_name, color_reduction_method):
+    """
+    Convert RGBA 32-bit image colors to pebble color table
+
+    Returns the palette of reduced (r, g, b, a) colors in the order they first appear in the
+    image, and the palette index of each pixel. The color reduction function is only called once
+    for each distinct color in the image.
+    """
 
     # Figure out what color reduction algorithm we should be using.
     color_reduction_func = pebble_image_routines.get_reduction_func(palette_name,
                                                                     color_reduction_method)
 
-    # convert RGBA 32-bit image colors to pebble color table
-    for (r, g, b, a) in grouper(itertools.chain.from_iterable(pixels2), 4):
-        (r, g, b, a) = color_reduction_func(r, g, b, a)
+    if numpy is None:
+        palette = {}  # reduced color -> palette index
+        reduced_indexes = {}  # original color -> palette index
+        palette_indexes = []
+        for rgba in grouper(itertools.chain.from_iterable(pixels), 4):
+            index = reduced_indexes.get(rgba)
+            if index is None:
+                reduced = color_reduction_func(*rgba)
+                index = palette.setdefault(reduced, len(palette))
+                reduced_indexes[rgba] = index
+            palette_indexes.append(index)
+        return list(palette), palette_indexes
+
+    rgba32 = numpy.zeros((height, width * 4), dtype=numpy.uint8)
+    for y, row in enumerate(pixels):
+        rgba32[y] = numpy.asarray(row, dtype=numpy.uint8)
+    # Each pixel as a single big-endian 0xRRGGBBAA value
+    rgba32 = rgba32.reshape(-1, 4).view('>u4').reshape(-1)
+
+    colors, first_indexes, inverse = numpy.unique(rgba32, return_index=True,
+                                                  return_inverse=True)
+
+    # Reduce each distinct color, keeping track of where each reduced color first appears
+    first_seen = {}
+    reduced_colors = []
+    for color, first_index in zip(colors.tolist(), first_indexes.tolist()):
+        reduced = color_reduction_func(color >> 24, (color >> 16) & 0xFF,
+                                       (color >> 8) & 0xFF, color & 0xFF)
+        reduced_colors.append(reduced)
+        first_seen[reduced] = min(first_seen.get(reduced, first_index), first_index)
+
+    palette = sorted(first_seen, key=first_seen.get)
+    palette_index = {color: index for index, color in enumerate(palette)}
+    lut = numpy.array([palette_index[reduced] for reduced in reduced_colors], dtype=numpy.intp)
+    return palette, lut[inverse.reshape(-1)]
+
+
+def _get_palette_info(palette):
+    """
+    Work out the output format for a palette of reduced (r, g, b, a) colors
+    """
 
-        if (r, g, b, a) not in palette:
-            palette.append((r, g, b, a))
-            # Check if image contains any transparent pixels
-            if (a != 0xFF):
-                has_alpha = True
-            # greyscale only if rgb is gray and opaque or fully transparent
-            if is_grey and not (((r == g == b) and a == 255) or (r, g, b, a) == (0, 0, 0, 0)):
-                is_grey = False
+    # Check if image contains any transparent pixels
+    has_alpha = any(a != 0xFF for (r, g, b, a) in palette)
+    # greyscale only if rgb is gray and opaque or fully transparent
+    is_grey = all(((r == g == b) and a == 255) or (r, g, b, a) == (0, 0, 0, 0)
+                  for (r, g, b, a) in palette)
 
     # Calculate required bit depth
 
@@ -199,6 +224,12 @@ def get_palette_for_png(input_filename, palette_name, color_reduction_method):
     return is_grey, has_alpha, bitdepth, palette
 
 
+def get_palette_for_png(input_filename, palette_name, color_reduction_method):
+    width, height, pixels = _read_rgba8(input_filename)
+    palette, _ = _reduce_colors(width, height, pixels, palette_name, color_reduction_method)
+    return _get_palette_info(palette)
+
+
 def grouper(iterable, n, fillvalue=None):
     from itertools import zip_longest
 
@@ -0,0 +1,20 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import contextlib
+import multiprocessing
+
+
+@contextlib.contextmanager
+def spawn_pool(processes, initializer=None, initargs=()):
+    """
+    Return a context manager for a multiprocessing pool which is terminated when it exits.
+
+    The workers are spawned rather than forked since resources are generated from the threads of
+    the build, and forking a process with running threads isn't safe.
+    """
+    pool = multiprocessing.get_context('spawn').Pool(processes, initializer, initargs)
+    try:
+        yield pool
+    finally:
+        pool.terminate()
@@ -2,7 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
-import subprocess
+import os
 import sys
 import argparse
 import pexpect
@@ -10,6 +10,9 @@ import time
 import pprint
 import operator
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from symbolizer import get_symbolizer
+
 
 
 ##########################################################################################
@@ -40,7 +43,7 @@ class Profiler(object):
                 import telnetlib
                 tn = telnetlib.Telnet('localhost', self.openocd_port)
             except Exception:
-                print "Could not connect to OpenOCD via telnet"
+                print("Could not connect to OpenOCD via telnet")
                 sys.exit()
 
             # Discard banner
@@ -49,7 +52,7 @@ class Profiler(object):
 
             # Capture the samples
             num_samples = total_secs * 1000 / sample_period_ms
-            print "Capturing %d samples..." % (num_samples)
+            print("Capturing %d samples..." % (num_samples))
             n = 0
             pcs = dict()
 
@@ -59,7 +62,7 @@ class Profiler(object):
             last_sample_time = time.time()
             while(n < num_samples):
                 if (n % 1000) == 0:
-                    print "%d..." % (n),
+                    print("%d..." % (n), end=' ')
                     sys.stdout.flush()
 
                 # Space the samples apart by the requested amount
@@ -80,11 +83,11 @@ class Profiler(object):
 
 
         # Save results to a file
-        print "\n%d samples collected in %f seconds (%f ms/sample)" % (num_samples, elapsed_time,
-                  elapsed_time * 1000.0 / num_samples)
-        print "Saving samples to %s..." % (filename)
+        print("\n%d samples collected in %f seconds (%f ms/sample)" % (num_samples, elapsed_time,
+              elapsed_time * 1000.0 / num_samples))
+        print("Saving samples to %s..." % (filename))
         with open(filename, 'w') as out:
-            for k,v in pcs.iteritems():
+            for k,v in pcs.items():
                 out.write("%s %d\n" % (k, v))
 
 
@@ -92,9 +95,6 @@ class Profiler(object):
     #####################################################################################
     def view(self, filename, elf):
 
-        ADDR2LINE = "arm-none-eabi-addr2line"
-        output = dict()
-
         # Read in the raw samples
         pcs = dict()
         total_samples = 0
@@ -105,9 +105,8 @@ class Profiler(object):
                 total_samples += int(count)
 
         # Lookup the method name, filename and line number for each PC
-        cmdline = [ADDR2LINE, "-e", elf, "-a", "-f"]
-        cmdline += pcs.keys()
-        output = subprocess.check_output(cmdline)
+        addrs = list(pcs.keys())
+        locations = get_symbolizer(elf).symbolize_all(int(addr, 16) for addr in addrs)
 
         # Collect results by method name and by file:line
         method_count = dict()
@@ -119,14 +118,12 @@ class Profiler(object):
         # Map PC to file:line
         file_line_lookup = dict()
 
-        items = output.splitlines()
-        result_count = len(items) / 3
-        for i in range(result_count):
-            addr, method, file_line = items[i*3:(i+1)*3]
-            if file_line == '?':
+        for addr, location in zip(addrs, locations):
+            method = location.function or '??'
+            if location.filename is None:
                 file_line = addr
             else:
-                file_line = file_line.split('/')[-1]
+                file_line = '%s:%s' % (location.filename.split('/')[-1], location.line)
 
             count = pcs[addr]
             method_count[method] = method_count.get(method, 0) + count
@@ -138,25 +135,25 @@ class Profiler(object):
 
         # Print results in sorted order
         format_str = "%-64s %7.2f%%   %5d"
-        print "\n\nSamples grouped by method: "
-        print "---------------------------------------------------------------"
+        print("\n\nSamples grouped by method: ")
+        print("---------------------------------------------------------------")
         sorted_values = sorted(method_count.items(), key=operator.itemgetter(1), reverse=True)
         for k, v in sorted_values:
-            print format_str % (k, v * 100.0 / total_samples, v)
+            print(format_str % (k, v * 100.0 / total_samples, v))
 
-        print "\n\nSamples grouped by file:line: "
-        print "---------------------------------------------------------------"
+        print("\n\nSamples grouped by file:line: ")
+        print("---------------------------------------------------------------")
         sorted_values = sorted(file_line_count.items(), key=operator.itemgetter(1), reverse=True)
         for k, v in sorted_values:
             k = "{0}   ({1:.24})".format(k, method_lookup[k])
-            print format_str % (k, v * 100.0 / total_samples, v)
+            print(format_str % (k, v * 100.0 / total_samples, v))
 
-        print "\n\nSamples grouped by address "
-        print "---------------------------------------------------------------"
+        print("\n\nSamples grouped by address ")
+        print("---------------------------------------------------------------")
         sorted_values = sorted(pcs.items(), key=operator.itemgetter(1), reverse=True)
         for k, v in sorted_values:
             k = "{0}   ({1:.48})".format(k, file_line_lookup[k])
-            print format_str % (k, v * 100.0 / total_samples, v)
+            print(format_str % (k, v * 100.0 / total_samples, v))
 
 
 
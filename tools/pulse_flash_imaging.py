@@ -31,6 +31,9 @@ def main():
                         help='print progress output')
     parser.add_argument('-t', '--tty', metavar='TTY', default=None,
                         help='the target serial port')
+    parser.add_argument('-d', '--delta', action='store_true',
+                        help='only rewrite the flash sectors which differ '
+                             'from the file')
 
     subparsers = parser.add_subparsers(help='commands', dest='which')
 
@@ -62,7 +65,8 @@ def main():
 
     success = False
     try:
-        success = args.func(connection, args.file, args.progress, args.verbose)
+        success = args.func(connection, args.file, args.progress, args.verbose,
+                            delta=args.delta)
     except pulse2.exceptions.PulseException as e:
         detail = ''.join(traceback.format_exception_only(type(e), e))
         if args.verbose:
@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import importlib.metadata
+import json
+import os
+import struct
+import sys
+import threading
+
+from file_cache import FileCache
+from resources.resource_map import resource_generator
+
+
+# Bump this when the layout of the resource cache or the way its keys are computed changes.
+RESOURCE_CACHE_VERSION = 3
+
+# Fields of a ResourceDefinition which don't affect the generated data. The path of the resource
+# is replaced with its basename so the same file in different variants (normal, PRF, per-platform
+# resource directories) shares a cache entry; the contents of the sources are hashed instead.
+_RESOURCE_CACHE_IGNORED_FIELDS = ('file', 'sources', 'storage', 'aliases', 'target_platforms')
+
+# Third-party distributions the resource generators run, whose output may change between versions
+_RESOURCE_CACHE_DISTRIBUTIONS = ('freetype-py', 'libpebble2', 'numpy', 'Pillow', 'pypng',
+                                 'svg.path')
+
+_TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_resource_cache = None
+_tools_digest = None
+_library_versions = None
+_lock = threading.Lock()
+
+
+class ResourceCache(FileCache):
+    """
+    A content-addressed store of generated resource data, shared between variants and builds.
+    """
+
+    def get_resource(self, key, definition):
+        """
+        Return the cached data of a resource, or None if it isn't cached. The fields of the
+        definition which the generator filled in when the data was generated are restored.
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        try:
+            updates, data = _unpack_cache_entry(entry)
+        except (ValueError, struct.error):
+            # A corrupt entry is the same as a missing one
+            return None
+        vars(definition).update(updates)
+        return data
+
+    def put_resource(self, key, original_fields, reso):
+        """
+        Cache the data of a generated ResourceObject along with the fields of its definition
+        which differ from original_fields, a copy of vars() of the definition from before the
+        data was generated.
+        """
+        if not isinstance(reso.data, bytes):
+            return
+        updates = {k: v for k, v in vars(reso.definition).items()
+                   if k not in original_fields or original_fields[k] != v}
+        try:
+            entry = _pack_cache_entry(updates, reso.data)
+        except TypeError:
+            # The updated fields can't be stored
+            return
+        self.put(key, entry)
+
+
+def get_resource_cache():
+    """
+    Return the ResourceCache in resource_generator.get_cache_dir(), or None if caching is disabled.
+    """
+    global _resource_cache
+    with _lock:
+        if _resource_cache is None:
+            path = resource_generator.get_cache_dir()
+            _resource_cache = ResourceCache(path) if path else False
+        return _resource_cache or None
+
+
+def _get_tools_digest():
+    """
+    Hash the sources of all the loaded modules from the tools directory, which includes the
+    resource generators and the converters they use, so editing any of them invalidates the cache.
+    """
+    global _tools_digest
+    with _lock:
+        if _tools_digest is None:
+            paths = set()
+            for module in list(sys.modules.values()):
+                path = getattr(module, '__file__', None)
+                if path and path.endswith('.py'):
+                    path = os.path.abspath(path)
+                    if path.startswith(_TOOLS_DIR + os.sep):
+                        paths.add(path)
+
+            h = hashlib.sha256()
+            for path in sorted(paths):
+                h.update(os.path.relpath(path, _TOOLS_DIR).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+            _tools_digest = h.hexdigest()
+        return _tools_digest
+
+
+def _get_library_versions():
+    """
+    Return the versions of the third-party libraries the resource generators use, so upgrading
+    any of them invalidates the cache. FreeType itself may be a system library, so its version is
+    included as well as the version of the freetype-py bindings.
+    """
+    global _library_versions
+    with _lock:
+        if _library_versions is None:
+            versions = []
+            for name in _RESOURCE_CACHE_DISTRIBUTIONS:
+                try:
+                    versions.append((name, importlib.metadata.version(name)))
+                except importlib.metadata.PackageNotFoundError:
+                    versions.append((name, None))
+            try:
+                import freetype
+                versions.append(('freetype', freetype.version()))
+            except Exception:
+                versions.append(('freetype', None))
+            _library_versions = versions
+        return _library_versions
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def resource_cache_key(task, generator):
+    definition = task.definition
+    fields = sorted((k, v) for k, v in vars(definition).items()
+                    if k not in _RESOURCE_CACHE_IGNORED_FIELDS)
+    env = [(name, task.generator.env[name]) for name in generator.cache_env_vars]
+    sources = [(node.name, _hash_file(node.abspath())) for node in task.inputs]
+
+    key = (RESOURCE_CACHE_VERSION, _get_tools_digest(), _get_library_versions(),
+           sys.version_info[:2], generator.type, generator.version,
+           os.path.basename(definition.file), fields, env, sources)
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+
+def _pack_cache_entry(updates, data):
+    header = json.dumps(updates, sort_keys=True).encode('utf-8')
+    return struct.pack('<I', len(header)) + header + data
+
+
+def _unpack_cache_entry(entry):
+    header_length, = struct.unpack_from('<I', entry)
+    if 4 + header_length > len(entry):
+        raise ValueError("Truncated resource cache entry")
+    header = entry[4:4 + header_length]
+    return json.loads(header.decode('utf-8')), entry[4 + header_length:]
@@ -25,6 +25,18 @@ ResourceGeneratorBase = ResourceGeneratorMetaclass('ResourceGenerator', (object,
 
 
 class ResourceGenerator(ResourceGeneratorBase):
+    # Bump this when a change to the generator changes the data it produces for the same inputs.
+    # The data of cacheable generators is keyed on it in the resource cache.
+    version = 1
+
+    # Whether the data only depends on the contents of the task's inputs, the fields of the
+    # definition and the environment variables in cache_env_vars. Generators which have side
+    # effects or read other files must set this to False.
+    cacheable = True
+
+    # Names of the environment variables the generated data depends on.
+    cache_env_vars = ()
+
     @staticmethod
     def definitions_from_dict(bld, definition_dict, resource_source_path):
         """
@@ -70,10 +82,35 @@ class ResourceGenerator(ResourceGeneratorBase):
         """
         raise NotImplemented('%r missing a generate_object implementation' % cls)
 
+    @classmethod
+    def generate_data_job(cls, task, definition):
+        """
+        Return a (function, args) tuple where function(*args) returns the data generate_object
+        would build for this definition, or None if the data can't be built outside of the task.
+        The function and its arguments must be picklable so the job can be run in a worker
+        process; this is worth doing for generators which are CPU bound.
+        """
+        return None
+
 def definitions_from_dict(bld, definition_dict, resource_source_path):
     cls = _ResourceGenerators[definition_dict['type']]
     return cls.definitions_from_dict(bld, definition_dict, resource_source_path)
 
+def get_cache_dir():
+    """
+    Return the directory generated resources are cached in, which is $PEBBLE_RESOURCE_CACHE_DIR or
+    by default a pebble-resources directory in the user's cache directory. Returns None if the
+    variable is set to an empty string, which disables caching.
+
+    Nothing is ever evicted from the cache. It's always safe to delete the directory to clear it.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.environ.get('PEBBLE_RESOURCE_CACHE_DIR',
+                          os.path.join(cache_home, 'pebble-resources')) or None
+
+def get_generator(resource_type):
+    return _ResourceGenerators[resource_type]
+
 def generate_object(task, definition):
     cls = _ResourceGenerators[definition.type]
     return cls.generate_object(task, definition)
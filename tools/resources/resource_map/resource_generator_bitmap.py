@@ -14,6 +14,7 @@ PNG_MIN_APP_MEMORY = 0x8000  # 32k, fairly arbitrarily
 
 class BitmapResourceGenerator(ResourceGenerator):
     type = 'bitmap'
+    cache_env_vars = ('PLATFORM_NAME',)
 
     @staticmethod
     def definitions_from_dict(bld, definition_dict, resource_source_path):
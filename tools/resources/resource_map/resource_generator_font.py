@@ -2,9 +2,9 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from resources.types.resource_object import ResourceObject
-from resources.resource_map.resource_generator import ResourceGenerator
+from resources.resource_map.resource_generator import ResourceGenerator, get_cache_dir
 
-from font.fontgen import Font, MAX_GLYPHS_EXTENDED, MAX_GLYPHS
+from font.fontgen import Font, GlyphCache, MAX_GLYPHS_EXTENDED, MAX_GLYPHS
 
 from pebble_sdk_platform import pebble_platforms, maybe_import_internal
 
@@ -46,7 +46,8 @@ class FontResourceGenerator(ResourceGenerator):
         font_path = task.inputs[0].abspath()
         font_ext = os.path.splitext(font_path)[-1]
         if font_ext in (".ttf", ".otf"):
-            font_data = cls.build_font_data(font_path, definition)
+            # Language packs have thousands of glyphs, which are rendered by a pool of processes
+            font_data = cls.build_font_data(font_path, definition, os.cpu_count() or 1)
         elif font_ext == ".pbf":
             font_data = open(font_path, "rb").read()
         else:
@@ -55,7 +56,22 @@ class FontResourceGenerator(ResourceGenerator):
         return ResourceObject(definition, font_data)
 
     @classmethod
-    def build_font_data(cls, ttf_path, definition):
+    def generate_data_job(cls, task, definition):
+        font_path = task.inputs[0].abspath()
+        if os.path.splitext(font_path)[-1] in (".ttf", ".otf"):
+            # The job already runs in one of the build's worker processes, so its glyphs are
+            # rendered in that process rather than by another pool of its own
+            return cls.build_font_data, (font_path, definition)
+
+        # .pbf fonts are copied as is, which isn't worth a trip to another process
+        return None
+
+    @classmethod
+    def build_font_data(cls, ttf_path, definition, processes=1):
+        """
+        Build the data of a font resource, rendering the glyphs of large fonts with a pool of
+        processes if processes is more than 1.
+        """
         # PBL-23964: it turns out that font generation is not thread-safe with freetype
         # 2.4 (and possibly later versions). To avoid running into this, we use a lock.
         with cls.lock:
@@ -77,7 +93,23 @@ class FontResourceGenerator(ResourceGenerator):
             if definition.tracking_adjust is not None:
                 font.set_tracking_adjust(definition.tracking_adjust)
 
+            font.set_processes(processes)
+
+            # Glyphs are cached next to the generated resources, so changing the subset of a font
+            # or adding a new size to a language pack only renders the glyphs that are new.
+            cache_dir = get_cache_dir()
+            if cache_dir is not None:
+                glyph_cache = GlyphCache(os.path.join(cache_dir, 'glyphs'))
+                font.set_glyph_cache(glyph_cache)
+
             font.build_tables()
+
+            # Set PEBBLE_GLYPH_CACHE_STATS to report how well the glyph cache is doing
+            if cache_dir is not None and os.environ.get('PEBBLE_GLYPH_CACHE_STATS'):
+                print("{}: {} of {} glyphs from the glyph cache ({:.0%})".format(
+                    definition.name, glyph_cache.hits, glyph_cache.hits + glyph_cache.misses,
+                    glyph_cache.hit_rate()))
+
             return font.bitstring()
 
 
@@ -11,6 +11,10 @@ from resources.resource_map.resource_generator import ResourceGenerator
 class JsResourceGenerator(ResourceGenerator):
     type = 'js'
 
+    # Compiling the snapshot writes the bytecode and memory usage report next to the .reso and
+    # updates the environment, so it has to run on every build.
+    cacheable = False
+
     @staticmethod
     def generate_object(task, definition):
         node_command = task.generator.env.NODE
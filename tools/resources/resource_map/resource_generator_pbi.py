@@ -23,6 +23,7 @@ class PbiResourceGenerator(ResourceGenerator):
 
 class Pbi8ResourceGenerator(ResourceGenerator):
     type = 'pbi8'
+    cache_env_vars = ('PLATFORM_NAME',)
 
     @staticmethod
     def generate_object(task, definition):
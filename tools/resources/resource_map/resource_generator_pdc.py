@@ -22,6 +22,10 @@ class ResourceGeneratorPdc(ResourceGenerator):
         for d in definitions:
             node = bld.path.find_node(d.file)
 
+            # Sequences which are only ever played by elapsed time can store runs of identical
+            # frames once
+            d.coalesce_frames = definition_dict.get('coalesceFrames', False)
+
             # PDCS (animated vectors) are described as a folder path. Adjust the sources so if any
             # frame in the animation changes we regenerate the pdcs
             if os.path.isdir(node.abspath()):
@@ -32,23 +36,49 @@ class ResourceGeneratorPdc(ResourceGenerator):
 
     @staticmethod
     def generate_object(task, definition):
+        # The frames of long sequences are parsed by a pool of processes
+        data = build_pdc_data(*ResourceGeneratorPdc._get_pdc_args(task, definition),
+                              processes=os.cpu_count() or 1)
+        return ResourceObject(definition, data)
+
+    @staticmethod
+    def generate_data_job(task, definition):
+        # The job already runs in one of the build's worker processes, so its frames are parsed
+        # in that process rather than by another pool of its own
+        return build_pdc_data, ResourceGeneratorPdc._get_pdc_args(task, definition)
+
+    @staticmethod
+    def _get_pdc_args(task, definition):
         node = task.generator.path.make_node(definition.file)
 
         if os.path.isdir(node.abspath()):
-            output, errors = pdc_gen.create_pdc_data_from_path(
-                    node.abspath(),
-                    viewbox_size=(0, 0),
-                    verbose=False,
-                    duration=33,
-                    play_count=1,
-                    precise=False)
+            return node.abspath(), True, definition.coalesce_frames
         else:
-            output, errors = pdc_gen.create_pdc_data_from_path(
-                    task.inputs[0].abspath(),
-                    viewbox_size=(0, 0),
-                    verbose=False,
-                    duration=0,
-                    play_count=0,
-                    precise=True)
-
-        return ResourceObject(definition, output)
+            return task.inputs[0].abspath(), False, False
+
+
+def build_pdc_data(path, is_sequence, coalesce_frames=False, processes=1):
+    """
+    Build the PDC data for an SVG image, or for a directory of SVG frames if is_sequence is set.
+    The frames of long sequences are parsed by a pool of processes if processes is more than 1.
+    """
+    if is_sequence:
+        output, errors = pdc_gen.create_pdc_data_from_path(
+                path,
+                viewbox_size=(0, 0),
+                verbose=False,
+                duration=33,
+                play_count=1,
+                precise=False,
+                processes=processes,
+                coalesce_frames=coalesce_frames)
+    else:
+        output, errors = pdc_gen.create_pdc_data_from_path(
+                path,
+                viewbox_size=(0, 0),
+                verbose=False,
+                duration=0,
+                play_count=0,
+                precise=True)
+
+    return output
@@ -10,6 +10,7 @@ import png2pblpng
 
 class PngResourceGenerator(ResourceGenerator):
     type = 'png'
+    cache_env_vars = ('PLATFORM_NAME',)
 
     @staticmethod
     def generate_object(task, definition):
@@ -7,6 +7,9 @@ from resources.resource_map.resource_generator import ResourceGenerator
 class ResourceGeneratorRaw(ResourceGenerator):
     type = 'raw'
 
+    # Reading the file back from the cache is no cheaper than reading the file itself
+    cacheable = False
+
     @staticmethod
     def generate_object(task, definition):
         with open(task.inputs[0].abspath(), 'rb') as f:
@@ -1,7 +1,7 @@
 # SPDX-FileCopyrightText: 2024 Google LLC
 # SPDX-License-Identifier: Apache-2.0
 
-import pickle
+from resources.types import resource_container
 
 
 class ResourceBall(object):
@@ -10,6 +10,9 @@ class ResourceBall(object):
     as ResourceObject instances where resources that are not (such as language packs) are present
     as ResourceDeclaration instances. This data structure is ordered, with the resource_objects
     conceptually coming first followed by the resource_declarations.
+
+    A loaded ResourceBall is memory-mapped and the data of its resource objects is only read when
+    it's used, so tasks which only need the declarations never touch the resource data.
     """
 
     def __init__(self, resource_objects, resource_declarations):
@@ -22,12 +25,11 @@ class ResourceBall(object):
     def dump(self, output_node):
         output_node.parent.mkdir()
         with open(output_node.abspath(), 'wb') as f:
-            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+            resource_container.dump(f, self.resource_objects, self.resource_declarations)
 
     @classmethod
     def load(cls, path):
-        with open(path, 'rb') as f:
-            return pickle.load(f)
+        return cls(*resource_container.load(path))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,138 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+The on-disk format of .reso files and resource balls.
+
+A container is a fixed header, a JSON index of the resources and declarations it holds and then
+the data of each resource, one after the other:
+
+    magic (8 bytes) | version (uint32) | index length (uint32) | index (JSON, UTF-8) | data...
+
+The index is a dictionary with an "objects" list, which holds the definition of each resource
+along with the offset of its data (relative to the end of the index) and its length, and a
+"declarations" list. Definitions and declarations are stored as their class name and fields, so
+everything but the resource data can be read without looking past the index. Resource balls are
+memory-mapped when loaded and the data of a resource is only read when it is used.
+"""
+
+import json
+import mmap
+import pickle
+import struct
+
+from resources.types.resource_declaration import ResourceDeclaration
+from resources.types.resource_definition import ResourceDefinition
+from resources.types.resource_object import ResourceObject
+
+
+MAGIC = b'PBLRESC\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+
+_DECLARATION_CLASSES = {cls.__name__: cls for cls in (ResourceDeclaration, ResourceDefinition)}
+
+
+class MappedResourceObject(ResourceObject):
+    """
+    A ResourceObject whose data is read from a memory-mapped container when it's used.
+    """
+
+    def __init__(self, definition, container, offset, length):
+        self.definition = definition
+        self._container = container
+        self._offset = offset
+        self.length = length
+
+    @property
+    def data(self):
+        return self._container[self._offset:self._offset + self.length]
+
+
+def _encode_declaration(declaration):
+    return {'class': type(declaration).__name__, 'fields': vars(declaration)}
+
+
+def _decode_declaration(encoded):
+    cls = _DECLARATION_CLASSES[encoded['class']]
+    declaration = cls.__new__(cls)
+    vars(declaration).update(encoded['fields'])
+    return declaration
+
+
+def _data_length(resource_object):
+    if isinstance(resource_object, MappedResourceObject):
+        return resource_object.length
+    return len(resource_object.data)
+
+
+def dump(f, resource_objects, resource_declarations=()):
+    """
+    Write a container with the given ResourceObjects and ResourceDeclarations to the file f.
+    """
+    objects = []
+    offset = 0
+    for o in resource_objects:
+        length = _data_length(o)
+        objects.append({'definition': _encode_declaration(o.definition),
+                        'offset': offset,
+                        'length': length})
+        offset += length
+
+    index = json.dumps({'objects': objects,
+                        'declarations': [_encode_declaration(d) for d in resource_declarations]},
+                       sort_keys=True).encode('utf-8')
+
+    f.write(_HEADER.pack(MAGIC, VERSION, len(index)))
+    f.write(index)
+    for o in resource_objects:
+        f.write(o.data)
+
+
+def load(path, mapped=True):
+    """
+    Load a container, returning a list of ResourceObjects and a list of declarations.
+
+    If mapped is set the container is memory-mapped and MappedResourceObjects are returned,
+    otherwise the whole file is read. Each mapping holds on to a file descriptor, so small
+    containers which are loaded in bulk, like .reso files, should not be mapped.
+
+    Pickled ResourceObjects and ResourceBalls, which were written before the container format
+    existed and may still be lying around in build directories, are loaded as well.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:len(MAGIC)] != MAGIC:
+            f.seek(0)
+            legacy = pickle.load(f)
+            if hasattr(legacy, 'resource_objects'):
+                return legacy.resource_objects, legacy.resource_declarations
+            return [legacy], []
+
+        magic, version, index_length = _HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError('{}: unsupported resource container version {}'.format(path,
+                                                                                   version))
+
+        if mapped:
+            container = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            container = header + f.read()
+
+    index_end = _HEADER.size + index_length
+    index = json.loads(container[_HEADER.size:index_end].decode('utf-8'))
+
+    resource_objects = []
+    for o in index['objects']:
+        definition = _decode_declaration(o['definition'])
+        offset = index_end + o['offset']
+        if mapped:
+            resource_objects.append(MappedResourceObject(definition, container, offset,
+                                                         o['length']))
+        else:
+            resource_objects.append(ResourceObject(definition,
+                                                   container[offset:offset + o['length']]))
+    resource_declarations = [_decode_declaration(d) for d in index['declarations']]
+
+    return resource_objects, resource_declarations
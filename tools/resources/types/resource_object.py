@@ -1,11 +1,10 @@
 # SPDX-FileCopyrightText: 2024 Google LLC
 # SPDX-License-Identifier: Apache-2.0
 
-import pickle
-
 class ResourceObject(object):
     """
-    Defines a single resource object in a namespace. Must be serializable.
+    Defines a single resource object in a namespace. Serialized as a resource container holding
+    just this object, see resource_container.
     """
 
     def __init__(self, definition, data):
@@ -19,9 +18,13 @@ class ResourceObject(object):
     def dump(self, output_node):
         output_node.parent.mkdir()
         with open(output_node.abspath(), 'wb') as f:
-            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+            resource_container.dump(f, [self])
 
     @classmethod
     def load(cls, path):
-        with open(path, 'rb') as f:
-            return pickle.load(f)
+        resource_objects, _ = resource_container.load(path, mapped=False)
+        return resource_objects[0]
+
+
+# resource_container subclasses ResourceObject, so it can only be imported once the class exists
+from resources.types import resource_container
@@ -1,8 +1,14 @@
 # SPDX-FileCopyrightText: 2024 Google LLC
 # SPDX-License-Identifier: Apache-2.0
 
+import concurrent.futures
+import copy
+import multiprocessing
+import threading
+
 from waflib import Node, Task, TaskGen
 
+from resources.resource_cache import get_resource_cache, resource_cache_key
 from resources.resource_map import resource_generator
 from resources.resource_map.resource_generator_js import JsResourceGenerator
 from resources.types.resource_definition import StorageType
@@ -10,11 +16,55 @@ from resources.types.resource_object import ResourceObject
 from resources.types.resource_ball import ResourceBall
 
 
+_process_pool = None
+_lock = threading.Lock()
+
+
+def _get_process_pool(bld):
+    """
+    Return the pool of worker processes shared by all reso tasks, which run in waf's threads and
+    block on the jobs they submit. Workers are spawned rather than forked since forking a process
+    with running threads isn't safe.
+    """
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=bld.jobs, mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+
 class reso(Task.Task):
     def run(self):
-        reso = resource_generator.generate_object(self, self.definition)
+        generator = resource_generator.get_generator(self.definition.type)
+
+        cache = get_resource_cache() if generator.cacheable else None
+        if cache is not None:
+            key = resource_cache_key(self, generator)
+            data = cache.get_resource(key, self.definition)
+            if data is not None:
+                ResourceObject(self.definition, data).dump(self.outputs[0])
+                return
+
+            # Some generators fill in fields of the definition (e.g. the storage format of a
+            # bitmap), which have to be restored along with the data.
+            fields = copy.deepcopy(vars(self.definition))
+
+        reso = self.generate_object(generator)
+        if cache is not None:
+            cache.put_resource(key, fields, reso)
         reso.dump(self.outputs[0])
 
+    def generate_object(self, generator):
+        bld = self.generator.bld
+        job = generator.generate_data_job(self, self.definition) if bld.jobs > 1 else None
+        if job is None:
+            return generator.generate_object(self, self.definition)
+
+        function, args = job
+        data = _get_process_pool(bld).submit(function, *args).result()
+        return ResourceObject(self.definition, data)
+
 
 class resource_ball(Task.Task):
     def run(self):
@@ -5,16 +5,16 @@ from waflib import Node, Task, TaskGen
 
 from resources.types.resource_ball import ResourceBall
 
-from pbpack import ResourcePack
+from pbpack import MappedResourcePack
 
 
 class generate_version_header(Task.Task):
     def run(self):
         if len(self.inputs):
             # is_system=True because only firmwares use version headers
-            with open(self.inputs[0].abspath(), 'rb') as f:
-                pbpack = ResourcePack.deserialize(f, is_system=True)
-            resource_crc = pbpack.get_content_crc()
+            with MappedResourcePack.open(self.inputs[0].abspath(), is_system=True) as pbpack:
+                pbpack.verify_all()
+                resource_crc = pbpack.get_content_crc()
         else:
             resource_crc = 0
 
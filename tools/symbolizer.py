@@ -0,0 +1,286 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+""" Resolve addresses in an ELF file to function names and source lines without binutils.
+
+The symbol table and DWARF line programs are read once with pyelftools and turned into sorted
+address intervals, so each lookup is a binary search. Reading the DWARF of a firmware ELF takes a
+while, so the index is cached on disk, keyed by the ELF's GNU build ID.
+
+    symbolizer = get_symbolizer('build/src/fw/tintin_fw.elf')
+    for location in symbolizer.symbolize_all([0x08012344, 0x08023456]):
+        print(location.function, location.filename, location.line)
+"""
+
+import argparse
+import array
+import bisect
+import collections
+import hashlib
+import os
+import pickle
+
+from elftools.elf.elffile import ELFFile
+from elftools.elf.sections import NoteSection, SymbolTableSection
+
+from file_cache import FileCache
+
+
+# Bump this whenever the layout of the cached index changes
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pebble_symbolizer')
+
+BUILD_ID_NOTE_TYPE_NAME = 'NT_GNU_BUILD_ID'
+SYMBOL_TYPES = ('STT_FUNC', 'STT_OBJECT')
+
+# The location of an address. Any of function, filename and line is None if it isn't known.
+Location = collections.namedtuple('Location', 'address function filename line')
+
+
+class _Intervals(object):
+    """ Sorted, non-empty [start, end) address ranges, each with a value. Of the ranges which
+    start at the same address, the longest is kept, or the first given if they're the same length.
+    """
+
+    def __init__(self, ranges):
+        self.starts = array.array('Q')
+        self.ends = array.array('Q')
+        self.values = []
+        for start, end, value in sorted((r for r in ranges if r[1] > r[0]),
+                                        key=lambda r: (r[0], -r[1])):
+            if self.starts and self.starts[-1] == start:
+                continue
+            self.starts.append(start)
+            self.ends.append(end)
+            self.values.append(value)
+
+    def find(self, address):
+        index = bisect.bisect_right(self.starts, address) - 1
+        if index >= 0 and address < self.ends[index]:
+            return self.values[index]
+        return None
+
+
+def get_build_id(elf):
+    """ Return the GNU build ID of an ELFFile as a hex string, or None if it doesn't have one. """
+    for section in elf.iter_sections():
+        if not isinstance(section, NoteSection):
+            continue
+        for note in section.iter_notes():
+            if note['n_type'] == BUILD_ID_NOTE_TYPE_NAME:
+                return note['n_desc']
+    return None
+
+
+def _decode(name):
+    if isinstance(name, bytes):
+        return name.decode('utf-8', 'replace')
+    return name
+
+
+def _line_program_file_names(lineprog, comp_dir):
+    """ Return the full paths of the files of a line program, indexed as the rows refer to them.
+    """
+    header = lineprog.header
+    include_dirs = [_decode(d) for d in header['include_directory']]
+    if header['version'] >= 5:
+        # DWARF 5 counts files and directories from 0, and directory 0 is the compilation directory
+        dirs = include_dirs
+        names = []
+    else:
+        dirs = [comp_dir] + include_dirs
+        names = [None]
+
+    for entry in header['file_entry']:
+        name = _decode(entry.name)
+        if entry.dir_index < len(dirs) and dirs[entry.dir_index]:
+            name = os.path.join(dirs[entry.dir_index], name)
+        if comp_dir:
+            name = os.path.join(comp_dir, name)
+        names.append(name)
+    return names
+
+
+def _variable_address(die):
+    """ Return the static address of a DW_TAG_variable DIE, or None if it doesn't have one. """
+    location = die.attributes.get('DW_AT_location')
+    if location is None or location.form not in ('DW_FORM_exprloc', 'DW_FORM_block1'):
+        return None
+    expr = location.value
+    # DW_OP_addr followed by the address
+    if not expr or expr[0] != 0x03:
+        return None
+    return int.from_bytes(bytes(expr[1:]), 'little' if die.dwarfinfo.config.little_endian
+                          else 'big')
+
+
+def _build_index(elf):
+    """ Read the symbols and debug info of an ELFFile into the dictionary which is cached. """
+    # Thumb functions have the low bit of their address set
+    thumb_mask = ~1 if elf['e_machine'] == 'EM_ARM' else ~0
+
+    symbols = []
+    for section in elf.iter_sections():
+        if not isinstance(section, SymbolTableSection):
+            continue
+        for symbol in section.iter_symbols():
+            symbol_type = symbol['st_info']['type']
+            if symbol_type not in SYMBOL_TYPES or symbol['st_shndx'] == 'SHN_UNDEF':
+                continue
+            address = symbol['st_value']
+            if symbol_type == 'STT_FUNC':
+                address &= thumb_mask
+            symbols.append((symbol.name, address, symbol['st_size'], symbol_type))
+
+    files = []
+    file_indexes = {}
+    lines = []
+    variables = {}
+    if elf.has_dwarf_info():
+        dwarf = elf.get_dwarf_info()
+        for cu in dwarf.iter_CUs():
+            top_die = cu.get_top_DIE()
+            comp_dir = top_die.attributes.get('DW_AT_comp_dir')
+            comp_dir = _decode(comp_dir.value) if comp_dir else ''
+
+            lineprog = dwarf.line_program_for_CU(cu)
+            if lineprog is None:
+                continue
+            cu_files = []
+            for name in _line_program_file_names(lineprog, comp_dir):
+                if name not in file_indexes:
+                    file_indexes[name] = len(files)
+                    files.append(name)
+                cu_files.append(file_indexes[name])
+
+            # Each row covers the addresses up to the next row of its sequence
+            previous = None
+            for entry in lineprog.get_entries():
+                state = entry.state
+                if state is None:
+                    continue
+                if previous is not None:
+                    lines.append((previous.address, state.address,
+                                  (cu_files[previous.file], previous.line)))
+                previous = None if state.end_sequence else state
+
+            for die in top_die.iter_children():
+                if die.tag != 'DW_TAG_variable' or 'DW_AT_decl_line' not in die.attributes:
+                    continue
+                address = _variable_address(die)
+                decl_file = die.attributes.get('DW_AT_decl_file')
+                if address is None or decl_file is None or decl_file.value >= len(cu_files):
+                    continue
+                variables[address] = (cu_files[decl_file.value],
+                                      die.attributes['DW_AT_decl_line'].value)
+
+    return {
+        'version': CACHE_VERSION,
+        'symbols': symbols,
+        'files': files,
+        'lines': lines,
+        'variables': variables,
+    }
+
+
+class Symbolizer(object):
+    """ Looks up the function and source line of addresses in an ELF file.
+
+    The index is loaded from cache_dir if the ELF has been indexed before. If cache_dir is None,
+    nothing is cached.
+    """
+
+    def __init__(self, elf_path, cache_dir=DEFAULT_CACHE_DIR):
+        self.elf_path = elf_path
+        self.cache_dir = cache_dir
+
+        with open(elf_path, 'rb') as f:
+            elf = ELFFile(f)
+            self.build_id = get_build_id(elf)
+            if self.build_id:
+                key = self.build_id
+            else:
+                f.seek(0)
+                key = hashlib.sha1(f.read()).hexdigest()
+
+            index = self._load_cache(key)
+            if index is None:
+                index = _build_index(elf)
+                self._save_cache(key, index)
+
+        self._symbols = index['symbols']
+        self._files = index['files']
+        self._variables = index['variables']
+        # Prefer functions to objects, so that lookups of code find the function
+        self._functions = _Intervals(
+            (address, address + max(size, 1), name)
+            for name, address, size, symbol_type in sorted(
+                self._symbols, key=lambda s: s[3] != 'STT_FUNC'))
+        self._lines = _Intervals(index['lines'])
+
+    def _load_cache(self, key):
+        if self.cache_dir is None:
+            return None
+        data = FileCache(self.cache_dir).get(key)
+        if data is None:
+            return None
+        try:
+            index = pickle.loads(data)
+        except Exception:
+            return None
+        if not isinstance(index, dict) or index.get('version') != CACHE_VERSION:
+            return None
+        return index
+
+    def _save_cache(self, key, index):
+        if self.cache_dir is not None:
+            FileCache(self.cache_dir).put(key, pickle.dumps(index, pickle.HIGHEST_PROTOCOL))
+
+    def symbols(self):
+        """ Generates (name, address, size, type) for the function and object symbols. The type
+        is 'STT_FUNC' or 'STT_OBJECT'.
+        """
+        return iter(self._symbols)
+
+    def symbolize(self, address):
+        """ Return the Location of an address. """
+        function = self._functions.find(address)
+        line = self._lines.find(address)
+        if line is None:
+            line = self._variables.get(address)
+        if line is None:
+            return Location(address, function, None, None)
+        return Location(address, function, self._files[line[0]], line[1])
+
+    def symbolize_all(self, addresses):
+        """ Return a list with the Location of each address. """
+        return [self.symbolize(address) for address in addresses]
+
+
+_symbolizers = {}
+
+
+def get_symbolizer(elf_path, cache_dir=DEFAULT_CACHE_DIR):
+    """ Return a Symbolizer for an ELF file, which is shared by everything in this process that
+    looks up addresses in the same file, until the file changes.
+    """
+    stat = os.stat(elf_path)
+    key = (os.path.abspath(elf_path), stat.st_mtime, stat.st_size, cache_dir)
+    if key not in _symbolizers:
+        _symbolizers[key] = Symbolizer(elf_path, cache_dir)
+    return _symbolizers[key]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print the function and file:line of addresses in an ELF file')
+    parser.add_argument('elf')
+    parser.add_argument('addresses', nargs='+', help='Addresses, in hex')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Neither read nor write the cached index')
+    args = parser.parse_args()
+
+    symbolizer = Symbolizer(args.elf, None if args.no_cache else DEFAULT_CACHE_DIR)
+    for location in symbolizer.symbolize_all(int(a, 16) for a in args.addresses):
+        print('0x%08x %s %s:%s' % (location.address, location.function or '??',
+                                   location.filename or '??', location.line or 0))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Benchmark building and serializing a synthetic ResourcePack.
+
+The pack mixes many small resources with a common header (like PDC sequences and images), a
+few large ones (like fonts) and a proportion of duplicates. The table is enlarged past the usual 512 entries so
+that scaling with the number of resources is visible: the time per resource should stay roughly
+constant as the pack grows.
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+from pbpack import ResourcePack
+
+
+def generate_resources(num_resources, duplicate_ratio=0.2, seed=0):
+    rand = random.Random(seed)
+    # Resources of the same kind tend to start with the same header, which makes telling them
+    # apart by comparing their bytes slow.
+    header = b'PDCS' + bytes(1020)
+    resources = []
+    for i in range(num_resources):
+        if resources and rand.random() < duplicate_ratio:
+            resources.append(rand.choice(resources))
+        elif rand.random() < 0.01:
+            resources.append(os.urandom(rand.randint(64 * 1024, 256 * 1024)))
+        else:
+            resources.append(header + os.urandom(rand.randint(16, 4096)))
+    return resources
+
+
+def benchmark(num_resources):
+    resources = generate_resources(num_resources)
+
+    start = time.time()
+    pack = ResourcePack(is_system=True)
+    pack.table_size = max(pack.table_size, num_resources)
+    pack.content_start = (pack.MANIFEST_SIZE_BYTES +
+                          pack.table_size * pack.TABLE_ENTRY_SIZE_BYTES)
+    for resource in resources:
+        pack.add_resource(resource)
+    added = time.time()
+    pack.finalize()
+    finalized = time.time()
+    out = io.BytesIO()
+    pack.serialize(out)
+    serialized = time.time()
+
+    print('%6u resources, %6u unique, %8.1f KiB: add %.3fs finalize %.3fs serialize %.3fs '
+          '(%.1f us/resource)' %
+          (num_resources, len(pack.contents), len(out.getvalue()) / 1024.0,
+           added - start, finalized - added, serialized - finalized,
+           (serialized - start) * 1e6 / num_resources))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark ResourcePack assembly')
+    parser.add_argument('sizes', nargs='*', type=int, default=[512, 1000, 2000, 4000],
+                        help='number of resources in each synthetic pack')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        benchmark(size)
@@ -0,0 +1,61 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import glob
+import os
+import sys
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+import bitmapgen
+
+FIXTURES_DIR = os.path.join(root_dir, os.pardir, 'tests', 'fixtures', 'graphics')
+
+
+@unittest.skipIf(bitmapgen.numpy is None, 'numpy is not installed')
+class TestPebbleBitmapArrays(unittest.TestCase):
+    """
+    The numpy conversion must produce exactly the same output as the per-pixel conversion.
+    """
+
+    def setUp(self):
+        self.images = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.png')))
+        self.assertTrue(self.images)
+
+    def _convert(self, use_numpy, path, **kwargs):
+        numpy = bitmapgen.numpy
+        if not use_numpy:
+            bitmapgen.numpy = None
+        try:
+            pb = bitmapgen.PebbleBitmap(path, **kwargs)
+            return pb.convert_to_pbi(), pb.palette, (pb.x, pb.y, pb.w, pb.h)
+        except Exception as e:
+            return repr(e)
+        finally:
+            bitmapgen.numpy = numpy
+
+    def _check(self, **kwargs):
+        for path in self.images:
+            self.assertEqual(self._convert(False, path, **kwargs),
+                             self._convert(True, path, **kwargs), (path, kwargs))
+
+    def test_bw(self):
+        self._check(bitmap_format=bitmapgen.FORMAT_BW)
+        self._check(bitmap_format=bitmapgen.FORMAT_BW, color_map=bitmapgen.BLACK_COLOR_MAP)
+
+    def test_color(self):
+        self._check(bitmap_format=bitmapgen.FORMAT_COLOR)
+        self._check(bitmap_format=bitmapgen.FORMAT_COLOR,
+                    color_reduction_method=bitmapgen.TRUNCATE)
+        self._check(bitmap_format=bitmapgen.FORMAT_COLOR, palette_name='pebble2')
+        self._check(bitmap_format=bitmapgen.FORMAT_COLOR, crop=False, bitdepth=8)
+
+    def test_color_raw(self):
+        self._check(bitmap_format=bitmapgen.FORMAT_COLOR_RAW)
+
+
+if __name__ == '__main__':
+    unittest.main()
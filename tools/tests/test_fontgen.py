@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+from font import fontgen
+
+TTF_PATH = os.path.join(root_dir, os.pardir, 'resources', 'normal', 'base', 'ttf',
+                        'Roboto-Bold.ttf')
+
+
+@unittest.skipIf(fontgen.numpy is None, 'numpy is not installed')
+class TestFontArrays(unittest.TestCase):
+    """
+    The numpy glyph conversion must produce exactly the same output as the bit by bit conversion.
+    """
+
+    def _build(self, use_numpy, height, legacy, compress):
+        numpy = fontgen.numpy
+        if not use_numpy:
+            fontgen.numpy = None
+        try:
+            font = fontgen.Font(TTF_PATH, height, fontgen.MAX_GLYPHS_EXTENDED, 256, legacy)
+            if compress:
+                font.set_compression('RLE4')
+            font.build_tables()
+            return font.bitstring()
+        except Exception as e:
+            return repr(e)
+        finally:
+            fontgen.numpy = numpy
+
+    def _check(self, **kwargs):
+        self.assertEqual(self._build(False, **kwargs), self._build(True, **kwargs), kwargs)
+
+    def test_bitmapped(self):
+        self._check(height=14, legacy=False, compress=False)
+        self._check(height=24, legacy=True, compress=False)
+
+    def test_rle4(self):
+        self._check(height=18, legacy=False, compress=True)
+        self._check(height=28, legacy=True, compress=True)
+
+    def test_rle4_random_bitmaps(self):
+        font = fontgen.Font(TTF_PATH, 14, fontgen.MAX_GLYPHS, 256, False)
+        rand = random.Random(0)
+        numpy = fontgen.numpy
+        for _ in range(500):
+            length = rand.randint(1, 300)
+            runs = rand.choice((0.05, 0.3, 0.8))
+            bitmap = [0 if rand.random() < 0.5 else 1]
+            while len(bitmap) < length:
+                bitmap.append(bitmap[-1] ^ (rand.random() < runs))
+
+            compressed = font.compress_glyph_RLE4(bitmap)
+            fontgen.numpy = None
+            try:
+                self.assertEqual(font.compress_glyph_RLE4(bitmap), compressed, bitmap)
+            finally:
+                fontgen.numpy = numpy
+
+
+class TestGlyphCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def _build(self, glyph_cache=None, height=18, max_glyph_size=256, compress=True):
+        font = fontgen.Font(TTF_PATH, height, fontgen.MAX_GLYPHS_EXTENDED, max_glyph_size, False)
+        if compress:
+            font.set_compression('RLE4')
+        if glyph_cache is not None:
+            font.set_glyph_cache(glyph_cache)
+        font.build_tables()
+        return font.bitstring()
+
+    def test_cached_glyphs_are_reused(self):
+        expected = self._build()
+
+        cache = fontgen.GlyphCache(self.cache_dir)
+        self.assertEqual(expected, self._build(cache))
+        self.assertEqual(0, cache.hits)
+        self.assertTrue(cache.misses)
+
+        cache = fontgen.GlyphCache(self.cache_dir)
+        self.assertEqual(expected, self._build(cache))
+        self.assertEqual(0, cache.misses)
+        self.assertEqual(1.0, cache.hit_rate())
+
+    def test_configurations_are_cached_separately(self):
+        cache = fontgen.GlyphCache(self.cache_dir)
+        self._build(cache)
+        for kwargs in (dict(height=14), dict(compress=False)):
+            cache = fontgen.GlyphCache(self.cache_dir)
+            self.assertEqual(self._build(**kwargs), self._build(cache, **kwargs))
+            self.assertEqual(0, cache.hits)
+
+    def test_cached_glyphs_are_checked(self):
+        self._build(fontgen.GlyphCache(self.cache_dir))
+        with self.assertRaises(Exception):
+            self._build(fontgen.GlyphCache(self.cache_dir), max_glyph_size=16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -149,7 +149,7 @@ class MyTestCase(unittest.TestCase):
         bidirectional_lines = json2commands.parse_json_line_data(json_line_data)
 
         longest_path = json2commands.determine_longest_path(bidirectional_lines)
-        self.assertEqual(longest_path, [(1.0, 2.0), (1.0, 1.0), (2.0, 1.0), (2.0, 2.0), (1.0, 1.0)])
+        self.assertEqual(longest_path, [(1.0, 1.0), (2.0, 1.0), (2.0, 2.0), (1.0, 1.0), (1.0, 2.0)])
         self.assertEqual(len(bidirectional_lines), 0)
 
         # Test connected segments with more than one path
@@ -166,11 +166,11 @@ class MyTestCase(unittest.TestCase):
         bidirectional_lines = json2commands.parse_json_line_data(json_line_data)
 
         longest_path = json2commands.determine_longest_path(bidirectional_lines)
-        self.assertEqual(longest_path, [(3.0, 1.0), (2.0, 1.0), (1.0, 1.0)])
-        self.assertEqual(bidirectional_lines, [((2.0, 2.0), (2.0, 1.0)), ((2.0, 1.0), (2.0, 2.0))])
+        self.assertEqual(longest_path, [(1.0, 1.0), (2.0, 1.0), (2.0, 2.0)])
+        self.assertEqual(bidirectional_lines, [((3.0, 1.0), (2.0, 1.0)), ((2.0, 1.0), (3.0, 1.0))])
 
         longest_path = json2commands.determine_longest_path(bidirectional_lines)
-        self.assertEqual(longest_path, [(2.0, 1.0), (2.0, 2.0)])
+        self.assertEqual(longest_path, [(3.0, 1.0), (2.0, 1.0)])
         self.assertEqual(len(bidirectional_lines), 0)
 
         # Test (ordered) unconnected segments (implicitly more than one path)
@@ -184,13 +184,34 @@ class MyTestCase(unittest.TestCase):
         bidirectional_lines = json2commands.parse_json_line_data(json_line_data)
 
         longest_path = json2commands.determine_longest_path(bidirectional_lines)
-        self.assertEqual(longest_path, [(1.0, 2.0), (2.0, 2.0)])
-        self.assertEqual(bidirectional_lines, [((1.0, 1.0), (2.0, 1.0)), ((2.0, 1.0), (1.0, 1.0))])
+        self.assertEqual(longest_path, [(1.0, 1.0), (2.0, 1.0)])
+        self.assertEqual(bidirectional_lines, [((1.0, 2.0), (2.0, 2.0)), ((2.0, 2.0), (1.0, 2.0))])
 
         longest_path = json2commands.determine_longest_path(bidirectional_lines)
-        self.assertEqual(longest_path, [(1.0, 1.0), (2.0, 1.0)])
+        self.assertEqual(longest_path, [(1.0, 2.0), (2.0, 2.0)])
         self.assertEqual(len(bidirectional_lines), 0)
 
+    def test_determine_paths(self):
+        # Test a mesh far too large to search for longest paths: 20x20 points joined to their
+        # right, lower and lower right neighbours. Every point but two opposite corners has an
+        # even number of segments, so a single path can draw the whole mesh.
+        json_line_data = []
+        for x in range(20):
+            for y in range(20):
+                for end_point in [(x + 1, y), (x, y + 1), (x + 1, y + 1)]:
+                    if end_point[0] < 20 and end_point[1] < 20:
+                        json_line_data.append({
+                            "startPoint":   [float(x), float(y)],
+                            "endPoint":     [float(end_point[0]), float(end_point[1])]
+                        })
+        bidirectional_lines = json2commands.parse_json_line_data(json_line_data)
+
+        paths = json2commands.determine_paths(bidirectional_lines)
+        self.assertEqual(len(paths), 1)
+        path_lines = [(paths[0][i], paths[0][i + 1]) for i in range(len(paths[0]) - 1)]
+        path_lines += [(line[1], line[0]) for line in path_lines]
+        self.assertEqual(sorted(path_lines), sorted(bidirectional_lines))
+
     def test_process_fill(self):
         # Test that line style is taken from first segment
         fillGroup_data = [{
@@ -362,8 +383,8 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(len(width_2_color_228_command.points), 2)
         self.assertEqual(width_2_color_228_command.fill_color, json2commands.parse_color([0, 0, 0, 0],
             truncate_color))
-        self.assertTrue(pebble_commands.compare_points(width_2_color_228_command.points[0], (11.0, 11.0)))
-        self.assertTrue(pebble_commands.compare_points(width_2_color_228_command.points[1], (10.0, 10.0)))
+        self.assertTrue(pebble_commands.compare_points(width_2_color_228_command.points[0], (10.0, 10.0)))
+        self.assertTrue(pebble_commands.compare_points(width_2_color_228_command.points[1], (11.0, 11.0)))
         self.assertTrue(width_2_color_228_command.open)
 
         width_3_color_192_command = open_path_commands[1]
@@ -374,9 +395,9 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(len(width_3_color_192_command.points), 3)
         self.assertEqual(width_3_color_192_command.fill_color, json2commands.parse_color([0, 0, 0, 0],
             truncate_color))
-        self.assertTrue(pebble_commands.compare_points(width_3_color_192_command.points[0], (1.0, 2.0)))
+        self.assertTrue(pebble_commands.compare_points(width_3_color_192_command.points[0], (1.0, 1.0)))
         self.assertTrue(pebble_commands.compare_points(width_3_color_192_command.points[1], (2.0, 2.0)))
-        self.assertTrue(pebble_commands.compare_points(width_3_color_192_command.points[2], (1.0, 1.0)))
+        self.assertTrue(pebble_commands.compare_points(width_3_color_192_command.points[2], (1.0, 2.0)))
         self.assertTrue(width_3_color_192_command.open)
 
         width_3_color_66_command = open_path_commands[2]
@@ -399,8 +420,8 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(len(width_5_color_65_command.points), 2)
         self.assertEqual(width_5_color_65_command.fill_color, json2commands.parse_color([0, 0, 0, 0],
             truncate_color))
-        self.assertTrue(pebble_commands.compare_points(width_5_color_65_command.points[0], (4.0, 4.0)))
-        self.assertTrue(pebble_commands.compare_points(width_5_color_65_command.points[1], (3.0, 3.0)))
+        self.assertTrue(pebble_commands.compare_points(width_5_color_65_command.points[0], (3.0, 3.0)))
+        self.assertTrue(pebble_commands.compare_points(width_5_color_65_command.points[1], (4.0, 4.0)))
         self.assertTrue(width_5_color_65_command.open)
 
         width_5_color_72_command = open_path_commands[4]
@@ -411,8 +432,8 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(len(width_5_color_72_command.points), 2)
         self.assertEqual(width_5_color_72_command.fill_color, json2commands.parse_color([0, 0, 0, 0],
             truncate_color))
-        self.assertTrue(pebble_commands.compare_points(width_5_color_72_command.points[0], (4.0, 5.0)))
-        self.assertTrue(pebble_commands.compare_points(width_5_color_72_command.points[1], (4.0, 4.0)))
+        self.assertTrue(pebble_commands.compare_points(width_5_color_72_command.points[0], (4.0, 4.0)))
+        self.assertTrue(pebble_commands.compare_points(width_5_color_72_command.points[1], (4.0, 5.0)))
         self.assertTrue(width_5_color_72_command.open)
 
         # Test that open with no stroke width has no stroke color
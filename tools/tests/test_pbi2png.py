@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+from PIL import Image
+
+import pbi2png
+
+
+def make_pbi(rand, version, fmt, width, height):
+    bitdepth = 1 if version == 0 else pbi2png.pbi_bitdepth(fmt)
+    stride = (width * bitdepth + 7) // 8 + rand.choice((0, 1, 3))
+    data = bytes(rand.getrandbits(8) for _ in range(stride * height))
+    if version == 1 and pbi2png.pbi_is_palettized(fmt):
+        data += bytes(rand.getrandbits(8) for _ in range(pbi2png.palette_size(fmt)))
+    pbi = pbi2png.pbi_struct(stride, (version << 12) | (fmt << 1), 0, 0, width, height)
+    return bytes(pbi) + data
+
+
+def reference_pixels(pbi, pixel_bytearray):
+    """
+    Decode a PBI pixel by pixel into RGBA bytes.
+    """
+    version = (pbi.info >> 12) & 0x0F
+    fmt = pbi2png.pbi_format(pbi.info)
+    bitdepth = 1 if version == 0 else pbi2png.pbi_bitdepth(fmt)
+    palette_offset = pbi.stride * pbi.bounds_h
+
+    pixels = []
+    for y in range(pbi.bounds_h):
+        for x in range(pbi.bounds_w):
+            bit = x * bitdepth
+            abyte = pixel_bytearray[y * pbi.stride + bit // 8]
+            if version == 0 or fmt == pbi2png.format_dict['GBitmapFormat1Bit']:
+                # Legacy 1-bit images have the least significant bit first
+                value = 255 if (abyte >> (bit % 8)) & 1 else 0
+                pixels.append((value, value, value, 255))
+                continue
+
+            value = (abyte >> (8 - bitdepth - bit % 8)) & ((1 << bitdepth) - 1)
+            if pbi2png.pbi_is_palettized(fmt):
+                value = pixel_bytearray[palette_offset + value]
+            pixels.append(pbi2png.argb8_to_rgba32(value))
+    return bytes(channel for pixel in pixels for channel in pixel)
+
+
+class TestPbi2Png(unittest.TestCase):
+    FORMATS = [(0, 0)] + [(1, fmt) for fmt in sorted(pbi2png.format_dict.values())]
+
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def test_formats(self):
+        for version, fmt in self.FORMATS:
+            for _ in range(20):
+                width = self.random.randint(1, 40)
+                height = self.random.randint(1, 20)
+                pbi, pixel_bytearray = pbi2png.parse_pbi(
+                    make_pbi(self.random, version, fmt, width, height))
+
+                png = pbi2png.pbi_to_png(pbi, pixel_bytearray, verbose=False)
+                self.assertEqual((width, height), png.size)
+                self.assertEqual(reference_pixels(pbi, pixel_bytearray),
+                                 png.convert('RGBA').tobytes(), (version, fmt))
+
+    def test_parse_pbi_rejects_other_data(self):
+        self.assertIsNone(pbi2png.parse_pbi(b''))
+        self.assertIsNone(pbi2png.parse_pbi(b'{"not": "an image"}'))
+        # Missing the last row
+        data = make_pbi(self.random, 1, pbi2png.format_dict['GBitmapFormat8Bit'], 8, 8)
+        self.assertIsNone(pbi2png.parse_pbi(data[:-8]))
+
+    def test_batch(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        input_dir = os.path.join(tmp_dir, 'in')
+        os.makedirs(os.path.join(input_dir, 'sub'))
+
+        images = {}
+        for name in ('a.pbi', os.path.join('sub', 'b.pbi'), '3.dat'):
+            images[name] = make_pbi(self.random, 1, pbi2png.format_dict['GBitmapFormat8Bit'],
+                                    10, 10)
+            with open(os.path.join(input_dir, name), 'wb') as f:
+                f.write(images[name])
+        # Resources extracted from a pbpack which aren't images are skipped
+        with open(os.path.join(input_dir, '4.dat'), 'wb') as f:
+            f.write(b'hello')
+
+        output_dir = os.path.join(tmp_dir, 'out')
+        self.assertEqual(0, pbi2png.convert_batch([input_dir], output_dir, processes=2))
+        self.assertFalse(os.path.exists(os.path.join(output_dir, '4.png')))
+        for name, data in images.items():
+            png = Image.open(os.path.join(output_dir, os.path.splitext(name)[0] + '.png'))
+            self.assertEqual(reference_pixels(*pbi2png.parse_pbi(data)), png.tobytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
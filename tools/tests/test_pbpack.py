@@ -1,7 +1,9 @@
 # SPDX-FileCopyrightText: 2024 Google LLC
 # SPDX-License-Identifier: Apache-2.0
 
+import io
 import os
+import random
 import sys
 import tempfile
 import unittest
@@ -10,7 +12,7 @@ import unittest
 root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 sys.path.insert(0, root_dir)
 
-from pbpack import ResourcePack
+from pbpack import ResourcePack, MappedResourcePack, ResourcePackPatch
 import stm32_crc
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -88,6 +90,30 @@ class TestResourcePack(unittest.TestCase):
         self.assertEquals(after_pack.contents[after_pack.table_entries[2].content_index], '')
         self.assertEquals(len(after_pack.table_entries), 3)
 
+    def test_many_duplicate_resources(self):
+        is_system = True
+
+        pack = ResourcePack(is_system)
+        resources = [b'resource %d' % (i % 100) for i in range(pack.table_size)]
+        for resource in resources:
+            pack.add_resource(resource)
+
+        after_pack = self._test_deserialize_serialize_pack(pack, is_system)
+
+        self.assertEqual(len(after_pack.contents), 100)
+        self.assertEqual(resources, [after_pack.contents[e.content_index]
+                                     for e in after_pack.table_entries])
+
+        # The final resource must be at the end of the content
+        last_entry = pack.table_entries[-1]
+        self.assertEqual(last_entry.offset + last_entry.length, len(pack.serialize_content()))
+
+    def test_serialize_empty_table(self):
+        pack = ResourcePack(is_system=False)
+        pack.finalize()
+        self.assertEqual(len(pack.serialize_table()),
+                         pack.table_size * ResourcePack.TABLE_ENTRY_SIZE_BYTES)
+
     def _test_deserialize_serialize_pack(self, pack, is_system):
         """
         Serialize a given pack object to a file and then assert that if we deserialize and
@@ -139,6 +165,206 @@ class TestResourcePack(unittest.TestCase):
         return resource_pack
 
 
+class TestMappedResourcePack(unittest.TestCase):
+    def setUp(self):
+        self.filename = os.path.join(SCRIPT_DIR, 'app_resources_v2.pbpack')
+        with open(self.filename, 'rb') as f:
+            self.data = f.read()
+            f.seek(0)
+            self.pack = ResourcePack.deserialize(f, is_system=False)
+
+    def test_matches_deserialize(self):
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            self.assertEqual(self.pack.crc, mapped.crc)
+            self.assertEqual(len(self.pack.table_entries), len(mapped))
+            for resource_id, entry in enumerate(self.pack.table_entries, start=1):
+                self.assertEqual(self.pack.contents[entry.content_index],
+                                 mapped.get_resource(resource_id, verify=True).tobytes())
+            self.assertEqual(self.pack.get_content_crc(), mapped.get_content_crc())
+
+    def test_to_resource_pack(self):
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            pack = mapped.to_resource_pack()
+
+        with tempfile.TemporaryFile() as f_out:
+            pack.serialize(f_out)
+            f_out.seek(0)
+            self.assertEqual(self.data, f_out.read())
+
+    def test_invalid_resource_id(self):
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            with self.assertRaises(IndexError):
+                mapped.get_resource(0)
+            with self.assertRaises(IndexError):
+                mapped.get_resource(len(mapped) + 1)
+
+    def test_verify_corrupted(self):
+        entry = self.pack.table_entries[-1]
+        self.assertGreater(entry.length, 0)
+        corrupted = bytearray(self.data)
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            corrupted[mapped.content_start + entry.offset] ^= 0xff
+
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            filename = f.name
+            f.write(corrupted)
+
+        try:
+            with MappedResourcePack.open(filename, is_system=False) as mapped:
+                # CRCs are only checked on request
+                self.assertEqual(len(mapped.get_resource(len(mapped))), entry.length)
+                with self.assertRaises(Exception):
+                    mapped.verify(len(mapped))
+                with self.assertRaises(Exception):
+                    mapped.verify_all()
+                with self.assertRaises(Exception):
+                    mapped.verify_all(processes=2)
+        finally:
+            os.remove(filename)
+
+    def test_verify_all_parallel(self):
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            mapped.verify_all(processes=2)
+
+    def test_close_with_live_views(self):
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            resource = mapped.get_resource(1)
+            header = mapped.get_header()
+        mapped.close()
+        self.assertEqual(self.pack.contents[self.pack.table_entries[0].content_index],
+                         resource.tobytes())
+        self.assertEqual(self.data[:mapped.content_start], header.tobytes())
+
+        # Exceptions raised while views are alive aren't hidden by closing the pack
+        with self.assertRaises(KeyError):
+            with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+                resource = mapped.get_resource(1)
+                raise KeyError()
+
+    def test_too_short(self):
+        content_start = (ResourcePack.MANIFEST_SIZE_BYTES +
+                         256 * ResourcePack.TABLE_ENTRY_SIZE_BYTES)
+        for length in (0, 1, content_start - 1):
+            with tempfile.TemporaryFile() as f:
+                f.write(self.data[:length])
+                f.flush()
+                with self.assertRaises(Exception) as cm:
+                    MappedResourcePack(f, is_system=False)
+                self.assertIn('pbpack', str(cm.exception))
+
+class TestResourcePackPatch(unittest.TestCase):
+    def setUp(self):
+        self.resources = [b'a' * 10, b'b' * 20, b'', b'c' * 30, b'b' * 20, b'd' * 40]
+        self.filename = self._write_pack(self.resources)
+        self.addCleanup(os.remove, self.filename)
+
+    def _write_pack(self, resources):
+        pack = ResourcePack(is_system=False)
+        for resource in resources:
+            pack.add_resource(resource)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            pack.serialize(f)
+        return f.name
+
+    def _check_patch(self, edit, expected_resources):
+        """
+        Apply an edit to the test pack and check the result, both written out in full and patched
+        in place. Returns the changed ranges.
+        """
+
+        with open(self.filename, 'rb') as f:
+            original = f.read()
+
+        with MappedResourcePack.open(self.filename, is_system=False) as mapped:
+            patch = ResourcePackPatch(mapped)
+            edit(patch)
+            f_out = io.BytesIO()
+            crc = patch.write(f_out)
+            ranges = patch.changed_ranges()
+
+        patched = f_out.getvalue()
+        f_out.seek(0)
+        pack = ResourcePack.deserialize(f_out, is_system=False)
+        self.assertEqual(expected_resources, [pack.contents[e.content_index]
+                                              for e in pack.table_entries])
+        self.assertEqual(crc, pack.crc)
+        self.assertEqual(crc, pack.get_content_crc())
+
+        # The final resource must be at the end of the content
+        last_entry = pack.table_entries[-1]
+        self.assertEqual(len(patched), pack.content_start + last_entry.offset + last_entry.length)
+
+        in_place = io.BytesIO(original)
+        patch.apply(in_place, ranges)
+        self.assertEqual(patched, in_place.getvalue())
+
+        return ranges
+
+    def test_no_changes(self):
+        self.assertEqual([], self._check_patch(lambda patch: None, self.resources))
+
+    def test_replace_same_length(self):
+        ranges = self._check_patch(lambda patch: patch.replace(4, b'x' * 30),
+                                   self.resources[:3] + [b'x' * 30] + self.resources[4:])
+        # The manifest, the table entry and the resource itself
+        self.assertEqual([0, 12 + 3 * 16], [start for start, data in ranges[:2]])
+        self.assertEqual(3, len(ranges))
+        self.assertEqual(b'x' * 30, ranges[2][1])
+
+    def test_replace_shared_content(self):
+        self._check_patch(lambda patch: patch.replace(2, b'y' * 5),
+                          [self.resources[0], b'y' * 5] + self.resources[2:])
+
+        # The shared content stays where it is, and the new content goes before the content of
+        # the final resource, which is the only content that moves
+        self.resources = [b'b' * 20, b'b' * 20, b'c' * 30, b'd' * 40]
+        self.filename = self._write_pack(self.resources)
+        self.addCleanup(os.remove, self.filename)
+        ranges = self._check_patch(lambda patch: patch.replace(1, b'y' * 5),
+                                   [b'y' * 5] + self.resources[1:])
+        self.assertEqual(b'y' * 5 + b'd' * 40, ranges[-1][1])
+        self.assertNotIn(b'c' * 30, b''.join(data for start, data in ranges))
+
+    def test_replace_resize(self):
+        self._check_patch(lambda patch: patch.replace(1, b'z' * 100),
+                          [b'z' * 100] + self.resources[1:])
+        self._check_patch(lambda patch: patch.replace(6, b''),
+                          self.resources[:5] + [b''])
+
+    def test_append(self):
+        self._check_patch(lambda patch: patch.append(b'e' * 7), self.resources + [b'e' * 7])
+
+    def test_remove(self):
+        self._check_patch(lambda patch: patch.remove(6), self.resources[:5])
+        self._check_patch(lambda patch: patch.remove(2),
+                          self.resources[:1] + self.resources[2:])
+
+    def test_random_edits(self):
+        rand = random.Random(0)
+        for _ in range(50):
+            ops = []
+            expected = list(self.resources)
+            for _ in range(rand.randint(1, 4)):
+                op = rand.choice(('replace', 'append', 'remove'))
+                content = bytes(rand.getrandbits(8) for _ in range(rand.randint(0, 50)))
+                if op == 'append' or len(expected) == 1:
+                    ops.append(('append', content))
+                    expected.append(content)
+                elif op == 'replace':
+                    resource_id = rand.randint(1, len(expected))
+                    ops.append(('replace', resource_id, content))
+                    expected[resource_id - 1] = content
+                else:
+                    resource_id = rand.randint(1, len(expected))
+                    ops.append(('remove', resource_id))
+                    del expected[resource_id - 1]
+
+            def edit(patch):
+                for op in ops:
+                    getattr(patch, op[0])(*op[1:])
+
+            self._check_patch(edit, expected)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -245,6 +245,28 @@ class MyTestCase(unittest.TestCase):
         seq_expected = 'PDCS' + pack('I', len(expected)) + array.array('B', expected).tostring()
         self.assertEqual(seq, seq_expected)
 
+    def test_serialize_sequence_coalesce(self):
+        frame1 = [pebble_commands.PathCommand([(1.5, 6.5), (-3.5, 2.5)], True, (0, 0), 1,
+                                              pebble_commands.convert_color(0x00, 0x55, 0xFF, 0xFF))]
+        frame2 = [pebble_commands.CircleCommand((-5.5, 6.5), 300, (0, 0), 1,
+                                                pebble_commands.convert_color(0x00, 0x55, 0xFF, 0xFF))]
+        frames = [frame1, frame1, frame2, frame1]
+
+        # Without coalescing every frame is stored
+        seq = pebble_commands.serialize_sequence(frames, (10, 400), 33, 5)
+        self.assertEqual(seq[16:18], pack('H', 4))
+
+        seq = pebble_commands.serialize_sequence(frames, (10, 400), 33, 5, coalesce=True)
+        s = (pebble_commands.pack_header((10, 400)) + pack('H', 5) + pack('H', 3) +
+             pebble_commands.serialize_frame(frame1, 66) +
+             pebble_commands.serialize_frame(frame2, 33) +
+             pebble_commands.serialize_frame(frame1, 33))
+        self.assertEqual(seq, b'PDCS' + pack('I', len(s)) + s)
+
+    def test_coalesce_frames_duration_limit(self):
+        self.assertEqual(pebble_commands.coalesce_frames([b'a', b'a', b'a', b'b'], 30000),
+                         [(b'a', 60000), (b'a', 30000), (b'b', 30000)])
+
 
 if __name__ == '__main__':
     unittest.main()
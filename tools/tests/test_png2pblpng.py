@@ -0,0 +1,74 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import glob
+import os
+import sys
+import tempfile
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+import png
+import png2pblpng
+
+FIXTURES_DIR = os.path.join(root_dir, os.pardir, 'tests', 'fixtures', 'graphics')
+
+
+class TestPng2PblPng(unittest.TestCase):
+    def setUp(self):
+        self.images = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.png')))
+        self.assertTrue(self.images)
+
+    def _write_png(self, rows):
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+            png.from_array(rows, 'RGBA').write(f)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_greyscale_with_transparency(self):
+        filename = self._write_png([[0, 0, 0, 255, 255, 255, 255, 255],
+                                    [0, 0, 0, 0, 250, 250, 250, 255]])
+        self.assertEqual((True, True, 2, [(0, 0, 0, 255), (255, 255, 255, 255), (0, 0, 0, 0)]),
+                         png2pblpng.get_palette_for_png(filename, 'pebble2', 'nearest'))
+
+        width, height, pixels, metadata = png.Reader(
+            bytes=png2pblpng.convert_png_to_pebble_png_bytes(filename, 'pebble2')).read()
+        self.assertTrue(metadata['greyscale'])
+        self.assertEqual(2, metadata['bitdepth'])
+        # Transparent pixels use the first unused grey
+        self.assertEqual((0x1,), metadata['transparent'])
+        self.assertEqual([[0, 3], [1, 3]], [list(row) for row in pixels])
+
+    def test_palette_in_order_of_appearance(self):
+        filename = self._write_png([[255, 0, 0, 255, 0, 255, 0, 255, 255, 0, 0, 255],
+                                    [0, 0, 255, 255, 0, 255, 0, 255, 250, 0, 0, 255]])
+        self.assertEqual((False, False, 2, [(255, 0, 0), (0, 255, 0), (0, 0, 255)]),
+                         png2pblpng.get_palette_for_png(filename, 'pebble64', 'nearest'))
+
+        width, height, pixels, metadata = png.Reader(
+            bytes=png2pblpng.convert_png_to_pebble_png_bytes(filename, 'pebble64')).read()
+        self.assertEqual([[0, 1, 0], [2, 1, 0]], [list(row) for row in pixels])
+
+    @unittest.skipIf(png2pblpng.numpy is None, 'numpy is not installed')
+    def test_numpy_matches_per_pixel_conversion(self):
+        numpy = png2pblpng.numpy
+        for path in self.images:
+            for palette_name in png2pblpng.SUPPORTED_PALETTES:
+                for method in png2pblpng.COLOR_REDUCTION_CHOICES:
+                    args = (path, palette_name, method)
+                    try:
+                        png2pblpng.numpy = None
+                        expected = (png2pblpng.get_palette_for_png(*args),
+                                    png2pblpng.convert_png_to_pebble_png_bytes(*args))
+                    finally:
+                        png2pblpng.numpy = numpy
+                    self.assertEqual(expected,
+                                     (png2pblpng.get_palette_for_png(*args),
+                                      png2pblpng.convert_png_to_pebble_png_bytes(*args)), args)
+
+
+if __name__ == '__main__':
+    unittest.main()
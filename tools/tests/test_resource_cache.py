@@ -0,0 +1,148 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+from resources import resource_cache
+from resources.types.resource_definition import ResourceDefinition
+from resources.types.resource_object import ResourceObject
+
+
+class FakeNode(object):
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def abspath(self):
+        return self.path
+
+
+class FakeTaskGen(object):
+    def __init__(self, env):
+        self.env = env
+
+
+class FakeTask(object):
+    def __init__(self, definition, inputs, env):
+        self.definition = definition
+        self.inputs = inputs
+        self.generator = FakeTaskGen(env)
+
+
+class FakeGenerator(object):
+    type = 'bitmap'
+    version = 1
+    cache_env_vars = ('PLATFORM_NAME',)
+
+
+class TestResourceCacheKey(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.source_path = os.path.join(self.tmp_dir, 'image.png')
+        self.write_source(b'\x89PNG one')
+
+    def write_source(self, data):
+        with open(self.source_path, 'wb') as f:
+            f.write(data)
+
+    def key(self, platform='basalt', **fields):
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png')
+        vars(definition).update(fields)
+        task = FakeTask(definition, [FakeNode(self.source_path)], {'PLATFORM_NAME': platform})
+        return resource_cache.resource_cache_key(task, FakeGenerator)
+
+    def test_key_is_stable(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_key_ignores_the_path_of_the_resource(self):
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'other/dir/image.png')
+        task = FakeTask(definition, [FakeNode(self.source_path)], {'PLATFORM_NAME': 'basalt'})
+        self.assertEqual(self.key(), resource_cache.resource_cache_key(task, FakeGenerator))
+
+    def test_key_changes_with_source_contents(self):
+        key = self.key()
+        self.write_source(b'\x89PNG two')
+        self.assertNotEqual(key, self.key())
+
+    def test_key_changes_with_definition_fields(self):
+        self.assertNotEqual(self.key(), self.key(name='OTHER_IMAGE'))
+        self.assertNotEqual(self.key(), self.key(storage_format='png'))
+
+    def test_key_changes_with_cache_env_vars(self):
+        self.assertNotEqual(self.key(), self.key(platform='chalk'))
+
+    def test_key_changes_with_library_versions(self):
+        key = self.key()
+        versions = resource_cache._get_library_versions()
+        resource_cache._library_versions = versions + [('numpy', 'newer')]
+        try:
+            self.assertNotEqual(key, self.key())
+        finally:
+            resource_cache._library_versions = versions
+
+
+class TestResourceCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache = resource_cache.ResourceCache(os.path.join(self.tmp_dir, 'cache'))
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('00ff'))
+
+    def test_put_get(self):
+        self.cache.put('00ff', b'data')
+        self.assertEqual(b'data', self.cache.get('00ff'))
+        self.cache.put('00ff', b'other')
+        self.assertEqual(b'other', self.cache.get('00ff'))
+
+    def test_hit_restores_generated_fields(self):
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png')
+        fields = copy.deepcopy(vars(definition))
+        # The bitmap generator picks the storage format while generating the data
+        definition.storage_format = 'pbi'
+        self.cache.put_resource('00ff', fields, ResourceObject(definition, b'\x01\x02'))
+
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png')
+        self.assertEqual(b'\x01\x02', self.cache.get_resource('00ff', definition))
+        self.assertEqual('pbi', definition.storage_format)
+
+    def test_fields_which_cant_be_stored_are_not_cached(self):
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png')
+        fields = copy.deepcopy(vars(definition))
+        definition.palette = object()
+        self.cache.put_resource('00ff', fields, ResourceObject(definition, b'\x01'))
+        self.assertIsNone(self.cache.get('00ff'))
+
+    def test_corrupt_entries_are_ignored(self):
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png')
+        for entry in (b'', b'\x01', b'\xff\x00\x00\x00{}', b'\x02\x00\x00\x00{]data'):
+            self.cache.put('00ff', entry)
+            self.assertIsNone(self.cache.get_resource('00ff', definition), entry)
+
+    def test_unusable_directory_is_ignored(self):
+        # The cache directory is a file, so nothing can be written to it
+        path = os.path.join(self.tmp_dir, 'file')
+        with open(path, 'wb') as f:
+            f.write(b'not a directory')
+        cache = resource_cache.ResourceCache(path)
+
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png')
+        cache.put_resource('00ff', copy.deepcopy(vars(definition)),
+                           ResourceObject(definition, b'\x01'))
+        self.assertIsNone(cache.get('00ff'))
+        self.assertIsNone(cache.get_resource('00ff', definition))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+from resources.types import resource_container
+from resources.types.resource_ball import ResourceBall
+from resources.types.resource_declaration import ResourceDeclaration
+from resources.types.resource_definition import ResourceDefinition, StorageType
+from resources.types.resource_object import ResourceObject
+
+
+class FakeNode(object):
+    def __init__(self, path):
+        self.path = path
+        self.parent = self
+
+    def abspath(self):
+        return self.path
+
+    def mkdir(self):
+        pass
+
+
+class TestResourceContainer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+        definition = ResourceDefinition('bitmap', 'IMAGE', 'images/image.png',
+                                        storage=StorageType.builtin, aliases=['ALIAS'])
+        definition.storage_format = 'pbi'
+        self.resource_objects = [ResourceObject(definition, b'\x01\x02\x03'),
+                                 ResourceObject(ResourceDefinition('raw', 'EMPTY', None), b'')]
+        self.resource_declarations = [ResourceDeclaration('LANG')]
+
+    def node(self, name):
+        return FakeNode(os.path.join(self.tmp_dir, name))
+
+    def assertSameObjects(self, expected, actual):
+        self.assertEqual([(type(o.definition), vars(o.definition), o.data) for o in expected],
+                         [(type(o.definition), vars(o.definition), o.data) for o in actual])
+
+    def test_resource_object_round_trip(self):
+        node = self.node('image.reso')
+        self.resource_objects[0].dump(node)
+        reso = ResourceObject.load(node.abspath())
+        self.assertSameObjects(self.resource_objects[:1], [reso])
+
+    def test_resource_ball_round_trip(self):
+        node = self.node('resources.ball')
+        ResourceBall(self.resource_objects, self.resource_declarations).dump(node)
+        ball = ResourceBall.load(node.abspath())
+
+        self.assertTrue(all(isinstance(o, resource_container.MappedResourceObject)
+                            for o in ball.resource_objects))
+        self.assertSameObjects(self.resource_objects, ball.resource_objects)
+        self.assertEqual(['IMAGE', 'EMPTY', 'LANG'],
+                         [d.name for d in ball.get_all_declarations()])
+        self.assertIs(ResourceDeclaration, type(ball.resource_declarations[0]))
+
+        # Dumping a loaded ball writes the same container
+        copy_node = self.node('copy.ball')
+        ball.dump(copy_node)
+        with open(node.abspath(), 'rb') as f, open(copy_node.abspath(), 'rb') as f_copy:
+            self.assertEqual(f.read(), f_copy.read())
+
+    def test_declarations_do_not_read_data(self):
+        node = self.node('resources.ball')
+        ResourceBall(self.resource_objects, self.resource_declarations).dump(node)
+
+        # Chop the data off the end of the container; the index is still readable
+        with open(node.abspath(), 'r+b') as f:
+            f.truncate(os.path.getsize(node.abspath()) - 3)
+        ball = ResourceBall.load(node.abspath())
+        self.assertEqual(['IMAGE', 'EMPTY', 'LANG'],
+                         [d.name for d in ball.get_all_declarations()])
+
+    def test_load_pickled(self):
+        node = self.node('pickled.ball')
+        with open(node.abspath(), 'wb') as f:
+            pickle.dump(ResourceBall(self.resource_objects, self.resource_declarations), f)
+        ball = ResourceBall.load(node.abspath())
+        self.assertSameObjects(self.resource_objects, ball.resource_objects)
+
+        node = self.node('pickled.reso')
+        with open(node.abspath(), 'wb') as f:
+            pickle.dump(self.resource_objects[0], f)
+        self.assertSameObjects(self.resource_objects[:1], [ResourceObject.load(node.abspath())])
+
+    def test_unsupported_version(self):
+        node = self.node('image.reso')
+        self.resource_objects[0].dump(node)
+        with open(node.abspath(), 'r+b') as f:
+            f.seek(len(resource_container.MAGIC))
+            f.write(b'\xff')
+        with self.assertRaises(ValueError):
+            ResourceObject.load(node.abspath())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import os
+import random
+import sys
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+import stm32_crc
+
+
+def reference_crc(data, crc=0xffffffff):
+    for i in range(0, len(data), 4):
+        crc = stm32_crc.process_word(data[i:i + 4], crc)
+    return crc
+
+
+class TestStm32Crc(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def random_bytes(self, length):
+        return bytes(self.random.getrandbits(8) for _ in range(length))
+
+    def test_known_values(self):
+        self.assertEqual(0x89f3bab2, stm32_crc.crc32(b"123 567 901 34"))
+        self.assertEqual(0xaff19057, stm32_crc.crc32(b"123456789"))
+        self.assertEqual(0x519b130, stm32_crc.crc32(b"\xfe\xff\xfe\xff"))
+        self.assertEqual(0x495e02ca, stm32_crc.crc32(b"\xfe\xff\xfe\xff\x88"))
+
+    def test_empty(self):
+        self.assertEqual(0xffffffff, stm32_crc.crc32(b""))
+
+    def test_matches_reference(self):
+        for length in list(range(16)) + [self.random.randrange(4096)
+                                         for _ in range(50)]:
+            data = self.random_bytes(length)
+            self.assertEqual(reference_crc(data), stm32_crc.crc32(data))
+            self.assertEqual(reference_crc(data), stm32_crc.crc32(bytearray(data)))
+
+    def test_initial_value(self):
+        for length in range(16):
+            data = self.random_bytes(length)
+            crc = self.random.getrandbits(32)
+            self.assertEqual(reference_crc(data, crc),
+                             stm32_crc.process_buffer(data, crc))
+
+    def test_incremental(self):
+        data = self.random_bytes(1000)
+        for _ in range(20):
+            crc = stm32_crc.Stm32Crc()
+            offset = 0
+            while offset < len(data):
+                length = self.random.randrange(10)
+                crc.update(data[offset:offset + length])
+                offset += length
+                # Reading the value must not disturb the running state
+                self.assertEqual(reference_crc(data[:offset]), crc.crc)
+
+    def test_process_file(self):
+        data = self.random_bytes(1001)
+        self.assertEqual(reference_crc(data), stm32_crc.process_file(
+                io.BytesIO(data), chunk_size=7))
+
+
+if __name__ == '__main__':
+    unittest.main()
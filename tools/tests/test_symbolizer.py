@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: 2024 Google LLC
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Allow us to run even if not at the `tools` directory.
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, root_dir)
+
+import symbolizer
+
+SOURCE = """\
+int g_counter = 3;
+static char s_buffer[64];
+
+int add(int a, int b) {
+  return a + b;
+}
+
+int main(int argc, char **argv) {
+  s_buffer[0] = argc;
+  g_counter = add(argc, g_counter);
+  return s_buffer[1];
+}
+"""
+
+CC = shutil.which('gcc')
+
+
+@unittest.skipIf(CC is None, 'gcc is not installed')
+class TestSymbolizer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.source_path = os.path.join(self.tmp_dir, 'test.c')
+        with open(self.source_path, 'w') as f:
+            f.write(SOURCE)
+
+    def compile(self, *flags):
+        elf_path = os.path.join(self.tmp_dir, 'test.elf')
+        subprocess.check_call([CC, '-g', '-O0', '-o', elf_path, self.source_path] + list(flags))
+        return elf_path
+
+    def addresses(self, sym):
+        return {name: address for name, address, _, _ in sym.symbols()}
+
+    def check_locations(self, sym):
+        addresses = self.addresses(sym)
+        locations = sym.symbolize_all([addresses['add'], addresses['main'], addresses['main'] + 4,
+                                       addresses['g_counter'], addresses['s_buffer']])
+        self.assertEqual([('add', 4), ('main', 8), ('main', 8), ('g_counter', 1),
+                          ('s_buffer', 2)],
+                         [(l.function, l.line) for l in locations])
+        self.assertTrue(all(l.filename == self.source_path for l in locations))
+
+        # The address after the last instruction of main is in some other function
+        self.assertNotEqual('main', sym.symbolize(addresses['main'] + 0x1000).function)
+        self.assertEqual(symbolizer.Location(0, None, None, None), sym.symbolize(0))
+
+    def test_symbolize(self):
+        sym = symbolizer.Symbolizer(self.compile('-Wl,--build-id'), self.cache_dir)
+        self.assertTrue(sym.build_id)
+        self.check_locations(sym)
+
+    def test_cached_index_is_used(self):
+        elf_path = self.compile('-Wl,--build-id')
+        symbolizer.Symbolizer(elf_path, self.cache_dir)
+
+        build_index = symbolizer._build_index
+        symbolizer._build_index = None
+        try:
+            self.check_locations(symbolizer.Symbolizer(elf_path, self.cache_dir))
+        finally:
+            symbolizer._build_index = build_index
+
+    def test_without_build_id(self):
+        sym = symbolizer.Symbolizer(self.compile('-Wl,--build-id=none'), self.cache_dir)
+        self.assertIsNone(sym.build_id)
+        self.check_locations(sym)
+
+    def test_get_symbolizer_is_shared(self):
+        elf_path = self.compile()
+        sym = symbolizer.get_symbolizer(elf_path, None)
+        self.assertIs(sym, symbolizer.get_symbolizer(elf_path, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ import sys
 import argparse
 import pathlib
 
-from pbpack import ResourcePack
+from pbpack import MappedResourcePack
 
 def main():
     parser = argparse.ArgumentParser(description=
@@ -22,10 +22,10 @@ def main():
     if os.path.exists(args.pbpack):
         pathlib.Path(args.output).mkdir(parents=True, exist_ok=True)
 
-        resource_pack = ResourcePack.deserialize(open(args.pbpack,'rb'), is_system=not args.app)
-        for idx, resource_data in enumerate(resource_pack.table_entries):
-            with open(os.path.join(args.output, str(idx) + '.dat'),'wb') as outfile:
-                outfile.write(resource_pack.contents[resource_data.content_index])
+        with MappedResourcePack.open(args.pbpack, is_system=not args.app) as resource_pack:
+            for idx in range(len(resource_pack)):
+                with open(os.path.join(args.output, str(idx) + '.dat'),'wb') as outfile:
+                    outfile.write(resource_pack.get_resource(idx + 1, verify=True))
 
 
 if __name__ == '__main__':
@@ -113,21 +113,20 @@ def get_lang_metadata(lang_pack):
     #  u'Report-Msgid-Bugs-To': u'',
     #  u'X-Generator': u'POEditor.com'}
     try:
-        with open(lang_pack, 'rb') as f:
-            pack = pbpack.ResourcePack.deserialize(f, is_system=False)
+        with pbpack.MappedResourcePack.open(lang_pack, is_system=False) as pack:
             with tempfile.NamedTemporaryFile(delete=False) as mo_file:
                 mo_filename = mo_file.name
 
                 # RESOURCE_ID_STRINGS is the 0th resource in the pb pack. Grab the data and write
                 # it to a file.
-                content_index = pack.table_entries[0].content_index
-                if len(pack.contents[content_index]) == 0:
+                strings = pack.get_resource(1, verify=True).tobytes()
+                if len(strings) == 0:
                     # Assume this is an english pack
                     return {u'Language': u'en_US',
                             u'Name': u'English',
                             u'Project-Id-Version': u'1.0'}
 
-                mo_file.write(pack.contents[content_index])
+                mo_file.write(strings)
 
         mo_object = polib.mofile(mo_filename)
     finally:
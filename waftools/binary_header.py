@@ -2,11 +2,69 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import binascii
+import os
+import re
 
 import sparse_length_encoding
 
 from waflib import Task, TaskGen, Utils, Node, Errors
 
+# Bytes per line of the C array
+BYTES_PER_LINE = 16
+
+# The array is formatted this many lines at a time so that large inputs aren't held in memory as
+# text all at once
+LINES_PER_CHUNK = 4096
+
+
+def write_c_array(f, array_name, code):
+    """
+    Write a header with a static C array holding code to the binary file f. Each byte is written
+    as "0x??," with BYTES_PER_LINE bytes to a line.
+    """
+    f.write(b'#pragma once\n#include <stdint.h>\n')
+    f.write(('static const uint8_t %s[] = {\n' % array_name).encode('ascii'))
+
+    code = memoryview(code)
+    chunk_size = BYTES_PER_LINE * LINES_PER_CHUNK
+    line_length = len(b'0x00,') * BYTES_PER_LINE
+    for offset in range(0, len(code), chunk_size):
+        # hexlify gives "00,01,02" which is turned into "0x00,0x01,0x02,", then split into lines
+        text = binascii.hexlify(code[offset:offset + chunk_size], b',')
+        text = b'0x' + text.replace(b',', b',0x') + b','
+        f.write(b'\n'.join(text[i:i + line_length]
+                           for i in range(0, len(text), line_length)))
+        f.write(b'\n')
+
+    f.write(b'};\n')
+
+
+def _c_string(text):
+    text = text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '"%s"' % text
+
+
+def write_incbin_header(f, array_name, bin_path, length):
+    """
+    Write a header to the binary file f which declares an array of length bytes that is
+    assembled straight from the file at bin_path with .incbin, so the compiler never has to parse
+    the data. The array is defined in the assembly of each file which includes the header, like
+    the static array written by write_c_array, and sizeof() it works the same way. This relies on
+    GNU assembler directives, so it's only suitable for ELF targets.
+    """
+    asm = ['.pushsection .rodata.%s,"a"' % array_name,
+           '.balign 4',
+           '.type %s, STT_OBJECT' % array_name,
+           '.size %s, %d' % (array_name, length),
+           '%s:' % array_name,
+           '.incbin %s' % _c_string(bin_path),
+           '.popsection']
+    output = ['#pragma once', '#include <stdint.h>', '__asm__(']
+    output += ['  %s' % _c_string(line + '\n') for line in asm]
+    output += [');', 'extern const uint8_t %s[%d];' % (array_name, length), '']
+    f.write('\n'.join(output).encode('ascii'))
+
+
 class binary_header(Task.Task):
     """
     Create a header file containing an array with contents from a binary file.
@@ -34,21 +92,13 @@ class binary_header(Task.Task):
                 raise Errors.WafError('encoding error')
             code = encoded_code
 
-        output = ['#pragma once', '#include <stdint.h>']
-        output += ['static const uint8_t %s[] = {' % array_name]
-        line = []
-        for n, b in enumerate(code):
-            line += ['0x%.2x,' % b]
-            if n % 16 == 15:
-                output += [''.join(line)]
-                line = []
-        if line:
-            output += [''.join(line)]
-        output += ['};', '']
-
-        self.outputs[0].write(
-                '\n'.join(output),
-                encoding=getattr(self.generator, 'encoding', 'ISO8859-1'))
+        if getattr(self.generator, 'incbin', False):
+            self.outputs[1].write(code, 'wb')
+            with open(self.outputs[0].abspath(), 'wb') as f:
+                write_incbin_header(f, array_name, self.outputs[1].abspath(), len(code))
+        else:
+            with open(self.outputs[0].abspath(), 'wb') as f:
+                write_c_array(f, array_name, code)
         self.generator.bld.raw_deps[self.uid()] = self.dep_vars = 'array_name'
 
         if getattr(self.generator, 'chmod', None):
@@ -56,7 +106,7 @@ class binary_header(Task.Task):
 
     def sig_vars(self):
         dependent_generator_vars = ['hex', 'encoding', 'array_name',
-                                    'compressed', 'chmod']
+                                    'compressed', 'chmod', 'incbin']
         vars = []
         for k in dependent_generator_vars:
             try:
@@ -97,6 +147,12 @@ def process_binary_header(self):
     If the *compressed* parameter is True, the *source* files are compressed with
     sparse length encoding (see waftools/sparse_length_encoding.py).
 
+    If the *incbin* parameter is True, the data is written to a .bin file next
+    to the *target* and the header pulls it in with the assembler's .incbin
+    directive instead of holding it as a C array, which spares the compiler from
+    parsing large blobs. The array is still sized, so sizeof() works on it. This
+    needs a GNU assembler targeting ELF.
+
     The name of the array variable defaults to the source file name with all
     characters that are invaid C identifiers replaced with underscores. The name
     can be explicitly specified by setting the *array_name* parameter.
@@ -139,7 +195,10 @@ def process_binary_header(self):
             raise Errors.WafError('could not find %r for %r' % (x, self))
 
         has_constraints = False
-        tsk = self.create_task('binary_header', a, b)
+        outputs = [b]
+        if getattr(self, 'incbin', False):
+            outputs.append(b.change_ext('.bin'))
+        tsk = self.create_task('binary_header', a, outputs)
         for k in ('after', 'before', 'ext_in', 'ext_out'):
             val = getattr(self, k, None)
             if val:
@@ -33,80 +33,195 @@ The minimum overhead for this encoding scheme is three bytes: header and
 end-of-input escape sequence.
 """
 
+import re
 from collections import Counter
-from itertools import groupby
 
 _MAX_COUNT = 0x807F  # max is ((0x7F << 8) | (0xFF) + 0x80
 
+# Inputs are encoded and decoded this many bytes at a time
+_CHUNK_SIZE = 1 << 20
 
-def encode(source):
-    # Analyze the source data to select the escape byte. To keep things simple, we don't allow 0 to
-    # be the escape character.
-    frequency = Counter({n: 0 for n in range(1, 256)})
-    frequency.update(source)
+# Runs of zeroes which are encoded as escape sequences; single zeroes are emitted literally
+_ZERO_RUN = re.compile(b'\x00{2,}')
 
-    # most_common() doesn't define what happens if there's a tie in frequency. Let's always pick
-    # the lowest value of that frequency to make the encoding predictable.
-    occurrences = frequency.most_common()
-    escape = min(byte for byte, count in occurrences if count == occurrences[-1][1])
 
-    yield bytes([escape])
+def _select_escape(frequency):
+    # To keep things simple, we don't allow 0 to be the escape character. Pick the least frequent
+    # byte, and the lowest value of that frequency to make the encoding predictable.
+    return min(range(1, 256), key=lambda byte: (frequency[byte], byte))
+
+
+def _encode_run(escape, count):
+    """ Return the encoding of a run of count zeroes. """
+    out = bytearray()
+    while count >= 0x80:
+        # encode the number of zeros using two bytes
+        unit = min(count, _MAX_COUNT)
+        count -= unit
+        unit -= 0x80
+        out += bytes([escape, ((unit >> 8) & 0x7F) | 0x80, unit & 0xFF])
+    if count == 1:
+        # can't encode a length of 1 zero, so just emit it directly
+        out.append(0x00)
+    elif count > 1:
+        # encode the number of zeros using one byte
+        out += bytes([escape, count])
+    return out
+
+
+class _Encoder(object):
+    """
+    Encodes data which is fed to it in chunks. Runs of zeroes which span chunks are held back
+    until they end, so the output doesn't depend on where the input is split.
+    """
+
+    def __init__(self, escape):
+        self.escape = escape
+        self.escape_byte = bytes([escape])
+        self.escaped_escape = bytes([escape, 1])
+        self.zeros = 0
+
+    def _encode_literals(self, data, out):
+        # simply insert the characters (and escape the escape character)
+        out += data.replace(self.escape_byte, self.escaped_escape)
 
-    for b, g in groupby(source):
-        if b == 0x00:
-            # this is a run of zeros
-            count = len(list(g))
-            while count >= 0x80:
-                # encode the number of zeros using two bytes
-                unit = min(count, _MAX_COUNT)
-                count -= unit
-                unit -= 0x80
-                yield bytes([escape])
-                yield bytes([((unit >> 8) & 0x7F) | 0x80])
-                yield bytes([unit & 0xFF])
-            if count == 1:
-                # can't encode a length of 1 zero, so just emit it directly
-                yield bytes([0x00])
-            elif 1 < count < 0x80:
-                # encode the number of zeros using one byte
-                yield bytes([escape])
-                yield bytes([count])
-            elif count < 0:
-                raise Exception('Encoding malfunctioned')
-        else:
-            # simply insert the characters (and escape the escape character)
-            for _ in g:
-                yield bytes([b])
-                if b == escape:
-                    yield bytes([1])
+    def encode(self, chunk):
+        chunk = bytes(chunk)
+        data = chunk.lstrip(b'\x00')
+        self.zeros += len(chunk) - len(data)
+        if not data:
+            return b''
+
+        out = _encode_run(self.escape, self.zeros)
+        end = len(data.rstrip(b'\x00'))
+        self.zeros = len(data) - end
+
+        pos = 0
+        for run in _ZERO_RUN.finditer(data, 0, end):
+            self._encode_literals(data[pos:run.start()], out)
+            out += _encode_run(self.escape, run.end() - run.start())
+            pos = run.end()
+        self._encode_literals(data[pos:end], out)
+        return bytes(out)
+
+    def finish(self):
+        out = _encode_run(self.escape, self.zeros)
+        self.zeros = 0
+        return bytes(out + bytes([self.escape, 0x00]))
+
+
+def encode(source):
+    """
+    Encode a bytes-like object, yielding the encoded data in pieces.
+    """
+    source = memoryview(source).cast('B')
+    escape = _select_escape(Counter(source))
+    encoder = _Encoder(escape)
 
     yield bytes([escape])
-    yield bytes([0x00])
+    for offset in range(0, len(source), _CHUNK_SIZE):
+        yield encoder.encode(source[offset:offset + _CHUNK_SIZE])
+    yield encoder.finish()
 
-def decode(stream):
-    stream = iter(stream)
-    escape = next(stream)
 
-    while True:
-        char = next(stream)
+def encode_file(f_in, f_out, chunk_size=_CHUNK_SIZE):
+    """
+    Encode the contents of the seekable file f_in to f_out, without reading all of it into
+    memory. The input is read twice: once to select the escape byte and once to encode it.
+    """
+    start = f_in.tell()
+    frequency = Counter()
+    for chunk in iter(lambda: f_in.read(chunk_size), b''):
+        frequency.update(chunk)
+    f_in.seek(start)
+
+    encoder = _Encoder(_select_escape(frequency))
+    f_out.write(bytes([encoder.escape]))
+    for chunk in iter(lambda: f_in.read(chunk_size), b''):
+        f_out.write(encoder.encode(chunk))
+    f_out.write(encoder.finish())
 
-        if char == escape:
-            code = next(stream)
+
+class _Decoder(object):
+    """
+    Decodes data which is fed to it in chunks. An escape sequence which is split between chunks
+    is held back until the rest of it arrives.
+    """
+
+    def __init__(self):
+        self.escape = None
+        self.pending = b''
+        self.done = False
+
+    def decode(self, chunk):
+        data = self.pending + bytes(chunk)
+        self.pending = b''
+        if self.done or not data:
+            return b''
+        pos = 0
+        if self.escape is None:
+            self.escape = data[0]
+            pos = 1
+
+        out = bytearray()
+        while True:
+            index = data.find(self.escape, pos)
+            if index < 0:
+                out += data[pos:]
+                break
+            out += data[pos:index]
+
+            if index + 1 >= len(data):
+                self.pending = data[index:]
+                break
+            code = data[index + 1]
             if code == 0x00:
-                return
+                self.done = True
+                break
             elif code == 0x01:
-                yield bytes([escape])
+                out.append(self.escape)
+                pos = index + 2
+            elif code & 0x80 == 0:
+                out += bytes(code)
+                pos = index + 2
             else:
-                if code & 0x80 == 0:
-                    count = code
-                else:
-                    count = (((code & 0x7F) << 8) | next(stream)) + 0x80
-                    assert count <= _MAX_COUNT
+                if index + 2 >= len(data):
+                    self.pending = data[index:]
+                    break
+                count = (((code & 0x7F) << 8) | data[index + 2]) + 0x80
+                assert count <= _MAX_COUNT
+                out += bytes(count)
+                pos = index + 3
+        return bytes(out)
+
+    def finish(self):
+        if not self.done:
+            raise ValueError('Encoded data ends before the end of input marker')
+
+
+def decode(stream):
+    """
+    Decode a bytes-like object, yielding the decoded data in pieces.
+    """
+    stream = memoryview(stream).cast('B')
+    decoder = _Decoder()
+    for offset in range(0, len(stream), _CHUNK_SIZE):
+        yield decoder.decode(stream[offset:offset + _CHUNK_SIZE])
+        if decoder.done:
+            return
+    decoder.finish()
+
 
-                for _ in range(count):
-                    yield bytes([0x00])
-        else:
-            yield bytes([char])
+def decode_file(f_in, f_out, chunk_size=_CHUNK_SIZE):
+    """
+    Decode the contents of the file f_in to f_out, without reading all of it into memory.
+    """
+    decoder = _Decoder()
+    for chunk in iter(lambda: f_in.read(chunk_size), b''):
+        f_out.write(decoder.decode(chunk))
+        if decoder.done:
+            return
+    decoder.finish()
 
 
 if __name__ == '__main__':
@@ -166,13 +281,47 @@ if __name__ == '__main__':
                 self.assertEqual(encoded_data, b'\x01\x01\xff\xff\x01\x64\x01\x00')
                 self.assertEqual(decoded_data, raw_data)
 
+            def test_escape_bytes(self):
+                # every byte value occurs, 0x02 least often
+                raw_data = bytes(range(256)) * 2 + b'\x01\x01\x01'
+                raw_data = raw_data.replace(b'\x02', b'', 1)
+                encoded_data = b''.join(encode(raw_data))
+                self.assertEqual(encoded_data[:1], b'\x02')
+                self.assertEqual(encoded_data.count(b'\x02\x01'), 1)
+                self.assertEqual(b''.join(decode(encoded_data)), raw_data)
+
+            def test_truncated(self):
+                with self.assertRaises(ValueError):
+                    b''.join(decode(b'\x01\x02\x01\x40'))
+
+            def test_chunks(self):
+                # The encoding doesn't depend on how the input is split into chunks, even when
+                # runs of zeros and escape sequences are split between them
+                import io
+                import random
+                rand = random.Random(0)
+                raw_data = bytearray()
+                while len(raw_data) < 0x20000:
+                    if rand.random() < 0.5:
+                        raw_data += bytes(rand.choice((1, 2, 0x7f, 0x80, 0x1000, 0x807f, 0x8080)))
+                    else:
+                        raw_data += bytes(rand.getrandbits(8) for _ in range(rand.randint(1, 64)))
+                raw_data = bytes(raw_data)
+                encoded_data = b''.join(encode(raw_data))
+                self.assertEqual(b''.join(decode(encoded_data)), raw_data)
+
+                for chunk_size in (1, 2, 3, 127, 4096):
+                    encoded = io.BytesIO()
+                    encode_file(io.BytesIO(raw_data), encoded, chunk_size)
+                    self.assertEqual(encoded.getvalue(), encoded_data)
+                    decoded = io.BytesIO()
+                    decode_file(io.BytesIO(encoded_data), decoded, chunk_size)
+                    self.assertEqual(decoded.getvalue(), raw_data)
+
         unittest.main()
     elif len(sys.argv) == 2:
         # encode the specified file
-        data = open(sys.argv[1], 'rb').read()
-        encoded = ''.join(encode(data))
-        if ''.join(decode(encoded)) != data:
-            raise Exception('Invalid encoding')
-        sys.stdout.write(''.join(encode(f)))
+        with open(sys.argv[1], 'rb') as f:
+            encode_file(f, sys.stdout.buffer)
     else:
         raise Exception('Invalid arguments')